@@ -14,6 +14,9 @@ setuptools.setup(
     # Use MANIFEST.in to recursively glob and include files in ./woof_nf/workflow/
     include_package_data=True,
     entry_points={
-        'console_scripts': ['woof=woof_nf.__main__:entry'],
+        'console_scripts': [
+            'woof=woof_nf.__main__:entry',
+            'woof-cache=woof_nf.cache:entry',
+        ],
     }
 )
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# Import-time regression benchmark for local-only runs. Uses `python -X importtime` to measure the
+# cumulative import time of all woof_nf modules used by a local run and fails if the budget is
+# exceeded or any AWS/other heavy module is loaded. See README.md for the documented budget.
+import argparse
+import re
+import subprocess
+import sys
+
+
+# Modules imported during a local-only run (i.e. local executor and local inputs/outputs)
+MODULES_LOCAL = (
+    'woof_nf.__main__',
+    'woof_nf.arguments',
+    'woof_nf.aws',
+    'woof_nf.bgzf',
+    'woof_nf.cache',
+    'woof_nf.dependencies',
+    'woof_nf.identical',
+    'woof_nf.identity',
+    'woof_nf.information',
+    'woof_nf.inputs',
+    'woof_nf.log',
+    'woof_nf.manifest',
+    'woof_nf.mirror',
+    'woof_nf.nway',
+    'woof_nf.preflight',
+    'woof_nf.regions',
+    'woof_nf.report',
+    'woof_nf.utility',
+    'woof_nf.workflow',
+)
+
+# Must only be loaded on code paths that need them. In particular, boto3 is slow to load and unneeded
+# for local-only runs, so woof_nf modules import it within the functions that use it
+MODULES_FORBIDDEN = (
+    'asyncio',
+    'boto3',
+    'botocore',
+    'distutils',
+    's3transfer',
+)
+
+BUDGET_MS = 150
+REPEATS = 5
+
+IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def get_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--budget_ms', type=float, default=BUDGET_MS,
+            help=f'Cumulative import time budget in milliseconds (default: {BUDGET_MS})')
+    parser.add_argument('--repeats', type=int, default=REPEATS,
+            help=f'Number of measurements, the fastest is used (default: {REPEATS})')
+    return parser.parse_args()
+
+
+def measure(statement):
+    # Returns cumulative time (us) of top-level imports and the set of all imported modules
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        encoding='utf-8'
+    )
+    if result.returncode != 0:
+        print('error: failed to import modules:', result.stderr, file=sys.stderr)
+        sys.exit(1)
+    imports = dict()
+    modules = set()
+    for line in result.stderr.splitlines():
+        if not (re_result := IMPORTTIME_RE.match(line)):
+            continue
+        cumulative, indent, module = int(re_result.group(2)), re_result.group(3), re_result.group(4)
+        modules.add(module)
+        if len(indent) == 1:
+            imports[module] = cumulative
+    return imports, modules
+
+
+def main():
+    args = get_arguments()
+    # Exclude interpreter startup imports (e.g. site) by subtracting an empty run
+    imports_baseline, modules_baseline = measure('pass')
+    statement = '; '.join(f'import {module}' for module in MODULES_LOCAL)
+    timings = list()
+    for _ in range(args.repeats):
+        imports, modules = measure(statement)
+        timings.append(sum(t for m, t in imports.items() if m not in imports_baseline))
+    time_ms = min(timings) / 1000
+    modules_forbidden = sorted(
+        m for m in modules - modules_baseline if m.split('.')[0] in MODULES_FORBIDDEN
+    )
+    print(f'import time (local-only run): {time_ms:.1f} ms (budget: {args.budget_ms:.1f} ms)')
+    failed = False
+    if modules_forbidden:
+        print('error: modules imported that should only be loaded when needed:', file=sys.stderr)
+        for module in modules_forbidden:
+            print(f'  {module}', file=sys.stderr)
+        failed = True
+    if time_ms > args.budget_ms:
+        print('error: import time budget exceeded', file=sys.stderr)
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
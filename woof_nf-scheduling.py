@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# Simulates the makespan of a synthetic cohort run with inputs submitted in discovery order versus
+# longest-processing-time-first order (as written by inputs.write). Task durations are modelled as
+# the estimated cost with random error so that the estimate is not assumed to be perfect.
+import argparse
+import random
+
+
+from woof_nf import inputs
+from woof_nf import scheduling
+
+
+# Synthetic cohort: data source -> (data type, approximate input size in MB)
+UMCCRISE_INPUTS = {
+    'cpsr': ('small_variants', 2),
+    'pcgr': ('small_variants', 20),
+    'manta': ('structural_variants', 2),
+    'purple': ('copy_number_variants', 1),
+}
+BCBIO_INPUTS = {
+    'tumour-ensemble': ('small_variants', 250),
+    'normal-ensemble': ('small_variants', 3000),
+    'normal-gatk': ('small_variants', 2500),
+    'normal-strelka2': ('small_variants', 2000),
+    'normal-vardict': ('small_variants', 3000),
+}
+# Nominal processing rate used to report makespan in hours; one GB of weighted cost per 10 minutes
+COST_BYTES_PER_HOUR = 6 * 2 ** 30
+
+
+def get_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--umccrise_samples', type=int, default=40,
+            help='Number of synthetic umccrise samples (default: 40)')
+    parser.add_argument('--bcbio_samples', type=int, default=8,
+            help='Number of synthetic bcbio samples (default: 8)')
+    parser.add_argument('--workers', type=int, default=16,
+            help='Number of concurrent tasks (default: 16)')
+    parser.add_argument('--trials', type=int, default=200,
+            help='Number of random cohorts to simulate (default: 200)')
+    parser.add_argument('--seed', type=int, default=1,
+            help='Random seed (default: 1)')
+    return parser.parse_args()
+
+
+def create_cohort(umccrise_samples, bcbio_samples, rng):
+    file_pairs = list()
+    samples = [('umccrise', UMCCRISE_INPUTS, i) for i in range(umccrise_samples)]
+    samples += [('bcbio', BCBIO_INPUTS, i) for i in range(bcbio_samples)]
+    for run_type, data_sources, i in samples:
+        for data_source, (data_type, size_mb) in data_sources.items():
+            input_files = list()
+            for run_number in ('one', 'two'):
+                size = int(size_mb * 2 ** 20 * rng.uniform(0.5, 1.5))
+                input_files.append(inputs.InputFile(
+                    f'{run_type}_sample_{i}',
+                    run_type,
+                    run_number,
+                    f'{data_source}.vcf.gz',
+                    data_source,
+                    data_type,
+                    size
+                ))
+            file_pairs.append(inputs.FilePair(*input_files))
+    # Discovery order is effectively arbitrary with respect to input size
+    rng.shuffle(file_pairs)
+    return file_pairs
+
+
+def get_durations(file_pairs, errors):
+    durations = list()
+    for file_pair in file_pairs:
+        file_sizes = [file_pair.file_one.file_size, file_pair.file_two.file_size]
+        cost = scheduling.estimate_cost(file_pair.data_type, file_sizes)
+        durations.append(cost * errors[id(file_pair)] / COST_BYTES_PER_HOUR)
+    return durations
+
+
+def main():
+    args = get_arguments()
+    rng = random.Random(args.seed)
+    makespans_discovery = list()
+    makespans_lpt = list()
+    for _ in range(args.trials):
+        file_pairs = create_cohort(args.umccrise_samples, args.bcbio_samples, rng)
+        # Estimation error is fixed per comparison so both orders see identical actual durations
+        errors = {id(fp): rng.lognormvariate(0, 0.3) for fp in file_pairs}
+        file_pairs_lpt = scheduling.order_file_pairs(file_pairs)
+        makespans_discovery.append(scheduling.simulate_makespan(get_durations(file_pairs, errors), args.workers))
+        makespans_lpt.append(scheduling.simulate_makespan(get_durations(file_pairs_lpt, errors), args.workers))
+    mean_discovery = sum(makespans_discovery) / args.trials
+    mean_lpt = sum(makespans_lpt) / args.trials
+    comparisons_n = len(file_pairs)
+    print(f'cohort: {args.umccrise_samples} umccrise + {args.bcbio_samples} bcbio samples', end=' ')
+    print(f'({comparisons_n} comparisons), {args.workers} workers, {args.trials} trials')
+    print(f'  mean makespan, discovery order: {mean_discovery:.2f} h (worst {max(makespans_discovery):.2f} h)')
+    print(f'  mean makespan, LPT order:       {mean_lpt:.2f} h (worst {max(makespans_lpt):.2f} h)')
+    print(f'  improvement: {(1 - mean_lpt / mean_discovery) * 100:.1f}%')
+
+
+if __name__ == '__main__':
+    main()
@@ -4,15 +4,6 @@ import sys
 
 from . import __prog__
 from . import __version__
-from . import arguments
-from . import aws
-from . import dependencies
-from . import information
-from . import inputs
-from . import log
-from . import report
-from . import utility
-from . import workflow
 
 
 def entry():
@@ -21,6 +12,20 @@ def entry():
         print(f'{__prog__} {__version__}')
         sys.exit()
 
+    # Pipeline modules are imported only once needed so that --version returns immediately; AWS
+    # modules further defer importing boto3 until an AWS code path is used
+    from . import arguments
+    from . import aws
+    from . import dependencies
+    from . import information
+    from . import log
+    from . import manifest
+    from . import nway
+    from . import preflight
+    from . import report
+    from . import utility
+    from . import workflow
+
     # Print entry
     log.task_msg_title('Starting the woof-nf pipeline')
     log.task_msg_body('Welcome to the UMCCR variant comparison pipeline\n')
@@ -37,23 +42,58 @@ def entry():
     information.render_table(args)
     log.render_newline()
 
-    # Check dependencies, and test AWS auth and config if needed
-    dependencies.check(args.executor, args.docker)
-    paths_all = [*args.run_dir_one, *args.run_dir_two, str(args.output_dir)]
-    if args.executor == 'aws' or any(p.startswith('s3://') for p in paths_all):
-        aws.check_config()
-
-    # Process input paths; create pathlib.Path or s3path.VirtualPath
-    # Performing here after AWS checks, so that S3 requests do not fail
-    log.task_msg_title('Processing input directories')
-    log.render_newline()
-    args.run_dir_one = utility.process_input_directories(args.run_dir_one, run='one')
-    args.run_dir_two = utility.process_input_directories(args.run_dir_two, run='two')
-    log.render_newline()
-
-    # Get inputs and write to file
-    input_data = inputs.collect(args.run_dir_one, args.run_dir_two)
-    inputs_fp = inputs.write(input_data, args.output_dir / 'nextflow/input_files.tsv')
+    # Run preflight stages concurrently: dependency checks, AWS auth and config checks (if needed),
+    # S3 listing of input directories, and input discovery. Listing requires valid AWS credentials
+    # and discovery requires both listings. Each run directory is listed once and shared by all
+    # comparisons in which it appears. N-way run set directories are all listed together.
+    if args.run_sets:
+        run_dirs_one, run_dirs_two = nway.get_run_dirs(args.run_sets), list()
+    else:
+        run_dirs_one, run_dirs_two = manifest.get_run_dirs(args.comparisons)
+    paths_all = [*run_dirs_one, *run_dirs_two, str(args.output_dir), args.cache_dir or '']
+    aws_required = args.executor == 'aws' or any(p.startswith('s3://') for p in paths_all)
+    stages = list()
+    stages.append(preflight.Stage(
+        'dependencies',
+        lambda r: dependencies.check(args.executor, args.docker, args.recheck_dependencies)
+    ))
+    if aws_required:
+        stages.append(preflight.Stage('aws', lambda r: aws.check_config()))
+    stages_listing_depends = ['aws'] if aws_required else list()
+    stages.append(preflight.Stage(
+        'listing_one',
+        lambda r: process_input_directories(run_dirs_one, 'sets' if args.run_sets else 'one', run_dirs_two),
+        depends=stages_listing_depends
+    ))
+    stages.append(preflight.Stage(
+        'listing_two',
+        lambda r: process_input_directories(run_dirs_two, 'two'),
+        depends=stages_listing_depends
+    ))
+    stages.append(preflight.Stage(
+        'discovery',
+        lambda r: discover_inputs_nway(
+            args.run_sets,
+            dict(zip(run_dirs_one, r['listing_one'])),
+            args.output_dir,
+            args.mirror_dir,
+            args.mirror_size
+        ) if args.run_sets else discover_inputs(
+            args.comparisons,
+            dict(zip([*run_dirs_one, *run_dirs_two], [*r['listing_one'], *r['listing_two']])),
+            args.output_dir,
+            args.output_remote_dir,
+            args.cache_dir,
+            args.regions,
+            args.strata,
+            args.identity_sites,
+            args.mirror_dir,
+            args.mirror_size
+        ),
+        depends=['listing_one', 'listing_two']
+    ))
+    results = preflight.run(stages)
+    inputs_fp, comparison_cache = results['discovery']
     if args.output_type == 's3':
         utility.upload_log_and_config(args.log_fp, args.nextflow_dir, args.output_remote_dir)
 
@@ -68,17 +108,34 @@ def entry():
         args.run_timestamp,
         args.resume,
         args.docker,
-        args.executor
+        args.executor,
+        args.sync_interval,
+        args.resources_config,
+        args.cache_dir,
+        'pipeline_nway.nf' if args.run_sets else 'pipeline.nf',
+        args.regions,
+        args.strata,
+        args.mode,
+        args.publish_mode
     )
+    if comparison_cache:
+        comparison_cache.store()
     if args.output_type == 's3':
         utility.upload_log_and_config(args.log_fp, args.nextflow_dir, args.output_remote_dir)
-    report.render(
-        args.output_dir,
-        args.output_remote_dir,
-        args.output_type,
-        args.work_dir,
-        args.executor
-    )
+    if args.run_sets:
+        # The report covers pairwise comparisons only; N-way outputs are tables
+        output_dir_final = args.output_remote_dir or args.output_dir
+        log.render(f'\ninfo: N-way results written to {output_dir_final}/<sample>/<run_type>/small_variants_nway/\n')
+    else:
+        report.render(
+            [
+                (c.name, c.get_output_dir(args.output_dir), c.get_output_remote_dir(args.output_remote_dir))
+                for c in args.comparisons
+            ],
+            args.output_type,
+            args.work_dir,
+            args.executor
+        )
 
     # Diplay exit message, and upload logs if required
     log.task_msg_title('\nPipeline completed sucessfully! Goodbye')
@@ -86,5 +143,102 @@ def entry():
         utility.upload_log(args.log_fp, args.output_remote_dir)
 
 
+def process_input_directories(run_dir, run, run_dir_other=None):
+    from . import log
+    from . import utility
+    # Process input paths; create pathlib.Path or s3path.VirtualPath
+    # Header is rendered for the first run only, including the S3 message for either run
+    if run_dir_other is not None:
+        log.task_msg_title('Processing input directories')
+        log.render_newline()
+        if any(p.startswith('s3') for p in [*run_dir, *run_dir_other]):
+            log.render('Retrieving S3 path file list, this may take some time')
+    dirpaths = utility.process_input_directories(run_dir, run=run)
+    if run_dir_other is None:
+        log.render_newline()
+    return dirpaths
+
+
+def discover_inputs(
+    comparisons,
+    dirpaths,
+    output_dir,
+    output_remote_dir,
+    cache_dir=None,
+    regions=None,
+    strata=None,
+    identity_sites=None,
+    mirror_dir=None,
+    mirror_size=None
+):
+    from . import cache
+    from . import identical
+    from . import identity
+    from . import inputs
+    from . import log
+    from . import mirror
+    comparison_inputs = dict()
+    file_pairs_exclude = dict()
+    comparison_cache = cache.ComparisonCache(cache_dir, regions, strata) if cache_dir else None
+    for comparison in comparisons:
+        if comparison.name:
+            log.task_msg_title(f'Comparison: {comparison.name}')
+            log.render_newline()
+        comparison_dir = comparison.get_output_dir(output_dir)
+        comparison_remote_dir = comparison.get_output_remote_dir(output_remote_dir)
+        # Get inputs
+        run_dir_one = [dirpaths[d] for d in comparison.run_dir_one]
+        run_dir_two = [dirpaths[d] for d in comparison.run_dir_two]
+        input_data = inputs.collect(run_dir_one, run_dir_two)
+        comparison_inputs[comparison.name] = input_data
+        # Flag mismatched or swapped samples from genotypes at common SNP sites
+        if identity_sites:
+            identity.check(input_data, identity_sites)
+        # Identical pairs are trivially concordant; write their outputs here rather than in the workflow
+        file_pairs_identical = identical.detect(input_data)
+        if file_pairs_identical:
+            identical.write_outputs(file_pairs_identical, comparison_dir, comparison_remote_dir, regions)
+        # Restore outputs of comparisons run previously, remaining comparisons are cached after the run
+        file_pairs_cached = dict()
+        if comparison_cache:
+            file_pairs_cached = comparison_cache.restore(
+                input_data,
+                comparison_dir,
+                comparison_remote_dir,
+                file_pairs_identical
+            )
+        file_pairs_exclude.update(file_pairs_identical)
+        file_pairs_exclude.update(file_pairs_cached)
+    # Prefetch S3 inputs of remaining comparisons into the local mirror; checksums are retained so
+    # that cache keys and VCF profiles are unchanged
+    if mirror_dir:
+        input_files = [
+            input_file
+            for input_data in comparison_inputs.values()
+            for source_files in input_data.values()
+            for file_type_pair in source_files.file_list.values()
+            for file_pair in file_type_pair.values()
+            if file_pair.is_matched and file_pair not in file_pairs_exclude
+            for input_file in (file_pair.file_one, file_pair.file_two)
+        ]
+        mirror.InputMirror(mirror_dir, mirror.get_size_limit(mirror_size)).prefetch(input_files)
+    # Write remaining inputs of all comparisons to file
+    inputs_fp = inputs.write(comparison_inputs, output_dir / 'nextflow/input_files.tsv', file_pairs_exclude)
+    return inputs_fp, comparison_cache
+
+
+def discover_inputs_nway(run_sets, dirpaths, output_dir, mirror_dir=None, mirror_size=None):
+    from . import mirror
+    from . import nway
+    # Match small variant inputs across all run sets and write to file
+    file_sets = nway.collect(run_sets, dirpaths)
+    if mirror_dir:
+        input_files = [f for file_set in file_sets if file_set.is_matched for f in file_set.files.values()]
+        mirror.InputMirror(mirror_dir, mirror.get_size_limit(mirror_size)).prefetch(input_files)
+    set_names = [name for name, run_dirs in run_sets]
+    inputs_fp = nway.write(file_sets, set_names, output_dir / 'nextflow/input_files.tsv')
+    return inputs_fp, None
+
+
 if __name__ == '__main__':
     entry()
@@ -7,7 +7,11 @@ import tempfile
 import textwrap
 
 
+from . import identity
 from . import log
+from . import manifest
+from . import nway
+from . import regions
 from . import utility
 
 
@@ -15,16 +19,26 @@ def collect() -> argparse.Namespace:
     parser = argparse.ArgumentParser()
     parser.add_argument(
         '--run_dir_one',
-        required=True,
         nargs='+',
         help='Space separated list of run directories'
     )
     parser.add_argument(
         '--run_dir_two',
-        required=True,
         nargs='+',
         help='Space separated list of run directories'
     )
+    parser.add_argument(
+        '--manifest',
+        type=pathlib.Path,
+        help='TSV of comparisons to run in a single workflow, replaces --run_dir_one/--run_dir_two'
+    )
+    parser.add_argument(
+        '--run_set',
+        nargs='+',
+        action='append',
+        metavar=('NAME', 'RUN_DIR'),
+        help='Named set of run directories for N-way small variant comparison, give once for each set'
+    )
     parser.add_argument(
         '--output_dir',
         required=True,
@@ -46,6 +60,12 @@ def collect() -> argparse.Namespace:
         '--work_dir',
         help='Nextflow work directory (default: <args.output_dir>/nextflow/work/)'
     )
+    parser.add_argument(
+        '--publish_mode',
+        choices=('auto', 'copy', 'link'),
+        default='auto',
+        help='Publish workflow outputs by copy or hardlink from the work directory (default: auto, link when possible)'
+    )
     parser.add_argument(
         '--docker',
         action='store_true',
@@ -56,6 +76,65 @@ def collect() -> argparse.Namespace:
         action='store_true',
         help='Resume previous workflow'
     )
+    parser.add_argument(
+        '--sync_interval',
+        type=int,
+        default=0,
+        help='Interval in seconds to sync nextflow directory to S3 during execution (default: disabled)'
+    )
+    parser.add_argument(
+        '--resources_config',
+        type=pathlib.Path,
+        help='Nextflow config of tuned process resources, as written to <nextflow_run_dir>/resources.config'
+    )
+    parser.add_argument(
+        '--regions',
+        type=pathlib.Path,
+        help='BED file of target regions to restrict small variant comparisons to (default: whole genome)'
+    )
+    parser.add_argument(
+        '--mode',
+        choices=('exact', 'quick'),
+        default='exact',
+        help='Small variant comparison mode, quick compares sampled genomic windows (default: exact)'
+    )
+    parser.add_argument(
+        '--stratify',
+        action='store_true',
+        help='Compute small variant metrics stratified by chromosome, variant length, and VAF'
+    )
+    parser.add_argument(
+        '--strata_bed',
+        nargs='+',
+        type=pathlib.Path,
+        help='BED files of region strata for stratified small variant metrics, implies --stratify'
+    )
+    parser.add_argument(
+        '--identity_sites',
+        type=pathlib.Path,
+        help='BED file of common SNP sites used to check sample identity across runs (default: disabled)'
+    )
+    parser.add_argument(
+        '--cache_dir',
+        type=str,
+        help='Comparison result cache shared across runs, local directory or S3 prefix (default: disabled)'
+    )
+    parser.add_argument(
+        '--mirror_dir',
+        type=str,
+        help='Local mirror of S3 inputs shared across runs, local executor only (default: disabled)'
+    )
+    parser.add_argument(
+        '--mirror_size',
+        type=float,
+        default=100,
+        help='Size limit of the input mirror in GB, least recently used inputs are evicted (default: 100)'
+    )
+    parser.add_argument(
+        '--recheck_dependencies',
+        action='store_true',
+        help='Ignore cached dependency versions and probe all dependencies again'
+    )
     parser.add_argument(
         '--force',
         action='store_true',
@@ -68,6 +147,30 @@ def check_and_process(args: argparse.Namespace) -> argparse.Namespace:
     log.task_msg_title('Checking and processing arguments')
     log.render_newline()
 
+    # Set comparisons from either the batch manifest or run directories; in single comparison mode
+    # outputs are written directly to the output directory. N-way mode instead compares run sets
+    args.comparisons = list()
+    args.run_sets = list()
+    modes_n = sum(bool(a) for a in (args.manifest, args.run_dir_one or args.run_dir_two, args.run_set))
+    if modes_n > 1:
+        msg = 'only one of --manifest, --run_dir_one/--run_dir_two, or --run_set can be used'
+        log.render(log.ftext(f'error: {msg}', c='red'))
+        sys.exit(1)
+    if args.manifest:
+        if not args.manifest.exists():
+            msg = f'--manifest file does not exist: {args.manifest}'
+            log.render(log.ftext(f'error: {msg}', c='red'))
+            sys.exit(1)
+        args.comparisons = manifest.read(args.manifest)
+    elif args.run_set:
+        args.run_sets = nway.process_run_sets(args.run_set)
+    elif args.run_dir_one and args.run_dir_two:
+        args.comparisons = [manifest.Comparison('', args.run_dir_one, args.run_dir_two)]
+    else:
+        msg = 'either --manifest, --run_set, or both --run_dir_one and --run_dir_two are required'
+        log.render(log.ftext(f'error: {msg}', c='red'))
+        sys.exit(1)
+
     # Set output mode, create local execution directory if we're send output to S3
     # args.output_dir: always local
     # args.output_remote_dir: S3 path for AWS execution
@@ -105,6 +208,25 @@ def check_and_process(args: argparse.Namespace) -> argparse.Namespace:
         log.render(log.ftext(f'error: {msg}', c='red'))
         sys.exit(1)
 
+    # Hardlinks avoid copying published outputs out of the work directory and, unlike symlinks,
+    # survive its cleanup. They require local output and work directories on the same filesystem;
+    # S3 outputs are always copied
+    publish_link_possible = (
+        args.executor == 'local' and
+        args.output_type == 'local' and
+        not args.work_dir.startswith('s3://') and
+        get_filesystem_device(args.output_dir) == get_filesystem_device(pathlib.Path(args.work_dir))
+    )
+    if args.publish_mode == 'auto':
+        args.publish_mode = 'link' if publish_link_possible else 'copy'
+    elif args.publish_mode == 'link' and not publish_link_possible:
+        msg = textwrap.dedent('''
+            --publish_mode link requires the local executor, local output, and output and work
+            directories on the same filesystem
+        ''').strip().replace('\n', ' ')
+        log.render(log.ftext(f'error: {msg}', c='red'))
+        sys.exit(1)
+
     if args.output_type == 's3' and not args.executor == 'aws':
         msg = textwrap.dedent('''
             refusing to run locally and then upload files to S3, change --output_dir to a local
@@ -118,6 +240,65 @@ def check_and_process(args: argparse.Namespace) -> argparse.Namespace:
         log.render(log.ftext(f'error: {msg}', c='red'))
         sys.exit(1)
 
+    if args.resources_config and not args.resources_config.exists():
+        msg = f'--resources_config file does not exist: {args.resources_config}'
+        log.render(log.ftext(f'error: {msg}', c='red'))
+        sys.exit(1)
+
+    if args.sync_interval < 0:
+        msg = '--sync_interval must be zero (disabled) or a positive number of seconds'
+        log.render(log.ftext(f'error: {msg}', c='red'))
+        sys.exit(1)
+
+    if args.mode == 'quick' and args.regions:
+        msg = '--regions cannot be used with --mode quick'
+        log.render(log.ftext(f'error: {msg}', c='red'))
+        sys.exit(1)
+    elif args.regions and not args.regions.exists():
+        msg = f'--regions file does not exist: {args.regions}'
+        log.render(log.ftext(f'error: {msg}', c='red'))
+        sys.exit(1)
+    elif args.regions:
+        args.regions = regions.Regions(args.regions.absolute())
+
+    # Set strata for stratified small variant metrics; None when not stratifying
+    strata_fps_missing = [fp for fp in args.strata_bed or list() if not fp.exists()]
+    if strata_fps_missing:
+        msg = f'--strata_bed file does not exist: {strata_fps_missing[0]}'
+        log.render(log.ftext(f'error: {msg}', c='red'))
+        sys.exit(1)
+    elif args.stratify or args.strata_bed:
+        args.strata = regions.Strata([fp.absolute() for fp in args.strata_bed or list()])
+    else:
+        args.strata = None
+
+    if args.identity_sites and not args.identity_sites.exists():
+        msg = f'--identity_sites file does not exist: {args.identity_sites}'
+        log.render(log.ftext(f'error: {msg}', c='red'))
+        sys.exit(1)
+    elif args.identity_sites:
+        args.identity_sites = identity.read_sites(args.identity_sites)
+
+    if args.cache_dir and not args.cache_dir.startswith('s3://'):
+        args.cache_dir = str(pathlib.Path(args.cache_dir).absolute())
+        os.makedirs(args.cache_dir, exist_ok=True)
+
+    if args.mirror_dir and args.executor != 'local':
+        msg = '--mirror_dir can only be used with the local executor'
+        log.render(log.ftext(f'error: {msg}', c='red'))
+        sys.exit(1)
+    elif args.mirror_dir and args.mirror_dir.startswith('s3://'):
+        msg = '--mirror_dir must be a local directory'
+        log.render(log.ftext(f'error: {msg}', c='red'))
+        sys.exit(1)
+    elif args.mirror_dir:
+        args.mirror_dir = str(pathlib.Path(args.mirror_dir).absolute())
+        os.makedirs(args.mirror_dir, exist_ok=True)
+    if args.mirror_size <= 0:
+        msg = f'--mirror_size must be greater than zero, got {args.mirror_size}'
+        log.render(log.ftext(f'error: {msg}', c='red'))
+        sys.exit(1)
+
     if args.executor == 'aws' and not args.docker:
         log.render('\ninfo: aws executor requires docker but wasn\'t explicitly set, forcing\n')
         args.docker = True
@@ -128,6 +309,12 @@ def check_and_process(args: argparse.Namespace) -> argparse.Namespace:
     if args.output_type == 'local' and not os.path.exists(args.nextflow_dir):
         os.makedirs(args.nextflow_dir, exist_ok=True)
 
+    # Quick mode applies sampled windows as target regions
+    if args.mode == 'quick':
+        os.makedirs(args.nextflow_dir, exist_ok=True)
+        windows_fp = regions.write_quick_windows(args.nextflow_dir / 'quick_windows.bed')
+        args.regions = regions.Regions(windows_fp.absolute())
+
     # Set up log file
     args.run_timestamp = '{:%Y%m%d_%H%M%S}'.format(datetime.datetime.now())
     log_fn = f'pipeline_log_{args.run_timestamp}.txt'
@@ -144,3 +331,11 @@ def check_and_process(args: argparse.Namespace) -> argparse.Namespace:
         sys.exit(1)
     log.setup_log_file(args.log_fp)
     return args
+
+
+def get_filesystem_device(path: pathlib.Path) -> int:
+    # Device of the nearest existing parent, directories may not yet be created
+    path = path.absolute()
+    while not path.exists():
+        path = path.parent
+    return path.stat().st_dev
@@ -1,4 +1,4 @@
-import subprocess
+import concurrent.futures
 import sys
 
 
@@ -11,18 +11,27 @@ ACCOUNT = '843407916570'
 BATCH_QUEUE = 'nextflow-job-queue'
 
 
-def check_config() -> None:
+def check_config(session=None) -> None:
     log.task_msg_title('Checking AWS credentials and config')
     log.render_newline()
+    # A session can be provided to run checks against a local stand-in of the AWS APIs
+    if session is None:
+        import boto3
+        session = boto3.session.Session(region_name=REGION)
     # Define output table
     header_row = table.Row(('Item', 'Result'), header=True)
     rows_check = {
         'auth': table.Row(('Authentication', table.Cell('not checked', c='black'))),
         'job_queue': table.Row(('Job queue', table.Cell('not checked', c='black'))),
     }
-    # Authentication
+    # Run checks concurrently; these are independent API calls
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        future_auth = executor.submit(check_authentication, session)
+        future_job_queue = executor.submit(check_job_queue, session)
+        errors_auth = future_auth.result()
+        errors_job_queue = future_job_queue.result()
+    # Authentication; job queue result is meaningless without valid credentials
     errors = list()
-    errors_auth = check_authentication()
     if errors_auth:
         set_row_failed(rows_check['auth'])
         render_table_and_errors(header_row, rows_check, errors_auth)
@@ -30,7 +39,6 @@ def check_config() -> None:
     else:
         set_row_passed(rows_check['auth'])
     # Job queue
-    errors_job_queue = check_job_queue()
     if errors_job_queue:
         errors.extend(errors_job_queue)
         set_row_failed(rows_check['job_queue'], text='not found')
@@ -42,26 +50,19 @@ def check_config() -> None:
         sys.exit(1)
 
 
-def check_authentication():
-    command = 'aws sts get-caller-identity'
+def check_authentication(session):
     fail_message = 'could not verify AWS authentication with STS'
-    result, errors = aws_command(command, fail_message)
+    result, errors = aws_request(session, 'sts', 'get_caller_identity', fail_message)
     return errors
 
 
-def check_job_queue():
-    command = r'''
-        aws batch describe-job-queues \
-            --output text \
-            --no-paginate \
-            --query 'jobQueues[].jobQueueName'
-    '''
+def check_job_queue(session):
     fail_message = 'could not retrieve Batch job queues'
-    result, errors = aws_command(command, fail_message)
+    result, errors = aws_request(session, 'batch', 'describe_job_queues', fail_message, paginate=True)
     if errors:
         return errors
     errors = list()
-    job_queues = set(result.stdout.rstrip().split())
+    job_queues = {jq['jobQueueName'] for page in result for jq in page.get('jobQueues', list())}
     if BATCH_QUEUE not in job_queues:
         errors.append(log.ftext(
             f'\nerror: could not find requested job queue \'{BATCH_QUEUE}\', found:',
@@ -72,21 +73,20 @@ def check_job_queue():
         return errors
 
 
-def aws_command(command: str, fail_message: str) -> subprocess.CompletedProcess:
-    # Remove excessive whitespace/newlines so that we can append --region
-    command_full = f'{command.rstrip()} --region {REGION}'
-    result = subprocess.run(
-        command_full,
-        shell=True,
-        capture_output=True,
-        encoding='utf-8'
-    )
+def aws_request(session, service: str, operation: str, fail_message: str, paginate: bool = False):
+    import botocore.exceptions
+    client = session.client(service, region_name=REGION)
     errors = list()
-    if result.returncode != 0:
+    try:
+        if paginate:
+            result = list(client.get_paginator(operation).paginate())
+        else:
+            result = getattr(client, operation)()
+    except (botocore.exceptions.BotoCoreError, botocore.exceptions.ClientError) as err:
+        result = None
         errors.append(log.ftext(f'\nerror: {fail_message}:', c='red'))
-        errors.append(f'command: {command_full}')
-        errors.append(f'stdout: {result.stdout}')
-        errors.append(f'stderr: {result.stderr}')
+        errors.append(f'request: {service} {operation} (region: {REGION})')
+        errors.append(f'error: {err}')
     return result, errors
 
 
@@ -0,0 +1,131 @@
+import asyncio
+import time
+from typing import Callable, Dict, List, Optional
+
+
+from . import log
+
+
+# AWS Batch accepts at most 100 job ids per describe_jobs request
+DESCRIBE_JOBS_MAX = 100
+
+STATUS_ACTIVE = {'SUBMITTED', 'PENDING', 'RUNNABLE', 'STARTING', 'RUNNING'}
+STATUS_TERMINAL = {'SUCCEEDED', 'FAILED'}
+# Set by the waiter rather than Batch
+STATUS_UNRESOLVED = {'MISSING', 'TIMEOUT'}
+
+# Polling intervals (seconds). The interval grows by BACKOFF_FACTOR on each poll without a status
+# change and is reset to the initial interval when any job changes status.
+POLL_INTERVAL_INITIAL = 2
+POLL_INTERVAL_MAX = 30
+BACKOFF_FACTOR = 1.5
+# Newly submitted jobs can briefly be absent from describe_jobs responses
+MISSING_GRACE_PERIOD = 60
+
+
+class JobState:
+
+    def __init__(self, job_id, job_name=None):
+        self.job_id = job_id
+        self.job_name = job_name if job_name else job_id
+        self.status = None
+        self.info = dict()
+
+    @property
+    def is_finished(self) -> bool:
+        if self.status in STATUS_TERMINAL or self.status in STATUS_UNRESOLVED:
+            return True
+        return bool(self.info.get('stoppedAt'))
+
+    @property
+    def is_succeeded(self) -> bool:
+        return self.status == 'SUCCEEDED'
+
+
+def wait_jobs(client, jobs: Dict[str, str], **kargs) -> Dict[str, JobState]:
+    # Blocking entry point; jobs maps job id -> job name
+    return asyncio.run(wait_jobs_async(client, jobs, **kargs))
+
+
+async def wait_jobs_async(
+    client,
+    jobs: Dict[str, str],
+    timeout: Optional[float] = None,
+    on_status: Optional[Callable] = None,
+    interval_initial: float = POLL_INTERVAL_INITIAL,
+    interval_max: float = POLL_INTERVAL_MAX,
+) -> Dict[str, JobState]:
+    # Only requires client to provide describe_jobs(jobs=[...]) so that a local stub can be used in
+    # place of a boto3 Batch client
+    if on_status is None:
+        on_status = create_status_renderer(len(jobs))
+    job_states = {job_id: JobState(job_id, job_name) for job_id, job_name in jobs.items()}
+    time_start = time.monotonic()
+    interval = interval_initial
+    while True:
+        jobs_pending = [js for js in job_states.values() if not js.is_finished]
+        if not jobs_pending:
+            break
+        # Request info for all unfinished jobs concurrently in batches
+        job_id_batches = chunk([js.job_id for js in jobs_pending], DESCRIBE_JOBS_MAX)
+        responses = await asyncio.gather(*[
+            asyncio.to_thread(client.describe_jobs, jobs=job_ids) for job_ids in job_id_batches
+        ])
+        # Update job states and notify of any changes
+        status_changed = False
+        jobs_found = set()
+        for response in responses:
+            for job_info in response.get('jobs', list()):
+                job_state = job_states.get(job_info.get('jobId'))
+                if job_state is None:
+                    continue
+                jobs_found.add(job_state.job_id)
+                status_previous = job_state.status
+                job_state.info = job_info
+                job_state.status = job_info.get('status')
+                if job_state.status != status_previous:
+                    status_changed = True
+                    on_status(job_state)
+        time_elapsed = time.monotonic() - time_start
+        # Jobs that remain absent after the grace period are considered lost
+        for job_state in jobs_pending:
+            if job_state.job_id in jobs_found or job_state.status is not None:
+                continue
+            if time_elapsed > MISSING_GRACE_PERIOD:
+                job_state.status = 'MISSING'
+                job_state.info = {'statusReason': 'job not returned by describe_jobs'}
+                on_status(job_state)
+        if all(js.is_finished for js in job_states.values()):
+            break
+        if timeout is not None and time_elapsed > timeout:
+            for job_state in job_states.values():
+                if not job_state.is_finished:
+                    job_state.status = 'TIMEOUT'
+                    on_status(job_state)
+            break
+        # Adaptive backoff
+        interval = interval_initial if status_changed else min(interval * BACKOFF_FACTOR, interval_max)
+        if timeout is not None:
+            interval = max(0, min(interval, timeout - time_elapsed))
+        await asyncio.sleep(interval)
+    return job_states
+
+
+def create_status_renderer(job_count: int) -> Callable:
+    # For a single job, overwrite the previous status line to replicate the original polling output
+    state = {'rendered': False}
+
+    def render_status(job_state: JobState) -> None:
+        if job_count == 1:
+            if state['rendered']:
+                log.render('\u001b[F\u001b[0K', end='')
+            log.render(f'    job status: {job_state.status}')
+        else:
+            log.render(f'    job status ({job_state.job_name}): {job_state.status}')
+        state['rendered'] = True
+
+    return render_status
+
+
+def chunk(items: List, size: int) -> List[List]:
+    return [items[i:i+size] for i in range(0, len(items), size)]
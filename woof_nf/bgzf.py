@@ -0,0 +1,275 @@
+import collections
+import gzip
+import io
+import struct
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+from . import utility
+
+
+# Indexed access to BGZF compressed, tabix indexed VCFs without external dependencies. Reads are by
+# BGZF block so that only blocks overlapping a queried region are decompressed; decompressed blocks
+# are kept in a small LRU cache as neighbouring queries usually share blocks. S3 objects are read
+# with ranged GETs of fixed size pages, also cached, rather than staged in full.
+BLOCK_CACHE_SIZE = 256
+# BGZF blocks are at most 64 KiB so a block spans at most two pages
+RANGE_PAGE_SIZE = 256 * 1024
+RANGE_CACHE_SIZE = 64
+TABIX_MAGIC = b'TBI\x01'
+
+
+class TabixIndex:
+
+    def __init__(self, data: bytes):
+        # Parse uncompressed tabix index, see the SAMtools tabix specification
+        if data[:4] != TABIX_MAGIC:
+            raise ValueError('not a tabix index')
+        n_ref, = struct.unpack_from('<i', data, 4)
+        names_length, = struct.unpack_from('<i', data, 32)
+        offset = 36
+        self.names = data[offset:offset+names_length].rstrip(b'\x00').decode().split('\x00')
+        offset += names_length
+        # Contig -> (bin -> chunks, linear index)
+        self.bins: Dict[str, Dict[int, List[Tuple[int, int]]]] = dict()
+        self.linear: Dict[str, List[int]] = dict()
+        for name in self.names[:n_ref]:
+            bins = dict()
+            n_bin, = struct.unpack_from('<i', data, offset)
+            offset += 4
+            for i in range(n_bin):
+                bin_number, n_chunk = struct.unpack_from('<Ii', data, offset)
+                offset += 8
+                chunks = struct.unpack_from(f'<{n_chunk * 2}Q', data, offset)
+                offset += n_chunk * 16
+                bins[bin_number] = list(zip(chunks[::2], chunks[1::2]))
+            n_intv, = struct.unpack_from('<i', data, offset)
+            offset += 4
+            self.linear[name] = list(struct.unpack_from(f'<{n_intv}Q', data, offset))
+            offset += n_intv * 8
+            self.bins[name] = bins
+
+    @classmethod
+    def read(cls, fh) -> 'TabixIndex':
+        # The index is itself BGZF compressed
+        return cls(gzip.decompress(fh.read()))
+
+    def get_chunks(self, contig: str, start: int, end: int) -> List[Tuple[int, int]]:
+        # Chunks (virtual offset pairs) that may contain records overlapping [start, end), merged
+        if contig not in self.bins:
+            return list()
+        bins = self.bins[contig]
+        linear = self.linear[contig]
+        offset_min = linear[min(start >> 14, len(linear) - 1)] if linear else 0
+        chunks = [
+            chunk
+            for bin_number in get_overlapping_bins(start, end)
+            for chunk in bins.get(bin_number, list())
+            if chunk[1] > offset_min
+        ]
+        merged: List[Tuple[int, int]] = list()
+        for chunk_start, chunk_end in sorted(chunks):
+            if merged and chunk_start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], chunk_end))
+            else:
+                merged.append((chunk_start, chunk_end))
+        return merged
+
+
+class BgzfReader:
+
+    def __init__(self, fh):
+        # Any seekable binary file object
+        self.fh = fh
+        self.blocks: collections.OrderedDict = collections.OrderedDict()
+
+    def get_block(self, block_offset: int) -> Tuple[bytes, int]:
+        # Returns decompressed data and compressed size of the block at the given file offset
+        if block_offset in self.blocks:
+            self.blocks.move_to_end(block_offset)
+            return self.blocks[block_offset]
+        self.fh.seek(block_offset)
+        header = self.fh.read(18)
+        if len(header) < 18:
+            return b'', 0
+        # BSIZE is in the BC extra subfield, block size minus one
+        block_size = struct.unpack_from('<H', header, 16)[0] + 1
+        compressed = self.fh.read(block_size - 18)
+        data = zlib.decompress(compressed[:-8], -15)
+        self.blocks[block_offset] = (data, block_size)
+        if len(self.blocks) > BLOCK_CACHE_SIZE:
+            self.blocks.popitem(last=False)
+        return data, block_size
+
+    def iterate_lines(self, voffset_start: int, voffset_end: int) -> Iterator[str]:
+        # Lines starting from the virtual offset up to and including the line at the end offset
+        block_offset, data_offset = voffset_start >> 16, voffset_start & 0xFFFF
+        buffer = b''
+        while True:
+            data, block_size = self.get_block(block_offset)
+            if not block_size:
+                # End of file, the last line may lack a newline
+                if buffer:
+                    yield buffer.decode()
+                break
+            buffer += data[data_offset:]
+            *lines, buffer = buffer.split(b'\n')
+            for line in lines:
+                yield line.decode()
+            if block_offset >= voffset_end >> 16:
+                break
+            block_offset += block_size
+            data_offset = 0
+
+
+class S3RangeFile:
+
+    def __init__(self, bucket_name: str, key: str, client=None):
+        # A client can be provided to read from a local stand-in of S3
+        if client is None:
+            import boto3
+            client = boto3.client('s3')
+        self.client = client
+        self.bucket_name = bucket_name
+        self.key = key
+        self.size = client.head_object(Bucket=bucket_name, Key=key)['ContentLength']
+        self.position = 0
+        self.pages: collections.OrderedDict = collections.OrderedDict()
+        self.requests = 0
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        if whence == 0:
+            self.position = offset
+        elif whence == 1:
+            self.position += offset
+        elif whence == 2:
+            self.position = self.size + offset
+        return self.position
+
+    def tell(self) -> int:
+        return self.position
+
+    def read(self, size: int = -1) -> bytes:
+        end = self.size if size < 0 else min(self.position + size, self.size)
+        if self.position >= end:
+            return b''
+        page_first = self.position // RANGE_PAGE_SIZE
+        page_last = (end - 1) // RANGE_PAGE_SIZE
+        # Missing pages are fetched with a single ranged GET
+        pages_missing = [i for i in range(page_first, page_last + 1) if i not in self.pages]
+        if pages_missing:
+            self.fetch_pages(pages_missing[0], pages_missing[-1])
+        data = b''.join(self.get_page(i) for i in range(page_first, page_last + 1))
+        offset = self.position - page_first * RANGE_PAGE_SIZE
+        data = data[offset:offset + end - self.position]
+        self.position = end
+        return data
+
+    def fetch_pages(self, page_first: int, page_last: int) -> None:
+        start = page_first * RANGE_PAGE_SIZE
+        end = min((page_last + 1) * RANGE_PAGE_SIZE, self.size)
+        response = self.client.get_object(Bucket=self.bucket_name, Key=self.key, Range=f'bytes={start}-{end - 1}')
+        data = response['Body'].read()
+        self.requests += 1
+        for i in range(page_first, page_last + 1):
+            page_start = (i - page_first) * RANGE_PAGE_SIZE
+            self.pages[i] = data[page_start:page_start + RANGE_PAGE_SIZE]
+            self.pages.move_to_end(i)
+        while len(self.pages) > max(RANGE_CACHE_SIZE, page_last - page_first + 1):
+            self.pages.popitem(last=False)
+
+    def get_page(self, i: int) -> bytes:
+        if i not in self.pages:
+            self.fetch_pages(i, i)
+        self.pages.move_to_end(i)
+        return self.pages[i]
+
+    def close(self) -> None:
+        self.pages.clear()
+
+
+class IndexedVcf:
+
+    def __init__(self, fh, index_fh):
+        self.reader = BgzfReader(fh)
+        self.index = TabixIndex.read(index_fh)
+
+    def __enter__(self) -> 'IndexedVcf':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.reader.fh.close()
+        self.reader.blocks.clear()
+
+    def get_contig(self, contig: str) -> Optional[str]:
+        # Allow 'chr' prefixed and unprefixed contig names to match
+        for name in (contig, contig[3:] if contig.startswith('chr') else f'chr{contig}'):
+            if name in self.index.bins:
+                return name
+        return None
+
+    def get_header_lines(self) -> List[str]:
+        header_lines = list()
+        for line in self.reader.iterate_lines(0, 1 << 62):
+            if not line.startswith('#'):
+                break
+            header_lines.append(f'{line}\n')
+        return header_lines
+
+    def fetch(self, contig: str, start: int, end: int) -> Iterator[List[str]]:
+        # Tokenised records overlapping [start, end), zero-based half-open as BED. A record spans
+        # POS to the end of REF, matching record selection with bcftools -R
+        contig = self.get_contig(contig)
+        if contig is None:
+            return
+        for voffset_start, voffset_end in self.index.get_chunks(contig, start, end):
+            for line in self.reader.iterate_lines(voffset_start, voffset_end):
+                if not line or line.startswith('#'):
+                    continue
+                tokens = line.split('\t', 9)
+                if tokens[0] != contig:
+                    continue
+                position = int(tokens[1]) - 1
+                if position >= end:
+                    break
+                if position + max(len(tokens[3]), 1) > start:
+                    yield tokens
+
+
+def get_overlapping_bins(start: int, end: int) -> List[int]:
+    # UCSC binning scheme as used by tabix (reg2bins), zero-based half-open interval
+    end -= 1
+    bins = [0]
+    for shift, offset in ((26, 1), (23, 9), (20, 73), (17, 585), (14, 4681)):
+        bins.extend(range(offset + (start >> shift), offset + (end >> shift) + 1))
+    return bins
+
+
+def open_indexed(filepath: str, index_filepath: str, client=None) -> IndexedVcf:
+    # Local or S3 VCF; the index is small and read in full. Use as a context manager or close()
+    if filepath.startswith('s3://'):
+        if client is None:
+            import boto3
+            client = boto3.client('s3')
+        bucket_name, key = utility.get_bucket_and_key(index_filepath)
+        index_fh = io.BytesIO(client.get_object(Bucket=bucket_name, Key=key)['Body'].read())
+        bucket_name, key = utility.get_bucket_and_key(filepath)
+        return IndexedVcf(S3RangeFile(bucket_name, key, client), index_fh)
+    else:
+        # The VCF file handle is closed with the IndexedVcf
+        fh = open(filepath, 'rb')
+        try:
+            with open(index_filepath, 'rb') as index_fh:
+                return IndexedVcf(fh, index_fh)
+        except Exception:
+            fh.close()
+            raise
+
+
+def is_indexed(index_filepath: Optional[str]) -> bool:
+    # Only tabix indexes are supported
+    return bool(index_filepath) and index_filepath.endswith('.tbi')
@@ -0,0 +1,430 @@
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+from . import __version__
+from . import log
+from . import table
+from . import utility
+
+
+# Comparison result cache shared across runs and output directories. Entries are keyed by the
+# checksums of both input files, the comparison module, and the woof-nf version. Layout:
+#   <cache_dir>/<key[:2]>/<key>/<outputs relative to <output_dir>/<sample_name>/<run_type>/>
+#   <cache_dir>/<key[:2]>/<key>/entry.json
+# The entry file is written last and marks the entry as complete. Its mtime (or S3 LastModified)
+# is refreshed on each hit and used for eviction. VCF profiles written by the workflow are stored
+# alongside as <cache_dir>/profiles/<profile>.json and each is evicted as an entry.
+ENTRY_FN = 'entry.json'
+PROFILES_DN = 'profiles'
+COUNTS_FN = 'counts.tsv'
+CACHE_WORKERS = 8
+
+COMPARISON_MODULES = {
+    'small_variants': 'module_smlv_comparison',
+    'structural_variants': 'module_sv_comparison',
+    'copy_number_variants': 'module_cnv_comparison',
+}
+
+
+class ComparisonCache:
+
+    def __init__(self, cache_dir: str, regions=None, strata=None):
+        self.cache_dir = cache_dir
+        # Target regions restrict small variant comparisons and so key their entries; strata add
+        # stratified metrics outputs and likewise key entries
+        self.regions = regions
+        self.strata = strata
+        # Pairs not found in cache and their final output directory, to be stored once the workflow
+        # completes
+        self.pending: Dict = dict()
+
+    def restore(
+        self,
+        input_data: Dict,
+        output_dir: pathlib.Path,
+        output_remote_dir: Optional[str] = None,
+        file_pairs_exclude=()
+    ) -> Dict:
+        # Copy outputs of cached comparisons into the output directory. Returns pair -> key for hits
+        file_pairs = list()
+        for source_files in input_data.values():
+            for file_type_pair in source_files.file_list.values():
+                for file_pair in file_type_pair.values():
+                    if file_pair.is_matched and file_pair not in file_pairs_exclude:
+                        file_pairs.append(file_pair)
+        # Hash local files up front, a baseline file is usually present in many pairs
+        utility.get_input_checksums([f for fp in file_pairs for f in (fp.file_one, fp.file_two)])
+        with concurrent.futures.ThreadPoolExecutor(max_workers=CACHE_WORKERS) as executor:
+            keys = [self.get_key(file_pair) for file_pair in file_pairs]
+            hits = list(executor.map(self.restore_entry, keys, file_pairs, [output_dir] * len(keys)))
+        file_pairs_cached = dict()
+        counts_rows: Dict[Tuple[str, str], List[str]] = dict()
+        for file_pair, key, counts_lines in zip(file_pairs, keys, hits):
+            if counts_lines is None:
+                self.pending[file_pair] = (key, output_remote_dir or str(output_dir))
+                continue
+            file_pairs_cached[file_pair] = key
+            if counts_lines:
+                counts_key = (file_pair.sample_name, file_pair.run_type)
+                if counts_key not in counts_rows:
+                    counts_rows[counts_key] = list()
+                counts_rows[counts_key].extend(counts_lines)
+        # Small variant counts are kept separate from the workflow counts.tsv, which would overwrite them
+        for (sample_name, run_type), lines in counts_rows.items():
+            counts_fp = output_dir / sample_name / run_type / 'small_variants/counts_cached.tsv'
+            write_text(str(counts_fp), ''.join(['vcf_type\trun\tsource\tcount\n', *lines]))
+        render_table(file_pairs_cached, len(file_pairs), self.cache_dir)
+        if file_pairs_cached and output_remote_dir:
+            log.render(f'Uploading cached outputs to {output_remote_dir}')
+            utility.sync_directory_to_s3(output_dir, output_remote_dir, ('nextflow/*', 'pipeline_log_*txt'))
+            log.render_newline()
+        return file_pairs_cached
+
+    def get_key(self, file_pair) -> str:
+        tokens = (
+            __version__,
+            COMPARISON_MODULES[file_pair.data_type],
+            # Outputs contain sample name and data source
+            file_pair.sample_name,
+            file_pair.run_type,
+            file_pair.data_source,
+            utility.get_input_checksum(file_pair.file_one.filepath, file_pair.file_one.checksum),
+            utility.get_input_checksum(file_pair.file_two.filepath, file_pair.file_two.checksum),
+        )
+        if self.regions and file_pair.data_type == 'small_variants':
+            tokens = (*tokens, self.regions.checksum)
+        if self.strata and file_pair.data_type == 'small_variants':
+            tokens = (*tokens, 'strata', self.strata.checksum)
+        return hashlib.sha256('\t'.join(tokens).encode()).hexdigest()
+
+    def get_entry_dir(self, key: str) -> str:
+        return utility.join_paths(self.cache_dir, key[:2], key)
+
+    def restore_entry(self, key: str, file_pair, output_dir: pathlib.Path) -> Optional[List[str]]:
+        # Returns small variant count lines on hit (empty for other data types), otherwise None
+        entry_dir = self.get_entry_dir(key)
+        entry = read_json(utility.join_paths(entry_dir, ENTRY_FN))
+        if entry is None or entry.get('key') != key:
+            return None
+        base_dir = output_dir / file_pair.sample_name / file_pair.run_type
+        for path in entry['files']:
+            copy_path(utility.join_paths(entry_dir, path), str(base_dir / path))
+        counts_lines = list()
+        if file_pair.data_type == 'small_variants':
+            counts_lines = read_text(utility.join_paths(entry_dir, COUNTS_FN)).splitlines(keepends=True)
+        touch_path(utility.join_paths(entry_dir, ENTRY_FN))
+        return counts_lines
+
+    def store(self) -> None:
+        # Add outputs of comparisons run by the workflow; incomplete outputs are not cached
+        if not self.pending:
+            return
+        log.task_msg_title('Updating comparison cache')
+        log.render_newline()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=CACHE_WORKERS) as executor:
+            futures = [
+                executor.submit(self.store_entry, key, file_pair, output_dir)
+                for file_pair, (key, output_dir) in self.pending.items()
+            ]
+            stored = sum(1 for future in futures if future.result())
+        log.render(f'Stored {stored} of {len(self.pending)} comparisons in {self.cache_dir}\n')
+        self.pending = dict()
+
+    def store_entry(self, key: str, file_pair, output_dir: str) -> bool:
+        base_dir = utility.join_paths(str(output_dir), file_pair.sample_name, file_pair.run_type)
+        entry_dir = self.get_entry_dir(key)
+        files = list()
+        for path, required in get_output_paths(file_pair):
+            if not path_exists(utility.join_paths(base_dir, path)):
+                if required:
+                    return False
+                continue
+            files.append(path)
+        counts_fp = utility.join_paths(base_dir, 'small_variants', COUNTS_FN)
+        if file_pair.data_type == 'small_variants' and not path_exists(counts_fp):
+            return False
+        size = 0
+        for path in files:
+            size += copy_path(utility.join_paths(base_dir, path), utility.join_paths(entry_dir, path))
+        if file_pair.data_type == 'small_variants':
+            # Select this data source's rows from the per-sample counts file
+            counts_text = read_text(counts_fp)
+            data_source_prefix = f'{file_pair.data_source}__intersect__'
+            counts_lines = list()
+            for line in counts_text.splitlines(keepends=True):
+                vcf_type = line.split('\t', 1)[0]
+                if vcf_type == file_pair.data_source or vcf_type.startswith(data_source_prefix):
+                    counts_lines.append(line)
+            write_text(utility.join_paths(entry_dir, COUNTS_FN), ''.join(counts_lines))
+        entry = {
+            'key': key,
+            'version': __version__,
+            'module': COMPARISON_MODULES[file_pair.data_type],
+            'sample_name': file_pair.sample_name,
+            'run_type': file_pair.run_type,
+            'data_source': file_pair.data_source,
+            'filepath_one': file_pair.file_one.filepath,
+            'filepath_two': file_pair.file_two.filepath,
+            'files': files,
+            'size': size,
+            'created': time.time(),
+        }
+        write_text(utility.join_paths(entry_dir, ENTRY_FN), json.dumps(entry, indent=2))
+        return True
+
+
+def get_output_paths(file_pair) -> List[Tuple[str, bool]]:
+    # Comparison outputs relative to <output_dir>/<sample_name>/<run_type>/ and whether required
+    data_source = file_pair.data_source
+    paths = list()
+    if file_pair.data_type == 'small_variants':
+        for fn_suffix in ('', '_filtered'):
+            paths.append((f'small_variants/3_comparison/{data_source}{fn_suffix}.tsv', True))
+            paths.append((f'small_variants/3_comparison/{data_source}{fn_suffix}_strata.tsv', False))
+            paths.append((f'small_variants/3_comparison/{data_source}{fn_suffix}_quick.tsv', False))
+            paths.append((f'small_variants/3_comparison/{data_source}{fn_suffix}_concordance.tsv', True))
+            paths.append((f'small_variants/3_comparison/{data_source}{fn_suffix}_concordance_hist.tsv', True))
+        for source in ('input', 'filtered'):
+            for vcf_name in ('0000', '0001', '0002', '0003'):
+                paths.append((f'small_variants/2_variants_intersect/{source}/{data_source}/{vcf_name}.vcf.gz', True))
+    elif file_pair.data_type == 'structural_variants':
+        paths.append(('structural_variants/eval_metrics.tsv', True))
+        paths.append(('structural_variants/fpfn.tsv', True))
+        paths.append((f'structural_variants/circos/circos_{file_pair.sample_name}.png', False))
+    elif file_pair.data_type == 'copy_number_variants':
+        paths.append(('copy_number_variants/cn_diff.tsv', True))
+        paths.append(('copy_number_variants/cn_diff_coord.tsv', True))
+    else:
+        assert False
+    return paths
+
+
+def render_table(file_pairs_cached: Dict, file_pairs_n: int, cache_dir: str) -> None:
+    log.render(log.ftext('Comparison cache:', f='bold'), end=' ')
+    log.render(f'found {len(file_pairs_cached)} of {file_pairs_n} comparisons in {cache_dir}')
+    if file_pairs_cached:
+        rows = [table.Row(('Sample name', 'Run type', 'Data source', 'Cache key'), header=True)]
+        for file_pair, key in file_pairs_cached.items():
+            rows.append(table.Row((file_pair.sample_name, file_pair.run_type, file_pair.data_source, key[:12])))
+        table.render_table(rows)
+    log.render_newline()
+
+
+def get_s3_client():
+    import boto3
+    return boto3.client('s3')
+
+
+def path_exists(path: str) -> bool:
+    if path.startswith('s3://'):
+        import botocore.exceptions
+        bucket_name, key = utility.get_bucket_and_key(path)
+        try:
+            get_s3_client().head_object(Bucket=bucket_name, Key=key)
+        except botocore.exceptions.ClientError:
+            return False
+        return True
+    else:
+        return os.path.exists(path)
+
+
+def copy_path(src: str, dst: str) -> int:
+    # Copy between any combination of local and S3 paths, returns bytes copied
+    if src.startswith('s3://'):
+        src_bucket, src_key = utility.get_bucket_and_key(src)
+        client = get_s3_client()
+        size = client.head_object(Bucket=src_bucket, Key=src_key)['ContentLength']
+        if dst.startswith('s3://'):
+            dst_bucket, dst_key = utility.get_bucket_and_key(dst)
+            copy_source = {'Bucket': src_bucket, 'Key': src_key}
+            client.copy(copy_source, dst_bucket, dst_key, Config=utility.get_transfer_config())
+        else:
+            pathlib.Path(dst).parent.mkdir(parents=True, exist_ok=True)
+            client.download_file(src_bucket, src_key, dst, Config=utility.get_transfer_config())
+    else:
+        size = os.path.getsize(src)
+        if dst.startswith('s3://'):
+            dst_bucket, dst_key = utility.get_bucket_and_key(dst)
+            get_s3_client().upload_file(src, dst_bucket, dst_key, Config=utility.get_transfer_config())
+        else:
+            pathlib.Path(dst).parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(src, dst)
+    return size
+
+
+def read_text(path: str) -> str:
+    if path.startswith('s3://'):
+        bucket_name, key = utility.get_bucket_and_key(path)
+        response = get_s3_client().get_object(Bucket=bucket_name, Key=key)
+        return response['Body'].read().decode('utf-8')
+    else:
+        with open(path, 'r') as fh:
+            return fh.read()
+
+
+def read_json(path: str) -> Optional[Dict]:
+    if not path_exists(path):
+        return None
+    try:
+        return json.loads(read_text(path))
+    except json.JSONDecodeError:
+        return None
+
+
+def write_text(path: str, text: str) -> None:
+    if path.startswith('s3://'):
+        bucket_name, key = utility.get_bucket_and_key(path)
+        get_s3_client().put_object(Bucket=bucket_name, Key=key, Body=text.encode('utf-8'))
+    else:
+        pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w') as fh:
+            fh.write(text)
+
+
+def touch_path(path: str) -> None:
+    # Refresh last used time; S3 objects are copied onto themselves to update LastModified
+    if path.startswith('s3://'):
+        bucket_name, key = utility.get_bucket_and_key(path)
+        get_s3_client().copy_object(
+            Bucket=bucket_name,
+            Key=key,
+            CopySource={'Bucket': bucket_name, 'Key': key},
+            MetadataDirective='REPLACE'
+        )
+    else:
+        os.utime(path)
+
+
+def list_entries(cache_dir: str) -> Dict[str, Dict]:
+    # Collect size, last used time, and files of each entry including incomplete entries
+    entries: Dict[str, Dict] = dict()
+    if cache_dir.startswith('s3://'):
+        bucket_name, key_prefix = utility.get_bucket_and_key(cache_dir)
+        key_prefix = key_prefix.rstrip('/')
+        paginator = get_s3_client().get_paginator('list_objects_v2')
+        objects = list()
+        for page in paginator.paginate(Bucket=bucket_name, Prefix=f'{key_prefix}/' if key_prefix else ''):
+            for obj in page.get('Contents', list()):
+                path_rel = obj['Key'][len(key_prefix):].lstrip('/')
+                objects.append((path_rel, obj['Size'], obj['LastModified'].timestamp()))
+    else:
+        objects = list()
+        for filepath in pathlib.Path(cache_dir).glob('*/**/*'):
+            if filepath.is_file():
+                stat = filepath.stat()
+                objects.append((str(filepath.relative_to(cache_dir)), stat.st_size, stat.st_mtime))
+    for path_rel, size, mtime in objects:
+        parts = path_rel.split('/')
+        if parts[0] == PROFILES_DN and len(parts) == 2:
+            # Profiles are not refreshed when reused by the workflow and so are evicted by age; they
+            # are recreated with a single pass over the VCF
+            entries[path_rel] = {'size': size, 'last_used': mtime, 'complete': True, 'paths': [path_rel]}
+            continue
+        if len(parts) < 3:
+            continue
+        key = parts[1]
+        if key not in entries:
+            entries[key] = {'size': 0, 'last_used': 0, 'complete': False, 'paths': list()}
+        entry = entries[key]
+        entry['size'] += size
+        entry['paths'].append(path_rel)
+        if parts[2:] == [ENTRY_FN]:
+            entry['complete'] = True
+            entry['last_used'] = mtime
+        elif not entry['complete']:
+            entry['last_used'] = max(entry['last_used'], mtime)
+    return entries
+
+
+def evict(cache_dir: str, max_size: Optional[int], max_age_days: Optional[float], dry_run: bool) -> None:
+    entries = list_entries(cache_dir)
+    size_total = sum(e['size'] for e in entries.values())
+    log.render(f'Cache {cache_dir}: {len(entries)} entries, {utility.format_bytes(size_total)}')
+    # Remove entries unused for longer than the max age, then least recently used entries until
+    # the total size is within the limit
+    time_now = time.time()
+    keys_evict = list()
+    keys_remaining = list()
+    for key, entry in sorted(entries.items(), key=lambda item: item[1]['last_used']):
+        if max_age_days is not None and time_now - entry['last_used'] > max_age_days * 86400:
+            keys_evict.append(key)
+        else:
+            keys_remaining.append(key)
+    size_remaining = sum(entries[key]['size'] for key in keys_remaining)
+    while max_size is not None and size_remaining > max_size and keys_remaining:
+        key = keys_remaining.pop(0)
+        keys_evict.append(key)
+        size_remaining -= entries[key]['size']
+    size_evict = sum(entries[key]['size'] for key in keys_evict)
+    action = 'Would evict' if dry_run else 'Evicting'
+    log.render(f'{action} {len(keys_evict)} entries, {utility.format_bytes(size_evict)}')
+    if dry_run or not keys_evict:
+        return
+    if cache_dir.startswith('s3://'):
+        bucket_name, key_prefix = utility.get_bucket_and_key(cache_dir)
+        key_prefix = key_prefix.rstrip('/')
+        object_keys = [
+            f'{key_prefix}/{path}' if key_prefix else path
+            for key in keys_evict
+            for path in entries[key]['paths']
+        ]
+        client = get_s3_client()
+        # Entry files are deleted first in each entry so partially deleted entries are never used
+        object_keys.sort(key=lambda k: not k.endswith(f'/{ENTRY_FN}'))
+        for i in range(0, len(object_keys), 1000):
+            objects = [{'Key': k} for k in object_keys[i:i + 1000]]
+            client.delete_objects(Bucket=bucket_name, Delete={'Objects': objects, 'Quiet': True})
+    else:
+        for key in keys_evict:
+            if key.startswith(f'{PROFILES_DN}/'):
+                pathlib.Path(cache_dir, key).unlink()
+                continue
+            entry_dir = pathlib.Path(cache_dir) / key[:2] / key
+            entry_fp = entry_dir / ENTRY_FN
+            if entry_fp.exists():
+                entry_fp.unlink()
+            shutil.rmtree(entry_dir)
+            if not any(entry_dir.parent.iterdir()):
+                entry_dir.parent.rmdir()
+
+
+def parse_size(size_str: str) -> int:
+    # Sizes as bytes or with a K/M/G/T suffix e.g. 50G
+    units = {'K': 2 ** 10, 'M': 2 ** 20, 'G': 2 ** 30, 'T': 2 ** 40}
+    size_str = size_str.strip().upper().rstrip('B')
+    if size_str and size_str[-1] in units:
+        return int(float(size_str[:-1]) * units[size_str[-1]])
+    return int(size_str)
+
+
+def entry():
+    # Eviction command, installed as woof-cache
+    parser = argparse.ArgumentParser(prog='woof-cache')
+    parser.add_argument('--cache_dir', required=True,
+            help='Comparison cache directory, local or S3')
+    parser.add_argument('--max_size',
+            help='Evict least recently used entries until the cache is within this size e.g. 50G')
+    parser.add_argument('--max_age_days', type=float,
+            help='Evict entries not used for more than this many days')
+    parser.add_argument('--dry_run', action='store_true',
+            help='Report entries that would be evicted without removing them')
+    args = parser.parse_args()
+    if args.max_size is None and args.max_age_days is None:
+        parser.error('at least one of --max_size or --max_age_days is required')
+    try:
+        max_size = parse_size(args.max_size) if args.max_size is not None else None
+    except ValueError:
+        parser.error(f'got bad --max_size value: {args.max_size}')
+    if not args.cache_dir.startswith('s3://') and not os.path.exists(args.cache_dir):
+        log.render(log.ftext(f'error: cache directory does not exist: {args.cache_dir}', c='red'))
+        sys.exit(1)
+    evict(args.cache_dir, max_size, args.max_age_days, args.dry_run)
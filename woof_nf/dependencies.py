@@ -1,24 +1,21 @@
-import distutils.version
+import concurrent.futures
+import json
+import os
+import pathlib
 import re
 import shutil
 import subprocess
 import sys
 import textwrap
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 
 
+from . import __version__
 from . import log
 from . import table
 
 
 SOFTWARE_DEPENDENCIES: Dict[str, Dict] = {
-    'aws': {
-        'min': '2.0.0',
-        'max': None,
-        'arg': '--version',
-        'regex': '^aws-cli/([0-9.]+)',
-        'context': {'aws_executor'},
-    },
     'bcftools': {
         'min': '1.12',
         'max': None,
@@ -70,32 +67,58 @@ R_PACKAGES = (
 )
 
 
-def check(executor: str, docker: bool) -> None:
+def check(executor: str, docker: bool, recheck: bool = False) -> None:
     # Check software tools and then R packages. Logic to determine presence of R packages
     # considerably different and so is separated
     # When docker is set to be used, only check for dependencies required to launch tasks
     log.task_msg_title('Checking dependencies')
-    check_tools(executor, docker)
-    check_rpackages(docker)
+    # Probe all tools and R packages concurrently, reusing cached results where the binary and R
+    # libraries are unchanged. Probes do not log; results are rendered below in a fixed order.
+    cache = dict() if recheck else read_cache()
+    cache_tools = cache.get('tools', dict())
+    tools_probe = [tool for tool in SOFTWARE_DEPENDENCIES if get_tool_context_status(tool, executor, docker) is None]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(tools_probe) + 1) as executor_pool:
+        futures_tool = {
+            tool: executor_pool.submit(probe_tool_version, tool, cache_tools.get(tool))
+            for tool in tools_probe
+        }
+        future_rpackages = None
+        if not docker:
+            future_rpackages = executor_pool.submit(probe_rpackages, cache.get('rpackages'))
+        tool_probes = {tool: future.result() for tool, future in futures_tool.items()}
+        rpackage_probe = future_rpackages.result() if future_rpackages else None
+    # Update cache with successful probes
+    for tool, probe in tool_probes.items():
+        if probe and not probe['errors']:
+            cache_tools[tool] = probe
+    cache['tools'] = cache_tools
+    if rpackage_probe and not rpackage_probe['errors']:
+        cache['rpackages'] = rpackage_probe
+    write_cache(cache)
+    # Render results
+    check_tools(executor, docker, tool_probes)
+    check_rpackages(docker, rpackage_probe)
+
 
+def get_tool_context_status(tool: str, executor: str, docker: bool) -> Optional[Tuple[str, str, str]]:
+    # Returns a status for tools that are not required in the current context, otherwise None
+    # docker: with local executor + docker only
+    if executor != 'local' and 'docker' in SOFTWARE_DEPENDENCIES[tool].get('context', set()):
+        return (tool, '-', 'not used')
+    elif not docker and 'docker' in SOFTWARE_DEPENDENCIES[tool].get('context', set()):
+        return (tool, '-', 'not used')
+    # dockerised software: with local executor + *not* docker only
+    elif docker and SOFTWARE_DEPENDENCIES[tool].get('dockerised', False):
+        return (tool, '-', 'docker')
+    return None
 
-def check_tools(executor: str, docker: bool) -> None:
+
+def check_tools(executor: str, docker: bool, tool_probes: Dict[str, Optional[Dict]]) -> None:
     log.render('\nTool status:')
     tool_status_results = list()
     for tool in SOFTWARE_DEPENDENCIES:
-        # aws-cli: aws executor only
-        if executor != 'aws' and 'aws_executor' in SOFTWARE_DEPENDENCIES[tool].get('context', set()):
-            tool_status = (tool, '-', 'not used')
-        # docker: with local executor + docker only
-        elif executor != 'local' and 'docker' in SOFTWARE_DEPENDENCIES[tool].get('context', set()):
-            tool_status = (tool, '-', 'not used')
-        elif not docker and 'docker' in SOFTWARE_DEPENDENCIES[tool].get('context', set()):
-            tool_status = (tool, '-', 'not used')
-        # dockerised software: with local executor + *not* docker only
-        elif docker and SOFTWARE_DEPENDENCIES[tool].get('dockerised', False):
-            tool_status = (tool, '-', 'docker')
-        else:
-            tool_status = get_tool_status(tool)
+        if not (tool_status := get_tool_context_status(tool, executor, docker)):
+            tool_status = get_tool_status(tool, tool_probes[tool])
         tool_status_results.append(tool_status)
     # Prepare rows and render
     rows, missing_errors = prepare_tool_status_rows(tool_status_results)
@@ -105,15 +128,46 @@ def check_tools(executor: str, docker: bool) -> None:
         print_missing_error(missing_errors)
 
 
-def get_tool_status(tool: str) -> Tuple[str, str, str]:
-    version_arg = SOFTWARE_DEPENDENCIES[tool]['arg']
-    version_regex = SOFTWARE_DEPENDENCIES[tool]['regex']
+def get_tool_status(tool: str, probe: Optional[Dict]) -> Tuple[str, str, str]:
     min_version = SOFTWARE_DEPENDENCIES[tool]['min']
     max_version = SOFTWARE_DEPENDENCIES[tool]['max']
+    # Tool not in PATH
+    if probe is None:
+        return tool, '-', 'not found'
+    if probe['errors']:
+        for error in probe['errors']:
+            log.render(error)
+        sys.exit(1)
+    version = probe['version']
+    # Check tool version
+    if min_version and parse_version(version) < parse_version(min_version):
+        status = 'too old'
+    elif max_version and parse_version(version) > parse_version(max_version):
+        status = 'too new'
+    else:
+        status = 'good'
+    return tool, version, status
+
+
+def parse_version(version: str) -> Tuple[int, ...]:
+    # Compare versions by numeric components only e.g. '0.69-8' -> (0, 69, 8). Avoids importing
+    # distutils, which is slow to load and deprecated.
+    return tuple(int(token) for token in re.findall(r'[0-9]+', version))
+
+
+def probe_tool_version(tool: str, cache_entry: Optional[Dict]) -> Optional[Dict]:
+    # Get tool version, using cache entry if the resolved binary is unchanged. Any errors are
+    # returned for rendering by the caller.
+    version_arg = SOFTWARE_DEPENDENCIES[tool]['arg']
+    version_regex = SOFTWARE_DEPENDENCIES[tool]['regex']
     # Check tool is in PATH
     tool_path = shutil.which(tool)
     if tool_path == None:
-        return tool, '-', 'not found'
+        return None
+    tool_path = os.path.realpath(tool_path)
+    probe = {'path': tool_path, 'mtime': get_mtime(tool_path), 'version': None, 'errors': list()}
+    if cache_entry and cache_entry['path'] == probe['path'] and cache_entry['mtime'] == probe['mtime']:
+        return cache_entry
     # Run command to get version
     command = f'{tool} {version_arg}'
     process_result = subprocess.run(
@@ -124,30 +178,26 @@ def get_tool_status(tool: str) -> Tuple[str, str, str]:
         encoding='utf-8'
     )
     if process_result.returncode != 0:
-        log.render(log.ftext(f'error: got bad return code for {command}', c='red'))
-        log.render(log.ftext(f'\ncommand used:', f='bold'))
-        log.render(command)
-        log.render(log.ftext(f'\nresult:', f='bold'))
-        log.render(process_result.stdout)
-        sys.exit(1)
+        probe['errors'] = [
+            log.ftext(f'error: got bad return code for {command}', c='red'),
+            log.ftext(f'\ncommand used:', f='bold'),
+            command,
+            log.ftext(f'\nresult:', f='bold'),
+            process_result.stdout,
+        ]
+        return probe
     regex_result = re.search(version_regex, process_result.stdout, re.MULTILINE)
     if regex_result:
-        version = regex_result.group(1)
+        probe['version'] = regex_result.group(1)
     else:
-        log.render(log.ftext(f'\nerror: failed to get software version for {tool}', c='red'))
-        log.render(log.ftext(f'\ncommand used:', f='bold'))
-        log.render(command)
-        log.render(log.ftext(f'\nresult:', f='bold'))
-        log.render(process_result.stdout)
-        sys.exit(1)
-    # Check tool version
-    if min_version and distutils.version.LooseVersion(version) < min_version:
-        status = 'too old'
-    elif max_version and distutils.version.LooseVersion(version) > max_version:
-        status = 'too new'
-    else:
-        status = 'good'
-    return tool, version, status
+        probe['errors'] = [
+            log.ftext(f'\nerror: failed to get software version for {tool}', c='red'),
+            log.ftext(f'\ncommand used:', f='bold'),
+            command,
+            log.ftext(f'\nresult:', f='bold'),
+            process_result.stdout,
+        ]
+    return probe
 
 
 def prepare_tool_status_rows(tool_status_results: List) -> Tuple:
@@ -189,7 +239,7 @@ def prepare_tool_status_rows(tool_status_results: List) -> Tuple:
     return rows, missing_errors
 
 
-def check_rpackages(docker: bool) -> None:
+def check_rpackages(docker: bool, rpackage_probe: Optional[Dict]) -> None:
     log.render('R package status:')
     if docker:
         missing_errors = None
@@ -197,7 +247,7 @@ def check_rpackages(docker: bool) -> None:
         for package in R_PACKAGES:
             rpackage_status_results.append((package, 'docker'))
     else:
-        rpackage_status_results, missing_errors = get_rpackage_status()
+        rpackage_status_results, missing_errors = get_rpackage_status(rpackage_probe)
     # Prepare and then render table rows
     rows = prepare_rpackage_status_rows(rpackage_status_results)
     table.render_table(rows)
@@ -206,13 +256,41 @@ def check_rpackages(docker: bool) -> None:
         print_missing_error(missing_errors)
 
 
-def get_rpackage_status() -> Tuple:
+def get_rpackage_status(rpackage_probe: Optional[Dict]) -> Tuple:
+    if rpackage_probe is None:
+        log.render(log.ftext('error: could not find Rscript in PATH', c='red'))
+        sys.exit(1)
+    if rpackage_probe['errors']:
+        for error in rpackage_probe['errors']:
+            log.render(error)
+        sys.exit(1)
+    missing_packages = set(rpackage_probe['missing'])
+    package_status = list()
+    for package in R_PACKAGES:
+        if package in missing_packages:
+            status = 'not found'
+        else:
+            status = 'good'
+        package_status.append((package, status))
+    return package_status, missing_packages
+
+
+def probe_rpackages(cache_entry: Optional[Dict]) -> Optional[Dict]:
+    # Determine missing R packages and R library paths. A cache entry is reused if Rscript, all R
+    # library paths, and the set of required packages are unchanged.
+    rscript_path = shutil.which('Rscript')
+    if rscript_path == None:
+        return None
+    rscript_path = os.path.realpath(rscript_path)
+    if cache_entry and is_rpackage_cache_valid(cache_entry, rscript_path):
+        return cache_entry
     packages_str = 'NULL'
     for package in R_PACKAGES:
         packages_str += f", '{package}'"
     rscript = textwrap.dedent(f'''
         v.packages <- setdiff(c({packages_str}), rownames(installed.packages()))
-        for (s.package in v.packages) {{ cat(s.package, '\n', sep='') }}
+        for (s.package in v.packages) {{ cat('missing', s.package, '\n', sep='\t') }}
+        for (s.path in .libPaths()) {{ cat('libpath', s.path, '\n', sep='\t') }}
     ''')
     command = f'Rscript -e "{rscript}"'
     process_result = subprocess.run(
@@ -222,23 +300,77 @@ def get_rpackage_status() -> Tuple:
         shell=True,
         encoding='utf-8'
     )
+    probe = {
+        'rscript': rscript_path,
+        'rscript_mtime': get_mtime(rscript_path),
+        'packages': list(R_PACKAGES),
+        'missing': list(),
+        'lib_paths': dict(),
+        'errors': list(),
+    }
     if process_result.returncode != 0:
-        log.render(f'error: got bad return code for {command}')
-        sys.exit(1)
-    # Get set of missing packages; `split` called on '' produces list with one empty string,
-    # handled by manually setting to empty set
-    if process_result.stdout:
-        missing_packages = set(process_result.stdout.rstrip().split('\n'))
-    else:
-        missing_packages = set()
-    package_status = list()
-    for package in R_PACKAGES:
-        if package in missing_packages:
-            status = 'not found'
-        else:
-            status = 'good'
-        package_status.append((package, status))
-    return package_status, missing_packages
+        probe['errors'] = [f'error: got bad return code for {command}']
+        return probe
+    for line in process_result.stdout.splitlines():
+        if not line:
+            continue
+        line_type, value = line.split('\t')[:2]
+        if line_type == 'missing':
+            probe['missing'].append(value)
+        elif line_type == 'libpath':
+            probe['lib_paths'][value] = get_mtime(value)
+    return probe
+
+
+def is_rpackage_cache_valid(cache_entry: Dict, rscript_path: str) -> bool:
+    if cache_entry['rscript'] != rscript_path:
+        return False
+    if cache_entry['rscript_mtime'] != get_mtime(rscript_path):
+        return False
+    if cache_entry['packages'] != list(R_PACKAGES):
+        return False
+    # Installing or removing a package modifies the library directory mtime
+    for lib_path, mtime in cache_entry['lib_paths'].items():
+        if get_mtime(lib_path) != mtime:
+            return False
+    return True
+
+
+def get_mtime(path: str) -> Optional[float]:
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def get_cache_fp() -> pathlib.Path:
+    cache_dir = os.environ.get('XDG_CACHE_HOME', pathlib.Path.home() / '.cache')
+    return pathlib.Path(cache_dir, 'woof-nf', 'dependencies.json')
+
+
+def read_cache() -> Dict:
+    cache_fp = get_cache_fp()
+    try:
+        with cache_fp.open('r') as fh:
+            cache = json.load(fh)
+    except (OSError, ValueError):
+        return dict()
+    # Discard cache written by another version of woof-nf
+    if cache.get('version') != __version__:
+        return dict()
+    return cache
+
+
+def write_cache(cache: Dict) -> None:
+    # Failing to write the cache is not fatal
+    cache['version'] = __version__
+    cache_fp = get_cache_fp()
+    try:
+        cache_fp.parent.mkdir(parents=True, exist_ok=True)
+        with cache_fp.open('w') as fh:
+            json.dump(cache, fh, indent=2)
+    except OSError:
+        pass
 
 
 def prepare_rpackage_status_rows(rpackage_status_results: List) -> List[table.Row]:
@@ -0,0 +1,408 @@
+import concurrent.futures
+import gzip
+import io
+import pathlib
+from typing import Dict, List, Optional, Tuple
+
+
+from . import log
+from . import table
+from . import utility
+
+
+# Written to the output directory to flag identical pairs in the report
+IDENTICAL_INPUTS_FN = 'identical_inputs.tsv'
+HASH_WORKERS = 8
+
+# Column headers of workflow outputs that are written here for identical pairs
+SMLV_COMPARISON_HEADER = (
+    'sample',
+    'flabel',
+    'subset',
+    'SNP_Truth',
+    'SNP_TP',
+    'SNP_FP',
+    'SNP_FN',
+    'SNP_Recall',
+    'SNP_Precision',
+    'SNP_f1',
+    'SNP_f2',
+    'SNP_f3',
+    'IND_Truth',
+    'IND_TP',
+    'IND_FP',
+    'IND_FN',
+    'IND_Recall',
+    'IND_Precision',
+    'IND_f1',
+    'IND_f2',
+    'IND_f3',
+)
+SMLV_COUNTS_HEADER = ('vcf_type', 'run', 'source', 'count')
+SMLV_CONCORDANCE_HEADER = (
+    'sample',
+    'flabel',
+    'subset',
+    'paired',
+    'unpaired',
+    'gt_compared',
+    'gt_concordant',
+    'gt_concordance',
+    'af_compared',
+    'af_delta_mean',
+    'af_delta_abs_mean',
+    'dp_compared',
+    'dp_delta_mean',
+)
+SMLV_CONCORDANCE_HIST_HEADER = ('sample', 'flabel', 'subset', 'metric', 'bin', 'count')
+SV_METRICS_HEADER = ('sample', 'flabel', 'run1_count', 'run2_count', 'Recall', 'Precision', 'Truth', 'TP', 'FP', 'FN')
+SV_FPFN_HEADER = ('FP_or_FN', 'sample', 'flabel', 'chrom1', 'pos1', 'chrom2', 'pos2', 'svtype')
+CNV_DIFF_HEADER = (
+    'chrom',
+    'start',
+    'end',
+    'gene',
+    'min_cn.run1',
+    'max_cn.run1',
+    'min_cn.run2',
+    'max_cn.run2',
+    'min_diff',
+    'max_diff',
+)
+CNV_DIFF_COORD_HEADER = ('fp_or_fn', 'chrom', 'start', 'end', 'gene', 'min_cn', 'max_cn')
+
+
+class VcfCounts:
+
+    def __init__(self):
+        self.header_lines = list()
+        # Keyed by subset: all records ('pass') and PASS records ('filtered'), as named by the workflow
+        self.snps = {'pass': 0, 'filtered': 0}
+        self.indels = {'pass': 0, 'filtered': 0}
+        # Records with a GT field in FORMAT
+        self.genotyped = {'pass': 0, 'filtered': 0}
+
+    def total(self, subset: str) -> int:
+        return self.snps[subset] + self.indels[subset]
+
+
+def detect(input_data: Dict) -> Dict:
+    # Find matched pairs whose two files are byte-identical. S3 objects are compared by size and
+    # ETag from the listing, local files by size and then a streaming MD5. Returns pair -> method
+    file_pairs = list()
+    for source_files in input_data.values():
+        for file_type_pair in source_files.file_list.values():
+            for file_pair in file_type_pair.values():
+                # Cheap size check first so that only candidate pairs are hashed
+                if file_pair.is_matched and file_pair.file_one.file_size == file_pair.file_two.file_size:
+                    file_pairs.append(file_pair)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=HASH_WORKERS) as executor:
+        methods = list(executor.map(get_identical_method, file_pairs))
+    utility.write_checksum_cache()
+    file_pairs_identical = {fp: m for fp, m in zip(file_pairs, methods) if m is not None}
+    if file_pairs_identical:
+        render_table(file_pairs_identical)
+    return file_pairs_identical
+
+
+def get_identical_method(file_pair) -> Optional[str]:
+    # Returns how the pair was determined to be identical, or None if it is not
+    file_one, file_two = file_pair.file_one, file_pair.file_two
+    if file_one.file_size is None:
+        return None
+    if file_one.checksum and file_two.checksum:
+        # Multipart ETags depend on part size so differing ETags are not proof of difference; these
+        # pairs are conservatively compared by the workflow
+        return 'etag' if file_one.checksum == file_two.checksum else None
+    elif file_one.checksum or file_two.checksum:
+        # Single part ETags are the MD5 of the object and can be compared with a local file
+        etag = file_one.checksum or file_two.checksum
+        filepath_local = file_two.filepath if file_one.checksum else file_one.filepath
+        if '-' in etag:
+            return None
+        return 'md5' if utility.get_input_checksum(filepath_local) == etag else None
+    else:
+        # Checksums are shared with the comparison cache and VCF profiles, each file is hashed once
+        md5_one = utility.get_input_checksum(file_one.filepath)
+        md5_two = utility.get_input_checksum(file_two.filepath)
+        return 'md5' if md5_one == md5_two else None
+
+
+def render_table(file_pairs_identical: Dict) -> None:
+    log.render(log.ftext('Identical inputs:', f='bold'), end=' ')
+    log.render(f'{len(file_pairs_identical)} pairs will not be compared by the workflow:')
+    rows = [table.Row(('Sample name', 'Run type', 'Data source', 'Method'), header=True)]
+    for file_pair, method in file_pairs_identical.items():
+        rows.append(table.Row((file_pair.sample_name, file_pair.run_type, file_pair.data_source, method)))
+    table.render_table(rows)
+    log.render_newline()
+
+
+def write_outputs(
+    file_pairs_identical: Dict,
+    output_dir: pathlib.Path,
+    output_remote_dir: Optional[str] = None,
+    regions=None
+) -> None:
+    # Write trivially concordant outputs in place of those created by the workflow. Small variant
+    # counts are restricted to target regions, if any, as in the workflow
+    counts_rows: Dict[Tuple[str, str], List] = dict()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=HASH_WORKERS) as executor:
+        futures = {
+            executor.submit(write_pair_outputs, file_pair, output_dir, regions): file_pair
+            for file_pair in file_pairs_identical
+        }
+        for future, file_pair in futures.items():
+            rows = future.result()
+            if not rows:
+                continue
+            key = (file_pair.sample_name, file_pair.run_type)
+            if key not in counts_rows:
+                counts_rows[key] = list()
+            counts_rows[key].extend(rows)
+    # Small variant counts are kept separate from the workflow counts.tsv, which would overwrite them
+    for (sample_name, run_type), rows in counts_rows.items():
+        counts_fp = output_dir / sample_name / run_type / 'small_variants/counts_identical.tsv'
+        write_tsv(counts_fp, SMLV_COUNTS_HEADER, rows)
+    identical_rows = list()
+    for file_pair, method in file_pairs_identical.items():
+        identical_rows.append((
+            file_pair.sample_name,
+            file_pair.run_type,
+            file_pair.data_type,
+            file_pair.data_source,
+            method,
+            file_pair.file_one.filepath,
+            file_pair.file_two.filepath,
+        ))
+    identical_header = (
+        'sample_name',
+        'run_type',
+        'data_type',
+        'data_source',
+        'method',
+        'filepath_one',
+        'filepath_two'
+    )
+    write_tsv(output_dir / IDENTICAL_INPUTS_FN, identical_header, identical_rows)
+    if output_remote_dir:
+        log.render(f'Uploading outputs of identical inputs to {output_remote_dir}')
+        utility.sync_directory_to_s3(output_dir, output_remote_dir, ('nextflow/*', 'pipeline_log_*txt'))
+        log.render_newline()
+
+
+def write_pair_outputs(file_pair, output_dir: pathlib.Path, regions=None) -> List:
+    # Returns small variant count rows, if any
+    base_dir = output_dir / file_pair.sample_name / file_pair.run_type
+    if file_pair.data_type == 'small_variants':
+        return write_smlv_outputs(file_pair, base_dir / 'small_variants', regions)
+    elif file_pair.data_type == 'structural_variants':
+        write_sv_outputs(file_pair, base_dir / 'structural_variants')
+    elif file_pair.data_type == 'copy_number_variants':
+        write_cnv_outputs(base_dir / 'copy_number_variants')
+    else:
+        assert False
+    return list()
+
+
+def write_smlv_outputs(file_pair, smlv_dir: pathlib.Path, regions=None) -> List:
+    # Shared record VCFs (0002 and 0003) hold the input records, or PASS records for the filtered
+    # source, and are written while counting so that the input is read once
+    writers = dict()
+    for subset, source in (('pass', 'input'), ('filtered', 'filtered')):
+        intersect_dir = smlv_dir / '2_variants_intersect' / source / file_pair.data_source
+        writers[subset] = SharedVcfWriter((intersect_dir / '0002.vcf.gz', intersect_dir / '0003.vcf.gz'))
+    try:
+        counts = count_vcf_records(
+            file_pair.file_one.filepath,
+            regions,
+            file_pair.file_one.index_filepath,
+            writers
+        )
+    finally:
+        for writer in writers.values():
+            writer.close()
+    counts_rows = list()
+    for subset, source, fn_suffix in (('pass', 'input', ''), ('filtered', 'filtered', '_filtered')):
+        # Comparison metrics with all variants true positives
+        comparison_dir = smlv_dir / '3_comparison'
+        comparison_row = [file_pair.sample_name, file_pair.data_source, subset]
+        for variant_count in (counts.snps[subset], counts.indels[subset]):
+            score = 1 if variant_count else 0
+            comparison_row.extend((variant_count, variant_count, 0, 0, score, score, score, score, score))
+        write_tsv(comparison_dir / f'{file_pair.data_source}{fn_suffix}.tsv', SMLV_COMPARISON_HEADER, [comparison_row])
+        # All shared records are paired with concordant genotypes. AF and DP are not extracted here
+        # and so are reported as not compared, with empty histograms
+        total = counts.total(subset)
+        genotyped = counts.genotyped[subset]
+        concordance_row = (
+            file_pair.sample_name,
+            file_pair.data_source,
+            subset,
+            total,
+            0,
+            genotyped,
+            genotyped,
+            1 if genotyped else 'NaN',
+            0,
+            'NaN',
+            'NaN',
+            0,
+            'NaN',
+        )
+        concordance_fp = comparison_dir / f'{file_pair.data_source}{fn_suffix}_concordance.tsv'
+        write_tsv(concordance_fp, SMLV_CONCORDANCE_HEADER, [concordance_row])
+        concordance_hist_fp = comparison_dir / f'{file_pair.data_source}{fn_suffix}_concordance_hist.tsv'
+        write_tsv(concordance_hist_fp, SMLV_CONCORDANCE_HIST_HEADER, list())
+        # Empty FP and FN VCFs
+        intersect_dir = smlv_dir / '2_variants_intersect' / source / file_pair.data_source
+        for vcf_fn in ('0000.vcf.gz', '0001.vcf.gz'):
+            write_vcf_header(intersect_dir / vcf_fn, counts.header_lines)
+        # Counts for each input VCF and intersect VCF, as generated by the workflow
+        counts_rows.append((file_pair.data_source, 'one', subset, total))
+        counts_rows.append((file_pair.data_source, 'two', subset, total))
+        for vcf_name, vcf_count in (('0000', 0), ('0001', 0), ('0002', total)):
+            counts_rows.append((f'{file_pair.data_source}__intersect__{vcf_name}', 'none', subset, vcf_count))
+    return counts_rows
+
+
+def write_sv_outputs(file_pair, sv_dir: pathlib.Path) -> None:
+    # Record counts are of PASS records
+    counts = count_vcf_records(file_pair.file_one.filepath)
+    total = counts.total('filtered')
+    score = 1 if total else 'NaN'
+    metrics_row = (file_pair.sample_name, file_pair.data_source, total, total, score, score, total, total, 0, 0)
+    write_tsv(sv_dir / 'eval_metrics.tsv', SV_METRICS_HEADER, [metrics_row])
+    write_tsv(sv_dir / 'fpfn.tsv', SV_FPFN_HEADER, list())
+
+
+def write_cnv_outputs(cnv_dir: pathlib.Path) -> None:
+    # No differences
+    write_tsv(cnv_dir / 'cn_diff.tsv', CNV_DIFF_HEADER, list())
+    write_tsv(cnv_dir / 'cn_diff_coord.tsv', CNV_DIFF_COORD_HEADER, list())
+
+
+def count_vcf_records(
+    filepath: str,
+    regions=None,
+    index_filepath: Optional[str] = None,
+    writers: Optional[Dict] = None
+) -> VcfCounts:
+    from . import bgzf
+    # SNP/indel classification matches woof_compare.count_variants; PASS includes missing filters
+    # as with the workflow PASS filter. Records are optionally written to a writer for each subset
+    counts = VcfCounts()
+    if writers:
+        for writer in writers.values():
+            writer.header_lines = counts.header_lines
+    if regions and bgzf.is_indexed(index_filepath):
+        # Only blocks overlapping regions are read, with ranged reads for S3 VCFs
+        with bgzf.open_indexed(filepath, index_filepath) as vcf:
+            counts.header_lines.extend(vcf.get_header_lines())
+            add_record_counts(counts, iterate_region_records(vcf, regions), writers)
+    else:
+        add_record_counts(counts, iterate_records(filepath, counts.header_lines, regions), writers)
+    return counts
+
+
+def add_record_counts(counts: VcfCounts, records, writers: Optional[Dict] = None) -> None:
+    for tokens in records:
+        ref, alt, filter_value = tokens[3], tokens[4], tokens[6]
+        variant_counts = counts.snps if len(ref) == len(alt) == 1 else counts.indels
+        # Records are tokenised to differing depths; rejoin to get FORMAT and to write
+        line = '\t'.join(tokens).rstrip('\n')
+        fields = line.split('\t', 9)
+        genotyped = len(fields) > 8 and 'GT' in fields[8].split(':')
+        subsets = ('pass', 'filtered') if filter_value in {'.', 'PASS'} else ('pass',)
+        for subset in subsets:
+            variant_counts[subset] += 1
+            counts.genotyped[subset] += genotyped
+            if writers:
+                writers[subset].write(line)
+
+
+def iterate_records(filepath: str, header_lines: List[str], regions=None):
+    with open_text(filepath) as fh:
+        for line in fh:
+            if line.startswith('#'):
+                header_lines.append(line)
+                continue
+            tokens = line.split('\t', 7)
+            if regions and not regions.overlaps(tokens[0], int(tokens[1]), len(tokens[3])):
+                continue
+            yield tokens
+
+
+def iterate_region_records(vcf, regions):
+    # Records overlapping more than one region are yielded for the first only. Contig names must
+    # match exactly, as with bcftools -R in the workflow
+    for contig, intervals in regions.intervals.items():
+        if contig not in vcf.index.bins:
+            continue
+        end_previous = None
+        for start, end in intervals:
+            for tokens in vcf.fetch(contig, start, end):
+                if end_previous is None or int(tokens[1]) - 1 >= end_previous:
+                    yield tokens
+            end_previous = end
+
+
+def open_text(filepath: str):
+    # Stream local or S3 files, decompressing gzipped files
+    if filepath.startswith('s3://'):
+        import boto3
+        bucket_name, key = utility.get_bucket_and_key(filepath)
+        response = boto3.client('s3').get_object(Bucket=bucket_name, Key=key)
+        fh = response['Body']
+        if filepath.endswith('.gz'):
+            fh = gzip.GzipFile(fileobj=fh)
+    elif filepath.endswith('.gz'):
+        # Opened by filename so that closing the GzipFile also closes the file
+        fh = gzip.open(filepath, 'rb')
+    else:
+        fh = open(filepath, 'rb')
+    return io.TextIOWrapper(fh, encoding='utf-8')
+
+
+class SharedVcfWriter:
+
+    # Writes the same records to several VCFs. Files are opened on the first record, or on close,
+    # as header lines are only complete once the first record has been read
+    def __init__(self, output_fps: Tuple[pathlib.Path, ...]):
+        self.output_fps = output_fps
+        self.header_lines: List[str] = list()
+        self.fhs = None
+
+    def open(self) -> None:
+        self.fhs = list()
+        for output_fp in self.output_fps:
+            output_fp.parent.mkdir(parents=True, exist_ok=True)
+            fh = gzip.open(output_fp, 'wt')
+            fh.writelines(self.header_lines)
+            self.fhs.append(fh)
+
+    def write(self, line: str) -> None:
+        if self.fhs is None:
+            self.open()
+        for fh in self.fhs:
+            print(line, file=fh)
+
+    def close(self) -> None:
+        if self.fhs is None:
+            self.open()
+        for fh in self.fhs:
+            fh.close()
+
+
+def write_vcf_header(output_fp: pathlib.Path, header_lines: List[str]) -> None:
+    output_fp.parent.mkdir(parents=True, exist_ok=True)
+    with gzip.open(output_fp, 'wt') as fh:
+        fh.writelines(header_lines)
+
+
+def write_tsv(output_fp: pathlib.Path, header: Tuple, rows: List) -> None:
+    output_fp.parent.mkdir(parents=True, exist_ok=True)
+    with output_fp.open('w') as fh:
+        print(*header, sep='\t', file=fh)
+        for row in rows:
+            print(*row, sep='\t', file=fh)
@@ -0,0 +1,243 @@
+import concurrent.futures
+import pathlib
+import sys
+from typing import Dict, List, Optional, Tuple
+
+
+from . import log
+from . import table
+
+
+# Sample identity check. Genotypes at a fixed panel of common SNP sites (--identity_sites) are
+# sketched for each sample of both runs into bit-packed arrays, and all samples of run one are
+# compared with all samples of run two so that mismatched or swapped samples are flagged before
+# the workflow is run
+SKETCH_WORKERS = 8
+# Small variant data sources in order of preference for sketching, germline calls first
+SKETCH_DATA_SOURCES = (
+    'normal-gatk',
+    'normal-ensemble',
+    'normal-strelka2',
+    'normal-vardict',
+    'cpsr',
+    'tumour-ensemble',
+    'pcgr',
+)
+# Minimum similarity of samples considered the same individual, and minimum number of informative
+# (non-reference in either sample) sites for a comparison to be assessed
+SIMILARITY_THRESHOLD = 0.8
+INFORMATIVE_SITES_MIN = 20
+
+
+class Sketch:
+
+    def __init__(self, input_file, het: int, hom: int):
+        # Bit i of het/hom is set when site i is heterozygous/homozygous alternate; sites absent
+        # from the VCF are taken as homozygous reference
+        self.input_file = input_file
+        self.sample_name = input_file.sample_name
+        self.run_type = input_file.run_type
+        self.het = het
+        self.hom = hom
+
+    def compare(self, other: 'Sketch') -> Tuple[float, int]:
+        # Fraction of informative sites with matching genotypes
+        informative = popcount((self.het | self.hom) | (other.het | other.hom))
+        matching = popcount(self.het & other.het) + popcount(self.hom & other.hom)
+        return (matching / informative if informative else 0.0), informative
+
+
+class SampleCheck:
+
+    def __init__(self, sample_name, run_type, similarity, informative, best_match, status):
+        self.sample_name = sample_name
+        self.run_type = run_type
+        self.similarity = similarity
+        self.informative = informative
+        self.best_match = best_match
+        self.status = status
+
+
+def popcount(value: int) -> int:
+    return bin(value).count('1')
+
+
+def read_sites(sites_fp: pathlib.Path) -> List[Tuple[str, int]]:
+    # Sites from a BED file, as zero-based positions
+    sites = list()
+    with sites_fp.open('r') as fh:
+        for i, line in enumerate(fh, 1):
+            if not line.strip() or line.startswith(('#', 'track', 'browser')):
+                continue
+            tokens = line.rstrip('\n').split('\t')
+            try:
+                sites.append((tokens[0], int(tokens[1])))
+            except (IndexError, ValueError):
+                msg = f'--identity_sites line {i} is not a valid BED record: {line.rstrip()}'
+                log.render(log.ftext(f'error: {msg}', c='red'))
+                sys.exit(1)
+    if not sites:
+        msg = f'--identity_sites file contains no sites: {sites_fp}'
+        log.render(log.ftext(f'error: {msg}', c='red'))
+        sys.exit(1)
+    return sorted(set(sites))
+
+
+def check(input_data: Dict, sites: List[Tuple[str, int]]) -> List[SampleCheck]:
+    log.task_msg_title('Checking sample identity')
+    log.render_newline()
+    # Select one small variant input per sample and run
+    inputs_one = dict()
+    inputs_two = dict()
+    for source_files in input_data.values():
+        for file_type_pair in source_files.file_list.values():
+            for file_pair in file_type_pair.values():
+                for input_file, run_inputs in ((file_pair.file_one, inputs_one), (file_pair.file_two, inputs_two)):
+                    if input_file is None or input_file.data_source not in SKETCH_DATA_SOURCES:
+                        continue
+                    key = (input_file.run_type, input_file.sample_name)
+                    rank = SKETCH_DATA_SOURCES.index(input_file.data_source)
+                    if key not in run_inputs or rank < SKETCH_DATA_SOURCES.index(run_inputs[key].data_source):
+                        run_inputs[key] = input_file
+    with concurrent.futures.ThreadPoolExecutor(max_workers=SKETCH_WORKERS) as executor:
+        sketches_one = list(executor.map(lambda f: create_sketch(f, sites), inputs_one.values()))
+        sketches_two = list(executor.map(lambda f: create_sketch(f, sites), inputs_two.values()))
+    sample_checks = compare_sketches(sketches_one, sketches_two)
+    render_table(sample_checks, len(sites))
+    return sample_checks
+
+
+def create_sketch(input_file, sites: List[Tuple[str, int]]) -> Sketch:
+    from . import bgzf
+    # Indexed VCFs are read by index for each site, with ranged reads for S3 VCFs, otherwise the
+    # VCF is streamed
+    if bgzf.is_indexed(input_file.index_filepath):
+        with bgzf.open_indexed(input_file.filepath, input_file.index_filepath) as vcf:
+            records = (
+                (i, tokens)
+                for i, (contig, position) in enumerate(sites)
+                for tokens in vcf.fetch(contig, position, position + 1)
+                if int(tokens[1]) - 1 == position
+            )
+            het, hom = get_genotype_bits(records)
+    else:
+        # Match contig names with or without the 'chr' prefix
+        site_index = dict()
+        for i, (contig, position) in enumerate(sites):
+            site_index[(contig, position)] = i
+            site_index[(contig[3:] if contig.startswith('chr') else f'chr{contig}', position)] = i
+        contigs = {contig for contig, position in site_index}
+        records = (
+            (site_index.get((tokens[0], int(tokens[1]) - 1)), tokens)
+            for tokens in iterate_records(input_file.filepath, contigs)
+        )
+        het, hom = get_genotype_bits(records)
+    return Sketch(input_file, het, hom)
+
+
+def get_genotype_bits(records) -> Tuple[int, int]:
+    # Set bit i of het/hom for heterozygous/homozygous alternate genotypes at site i
+    het = 0
+    hom = 0
+    for i, tokens in records:
+        if i is None:
+            continue
+        genotype = get_genotype(tokens)
+        if genotype == 1:
+            het |= 1 << i
+        elif genotype == 2:
+            hom |= 1 << i
+    return het, hom
+
+
+def iterate_records(filepath: str, contigs):
+    from . import identical
+    with identical.open_text(filepath) as fh:
+        for line in fh:
+            if line.startswith('#'):
+                continue
+            tokens = line.split('\t', 10)
+            if tokens[0] in contigs:
+                yield tokens
+
+
+def get_genotype(tokens: List[str]) -> Optional[int]:
+    # Number of alternate alleles in the first sample genotype; one for records without samples
+    if len(tokens) < 10:
+        return 1
+    format_keys = tokens[8].split(':')
+    if 'GT' not in format_keys:
+        return 1
+    sample_values = tokens[9].rstrip('\n').split('\t')[0].split(':')
+    gt_index = format_keys.index('GT')
+    if gt_index >= len(sample_values):
+        return None
+    alleles = sample_values[gt_index].replace('|', '/').split('/')
+    if '.' in alleles:
+        return None
+    return min(2, sum(1 for allele in alleles if allele != '0'))
+
+
+def compare_sketches(sketches_one: List[Sketch], sketches_two: List[Sketch]) -> List[SampleCheck]:
+    # All-vs-all comparison within each run type; each sample of run one is assessed against the
+    # run two sample of the same name and its best match in run two
+    sample_checks = list()
+    for sketch_one in sketches_one:
+        candidates = [s for s in sketches_two if s.run_type == sketch_one.run_type]
+        scores = {s.sample_name: sketch_one.compare(s) for s in candidates}
+        if not scores:
+            continue
+        best_match = max(scores, key=lambda n: scores[n][0])
+        if sketch_one.sample_name not in scores:
+            similarity, informative = scores[best_match]
+            if informative < INFORMATIVE_SITES_MIN or similarity < SIMILARITY_THRESHOLD:
+                status = 'unmatched'
+            else:
+                status = 'renamed'
+        else:
+            similarity, informative = scores[sketch_one.sample_name]
+            if informative < INFORMATIVE_SITES_MIN:
+                status = 'insufficient'
+            elif similarity >= SIMILARITY_THRESHOLD:
+                status = 'ok'
+            elif best_match != sketch_one.sample_name and scores[best_match][0] >= SIMILARITY_THRESHOLD:
+                status = 'swapped'
+            else:
+                status = 'mismatch'
+        sample_checks.append(SampleCheck(
+            sketch_one.sample_name,
+            sketch_one.run_type,
+            similarity,
+            informative,
+            best_match,
+            status
+        ))
+    return sample_checks
+
+
+def render_table(sample_checks: List[SampleCheck], sites_n: int) -> None:
+    flagged = [c for c in sample_checks if c.status in ('mismatch', 'swapped', 'renamed')]
+    log.render(log.ftext('Sample identity:', f='bold'), end=' ')
+    log.render(f'genotypes at {sites_n} sites, {len(flagged)} of {len(sample_checks)} samples flagged')
+    rows = [table.Row(('Sample name', 'Run type', 'Similarity', 'Sites', 'Best match (run two)', 'Status'), header=True)]
+    for sample_check in sample_checks:
+        if sample_check.status == 'ok':
+            status = table.Cell(sample_check.status, c='green')
+        elif sample_check.status in ('insufficient', 'unmatched'):
+            status = table.Cell(sample_check.status, c='black')
+        else:
+            status = table.Cell(sample_check.status, c='red')
+        rows.append(table.Row((
+            sample_check.sample_name,
+            sample_check.run_type,
+            f'{sample_check.similarity:.3f}',
+            str(sample_check.informative),
+            sample_check.best_match,
+            status,
+        )))
+    table.render_table(rows)
+    log.render_newline()
+    if flagged:
+        msg = 'warning: sample identity check flagged samples, review inputs before interpreting results'
+        log.render(log.ftext(msg, c='yellow'))
+        log.render_newline()
@@ -15,8 +15,11 @@ def render_table(args: argparse.Namespace) -> None:
 def prepare_rows(args: argparse.Namespace) -> List[table.Row]:
     texts = (
         ('version', __version__),
+        ('comparisons', str(len(args.comparisons)) if args.comparisons else f'N-way ({len(args.run_sets)} run sets)'),
+        ('mode', table.Cell(args.mode, c='yellow') if args.mode == 'quick' else args.mode),
         ('executor', args.executor),
         ('output type', args.output_type),
+        ('publish mode', args.publish_mode),
         ('docker', table.Cell('yes', c='green') if args.docker else table.Cell('no', c='black')),
         ('resume', table.Cell('yes', c='green') if args.resume else table.Cell('no', c='black'))
     )
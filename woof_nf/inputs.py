@@ -8,6 +8,7 @@ from typing import Dict, List, Tuple
 from . import inputs_bcbio as bcbio
 from . import inputs_umccrise as umccrise
 from . import log
+from . import scheduling
 from . import table
 from . import utility
 
@@ -22,13 +23,27 @@ IGNORE_PATHS_RE = [
 
 class InputFile:
 
-    def __init__(self, sample_name, run_type, run_number, filepath, data_source, data_type):
+    def __init__(
+        self,
+        sample_name,
+        run_type,
+        run_number,
+        filepath,
+        data_source,
+        data_type,
+        file_size=None,
+        index_filepath=None,
+        checksum=None
+    ):
         self.sample_name = sample_name
         self.run_type = run_type
         self.run_number = run_number
         self.filepath = filepath
         self.data_source = data_source
         self.data_type = data_type
+        self.file_size = file_size
+        self.index_filepath = index_filepath
+        self.checksum = checksum
 
     def __repr__(self):
         fields = [
@@ -212,8 +227,11 @@ def process_input_directory(
     for data_source, regex in input_module.DATA_SOURCES.items():
         # Attempt to match known inputs
         if filepaths := utility.regex_glob(regex, dirpath, data_source):
-            [filepath] = filepaths
-            filepath = utility.get_filepath_str(filepath)
+            [filepath_entry] = filepaths
+            filepath = utility.get_filepath_str(filepath_entry)
+            file_size = utility.get_filepath_size(filepath_entry)
+            index_filepath = utility.get_vcf_index_filepath(filepath_entry)
+            checksum = utility.get_filepath_checksum(filepath_entry)
         else:
             continue
         # Get sample name and create InputFile instance
@@ -224,7 +242,10 @@ def process_input_directory(
             run_number,
             filepath,
             data_source,
-            input_module.DATA_TYPES[data_source]
+            input_module.DATA_TYPES[data_source],
+            file_size,
+            index_filepath,
+            checksum
         )
         directory_inputs.append(input_file)
     return directory_inputs
@@ -402,39 +423,78 @@ def prepare_rows(run_type_data: SourceFiles, columns: List, file_columns_display
     return rows
 
 
-def write(input_data: Dict, output_fp: pathlib.Path) -> pathlib.Path:
+def write(comparison_inputs: Dict, output_fp: pathlib.Path, file_pairs_exclude=()) -> pathlib.Path:
+    # Inputs of all comparisons are written to a single file and run in one workflow; comparison
+    # name is empty in single comparison mode
     header_tokens = (
+        'comparison_name',
         'sample_name',
         'run_type',
         'run_number',
         'data_source',
         'data_type',
-        'filepath'
+        'filepath',
+        'file_size',
+        'group_size',
+        'source_count',
+        'checksum',
+        'index_filepath'
     )
     # Create directory if required
     if not output_fp.parent.exists():
         output_fp.parent.mkdir(mode=0o700)
-    # Write inputs
-    with output_fp.open('w') as fh:
-        print(*header_tokens, sep='\t', file=fh)
+    # Unpack into flat list of matched file pairs. Sheesh, need to refactor...
+    file_pairs = list()
+    comparison_names = dict()
+    for comparison_name, input_data in comparison_inputs.items():
         for source_files in input_data.values():
-            # Unpack into flat list of intput files. Sheesh, need to refactor...
-            input_files = list()
             for file_type_pair in source_files.file_list.values():
                 for file_pair in file_type_pair.values():
-                    if not file_pair.is_matched:
+                    # Identical pairs are excluded as their outputs are written without the workflow
+                    if not file_pair.is_matched or file_pair in file_pairs_exclude:
                         continue
-                    input_files.extend((file_pair.file_one, file_pair.file_two))
-            # Write input file info to disk
-            for input_file in input_files:
-                print(
-                    input_file.sample_name,
-                    input_file.run_type,
-                    input_file.run_number,
-                    input_file.data_source,
-                    input_file.data_type,
-                    input_file.filepath,
-                    sep='\t',
-                    file=fh
-                )
+                    file_pairs.append(file_pair)
+                    comparison_names[file_pair] = comparison_name
+    # Count matched data sources for each sample, run type, and data type. Together with the number
+    # of files in each pair, this allows the workflow to group files with known sizes and emit
+    # groups as soon as they are complete
+    source_counts: Dict[Tuple[str, str, str, str], int] = collections.Counter()
+    for file_pair in file_pairs:
+        source_counts[get_source_count_key(file_pair, comparison_names[file_pair])] += 1
+    # Order by estimated cost so that the heaviest comparisons are submitted first
+    input_files = list()
+    for file_pair in scheduling.order_file_pairs(file_pairs):
+        comparison_name = comparison_names[file_pair]
+        group_size = 2
+        source_count = source_counts[get_source_count_key(file_pair, comparison_name)]
+        for input_file in (file_pair.file_one, file_pair.file_two):
+            input_files.append((comparison_name, input_file, group_size, source_count))
+    # Content checksums key the VCF profiles stored by the workflow, only needed for small variants.
+    # Files shared by several comparisons are hashed once
+    input_files_smlv = [f for c, f, g, s in input_files if f.data_type == 'small_variants']
+    checksums = dict(zip(map(id, input_files_smlv), utility.get_input_checksums(input_files_smlv)))
+    # Write inputs
+    with output_fp.open('w') as fh:
+        print(*header_tokens, sep='\t', file=fh)
+        for comparison_name, input_file, group_size, source_count in input_files:
+            print(
+                comparison_name,
+                input_file.sample_name,
+                input_file.run_type,
+                input_file.run_number,
+                input_file.data_source,
+                input_file.data_type,
+                input_file.filepath,
+                input_file.file_size if input_file.file_size is not None else 0,
+                group_size,
+                source_count,
+                checksums.get(id(input_file), ''),
+                input_file.index_filepath if input_file.index_filepath else '',
+                sep='\t',
+                file=fh
+            )
     return output_fp
+
+
+def get_source_count_key(file_pair: FilePair, comparison_name: str) -> Tuple[str, str, str, str]:
+    return (comparison_name, file_pair.sample_name, file_pair.run_type, file_pair.data_type)
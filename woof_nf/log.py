@@ -1,6 +1,7 @@
 import datetime
 import pathlib
 import re
+import threading
 from typing import Dict, List, Optional, Tuple, Union
 
 
@@ -32,6 +33,10 @@ BUFFER_LOG_MESSAGES = True
 LOG_BUFFER: List[Tuple[str, bool, Dict]] = list()
 LOG_FH = None
 
+# Messages rendered from threads with capture enabled are held here and replayed later so that
+# output from concurrently running tasks is not interleaved
+CAPTURE = threading.local()
+
 
 def setup_log_file(log_fp: pathlib.Path) -> None:
     global BUFFER_LOG_MESSAGES
@@ -93,6 +98,10 @@ def render(
 ) -> None:
     if ts:
         text = f'{text} {get_timestamp()}'
+    # Hold message if this thread is capturing output
+    if capture_active():
+        CAPTURE.buffer.append((text, title, log_file_only, kargs))
+        return
     # Log file
     if BUFFER_LOG_MESSAGES:
         LOG_BUFFER.append((text, title, kargs))
@@ -113,6 +122,25 @@ def render(
         print(text, **kargs)
 
 
+def capture_start() -> None:
+    CAPTURE.buffer = list()
+
+
+def capture_active() -> bool:
+    return getattr(CAPTURE, 'buffer', None) is not None
+
+
+def capture_stop() -> List[Tuple[str, bool, bool, Dict]]:
+    messages = CAPTURE.buffer
+    CAPTURE.buffer = None
+    return messages
+
+
+def replay(messages: List[Tuple[str, bool, bool, Dict]]) -> None:
+    for text, title, log_file_only, kargs in messages:
+        render(text, title=title, log_file_only=log_file_only, **kargs)
+
+
 def task_msg_title(text: str) -> None:
     render(ftext(text, c='blue', f='underline'), ts=True, title=True)
 
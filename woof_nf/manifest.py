@@ -0,0 +1,92 @@
+import pathlib
+import re
+import sys
+from typing import List, Optional
+
+
+from . import log
+from . import utility
+
+
+# Batch manifest: one comparison per line with a header. Multiple run directories for a set are
+# comma separated e.g.
+#   comparison_name    run_dir_one                  run_dir_two
+#   sbj_00001          s3://bucket/a/,s3://bucket/b/  s3://bucket/c/
+HEADER = ('comparison_name', 'run_dir_one', 'run_dir_two')
+# Comparison names are used as output subdirectory names and in AWS Batch job names, which only allow
+# letters, digits, hyphens, and underscores
+COMPARISON_NAME_RE = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_-]*$')
+COMPARISON_NAMES_RESERVED = {'nextflow'}
+
+
+class Comparison:
+
+    def __init__(self, name, run_dir_one, run_dir_two):
+        # An empty name places outputs directly in the output directory (single comparison mode)
+        self.name = name
+        self.run_dir_one = run_dir_one
+        self.run_dir_two = run_dir_two
+
+    def get_output_dir(self, output_dir: pathlib.Path) -> pathlib.Path:
+        return output_dir / self.name if self.name else output_dir
+
+    def get_output_remote_dir(self, output_remote_dir: Optional[str]) -> Optional[str]:
+        if not output_remote_dir or not self.name:
+            return output_remote_dir
+        return utility.join_paths(output_remote_dir, self.name)
+
+    def __repr__(self):
+        return f'<{self.__module__}.{type(self).__name__} with {self.name}>'
+
+
+def read(manifest_fp: pathlib.Path) -> List[Comparison]:
+    with manifest_fp.open('r') as fh:
+        lines = [line.rstrip('\r\n') for line in fh]
+    lines = [line for line in lines if line.strip() and not line.startswith('#')]
+    if not lines or tuple(lines[0].split('\t')) != HEADER:
+        header_str = '\\t'.join(HEADER)
+        msg = f'--manifest must be a TSV file with the header \'{header_str}\': {manifest_fp}'
+        log.render(log.ftext(f'error: {msg}', c='red'))
+        sys.exit(1)
+    comparisons = list()
+    errors = list()
+    for i, line in enumerate(lines[1:], 2):
+        tokens = line.split('\t')
+        if len(tokens) != len(HEADER):
+            errors.append(f'line {i}: expected {len(HEADER)} columns but got {len(tokens)}')
+            continue
+        name, dirs_one_str, dirs_two_str = (token.strip() for token in tokens)
+        run_dir_one = [d.strip() for d in dirs_one_str.split(',') if d.strip()]
+        run_dir_two = [d.strip() for d in dirs_two_str.split(',') if d.strip()]
+        if not COMPARISON_NAME_RE.match(name) or name in COMPARISON_NAMES_RESERVED:
+            errors.append(f'line {i}: invalid comparison name \'{name}\' (allowed: letters, digits, - and _)')
+        elif any(name == comparison.name for comparison in comparisons):
+            errors.append(f'line {i}: duplicate comparison name \'{name}\'')
+        elif not run_dir_one or not run_dir_two:
+            errors.append(f'line {i}: both run_dir_one and run_dir_two are required')
+        else:
+            comparisons.append(Comparison(name, run_dir_one, run_dir_two))
+    if not comparisons and not errors:
+        errors.append('no comparisons found')
+    if errors:
+        log.render(log.ftext(f'error: invalid --manifest {manifest_fp}:', c='red'))
+        for error in errors:
+            log.render(log.ftext(f'  {error}', c='red'))
+        sys.exit(1)
+    return comparisons
+
+
+def get_run_dirs(comparisons: List[Comparison]):
+    # Unique run directories of each set, in order. Directories in both sets are listed once only
+    # with set one so that listings are shared by all comparisons
+    run_dirs_one = list()
+    run_dirs_two = list()
+    for comparison in comparisons:
+        for run_dir in comparison.run_dir_one:
+            if run_dir not in run_dirs_one:
+                run_dirs_one.append(run_dir)
+    for comparison in comparisons:
+        for run_dir in comparison.run_dir_two:
+            if run_dir not in run_dirs_one and run_dir not in run_dirs_two:
+                run_dirs_two.append(run_dir)
+    return run_dirs_one, run_dirs_two
@@ -0,0 +1,129 @@
+import concurrent.futures
+import os
+import pathlib
+from typing import Dict, List, Tuple
+
+
+from . import log
+from . import table
+from . import utility
+
+
+# Local mirror of S3 inputs shared across runs with the local executor. Objects are keyed by ETag so
+# that an unchanged object is downloaded once and then read locally by every run and task; Nextflow
+# stages the mirrored files as symlinks. Layout:
+#   <mirror_dir>/<etag[:2]>/<etag>/<object filename>
+# The original filename is kept so that a VCF and its index are staged with matching names. The
+# mtime of a mirrored file is refreshed on each use and the least recently used entries are evicted
+# once the mirror exceeds its size limit.
+MIRROR_WORKERS = 8
+
+
+class MirrorEntry:
+
+    def __init__(self, remote_fp, local_fp, size, hit):
+        self.remote_fp = remote_fp
+        self.local_fp = local_fp
+        self.size = size
+        self.hit = hit
+
+
+class InputMirror:
+
+    def __init__(self, mirror_dir: str, size_limit: int, client=None):
+        # A client can be provided to read from a local stand-in of S3
+        self.mirror_dir = pathlib.Path(mirror_dir)
+        self.size_limit = size_limit
+        self.client = client
+
+    def prefetch(self, input_files: List) -> None:
+        # Download S3 inputs and indexes concurrently and point input files at the local copies
+        log.task_msg_title('Mirroring S3 inputs')
+        log.render_newline()
+        remote_fps = sorted({
+            fp
+            for input_file in input_files
+            for fp in (input_file.filepath, input_file.index_filepath)
+            if fp and fp.startswith('s3://')
+        })
+        if self.client is None:
+            import boto3
+            self.client = boto3.client('s3')
+        with concurrent.futures.ThreadPoolExecutor(max_workers=MIRROR_WORKERS) as executor:
+            entries = list(executor.map(self.get_entry, remote_fps))
+        local_fps = {entry.remote_fp: str(entry.local_fp) for entry in entries}
+        for input_file in input_files:
+            input_file.filepath = local_fps.get(input_file.filepath, input_file.filepath)
+            if input_file.index_filepath:
+                input_file.index_filepath = local_fps.get(input_file.index_filepath, input_file.index_filepath)
+        evicted = self.evict({entry.local_fp.parent for entry in entries})
+        render_table(entries, evicted, self.mirror_dir)
+
+    def get_entry(self, remote_fp: str) -> MirrorEntry:
+        bucket_name, key = utility.get_bucket_and_key(remote_fp)
+        # Object metadata is taken at prefetch so that objects replaced since listing are not missed
+        response = self.client.head_object(Bucket=bucket_name, Key=key)
+        etag = response['ETag'].strip('"')
+        size = response['ContentLength']
+        local_fp = self.mirror_dir / etag[:2] / etag / pathlib.PurePosixPath(key).name
+        if local_fp.exists() and local_fp.stat().st_size == size:
+            os.utime(local_fp)
+            return MirrorEntry(remote_fp, local_fp, size, True)
+        # Download to a temporary file first so that concurrent runs never read a partial object
+        local_fp.parent.mkdir(parents=True, exist_ok=True)
+        local_tmp_fp = local_fp.with_name(f'.{local_fp.name}.{os.getpid()}.tmp')
+        self.client.download_file(bucket_name, key, str(local_tmp_fp), Config=utility.get_transfer_config())
+        os.replace(local_tmp_fp, local_fp)
+        return MirrorEntry(remote_fp, local_fp, size, False)
+
+    def evict(self, entry_dirs_used) -> List[Tuple[pathlib.Path, int]]:
+        # Remove least recently used entries until within the size limit; entries of this run are kept
+        entries: Dict[pathlib.Path, Tuple[float, int]] = dict()
+        for fp in self.mirror_dir.glob('*/*/*'):
+            if fp.name.startswith('.') or not fp.is_file():
+                continue
+            stat = fp.stat()
+            mtime, size = entries.get(fp.parent, (0, 0))
+            entries[fp.parent] = (max(mtime, stat.st_mtime), size + stat.st_size)
+        size_total = sum(size for mtime, size in entries.values())
+        evicted = list()
+        for entry_dir, (mtime, size) in sorted(entries.items(), key=lambda e: e[1][0]):
+            if size_total <= self.size_limit:
+                break
+            if entry_dir in entry_dirs_used:
+                continue
+            for fp in entry_dir.iterdir():
+                fp.unlink()
+            entry_dir.rmdir()
+            size_total -= size
+            evicted.append((entry_dir, size))
+        return evicted
+
+
+def get_size_limit(size_gb: float) -> int:
+    return int(size_gb * 2 ** 30)
+
+
+def render_table(entries: List[MirrorEntry], evicted: List[Tuple[pathlib.Path, int]], mirror_dir) -> None:
+    hits = [e for e in entries if e.hit]
+    downloads = [e for e in entries if not e.hit]
+    log.render(log.ftext('Input mirror:', f='bold'), end=' ')
+    log.render(f'{mirror_dir}')
+    rows = [table.Row(('Status', 'Files', 'Size'), header=True)]
+    rows.append(table.Row((
+        table.Cell('mirrored', c='green'),
+        str(len(hits)),
+        utility.format_bytes(sum(e.size for e in hits)),
+    )))
+    rows.append(table.Row((
+        table.Cell('downloaded', c='yellow'),
+        str(len(downloads)),
+        utility.format_bytes(sum(e.size for e in downloads)),
+    )))
+    rows.append(table.Row((
+        table.Cell('evicted', c='black'),
+        str(len(evicted)),
+        utility.format_bytes(sum(size for entry_dir, size in evicted)),
+    )))
+    table.render_table(rows)
+    log.render_newline()
@@ -0,0 +1,196 @@
+import json
+import os
+import pathlib
+import time
+from typing import Dict, List, Optional
+
+
+from . import utility
+
+
+# Trace fields written by Nextflow, see defaults.config. Values are raw: durations in milliseconds
+# and memory/IO in bytes.
+TRACE_STATUS_COMPLETED = {'COMPLETED', 'CACHED'}
+TRACE_STATUS_FAILED = {'FAILED', 'ABORTED'}
+
+
+class ProcessStats:
+
+    def __init__(self, name):
+        self.name = name
+        # Counts from Nextflow console output
+        self.submitted = 0
+        # Counts and metrics from trace file
+        self.completed = 0
+        self.cached = 0
+        self.failed = 0
+        # Totals are of completed, non-cached tasks so that means and rates are not skewed by
+        # failed attempts; wall time of failed tasks is kept separately
+        self.duration_total = 0
+        self.duration_failed_total = 0
+        self.realtime_total = 0
+        self.peak_rss_max = 0
+        self.rchar_total = 0
+        self.wchar_total = 0
+
+    @property
+    def finished(self) -> int:
+        return self.completed + self.failed
+
+    @property
+    def active(self) -> int:
+        # Running and queued tasks; trace records are only written once tasks finish
+        return max(0, self.submitted - self.finished)
+
+    @property
+    def duration_mean(self) -> Optional[float]:
+        # Mean wall time (ms) of completed, non-cached tasks
+        tasks_run = self.completed - self.cached
+        return self.duration_total / tasks_run if tasks_run else None
+
+    @property
+    def io_throughput(self) -> Optional[float]:
+        # Bytes read and written per second of task real time
+        if not self.realtime_total:
+            return None
+        return (self.rchar_total + self.wchar_total) / (self.realtime_total / 1000)
+
+    def to_dict(self) -> Dict:
+        return {
+            'name': self.name,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'cached': self.cached,
+            'failed': self.failed,
+            'active': self.active,
+            'duration_mean_ms': self.duration_mean,
+            'duration_failed_total_ms': self.duration_failed_total,
+            'peak_rss_max_bytes': self.peak_rss_max,
+            'rchar_total_bytes': self.rchar_total,
+            'wchar_total_bytes': self.wchar_total,
+            'io_throughput_bytes_per_sec': self.io_throughput,
+        }
+
+
+class TraceMonitor:
+
+    # Incrementally tails the Nextflow trace file, accumulating per-process statistics. Progress is
+    # available as a structured object through progress() and is also written as JSON to
+    # progress_fp for consumers other than the console.
+    def __init__(self, trace_fp: pathlib.Path, progress_fp: Optional[pathlib.Path] = None):
+        self.trace_fp = trace_fp
+        self.progress_fp = progress_fp
+        self.processes: Dict[str, ProcessStats] = dict()
+        self.header: Optional[List[str]] = None
+        self.offset = 0
+        self.line_partial = str()
+        self.time_start = time.time()
+
+    def get_process(self, name: str) -> ProcessStats:
+        if name not in self.processes:
+            self.processes[name] = ProcessStats(name)
+        return self.processes[name]
+
+    def update_submitted(self, name: str, submitted: int) -> None:
+        # Nextflow console process lines report '<completed> of <submitted>'
+        process = self.get_process(name)
+        process.submitted = max(process.submitted, submitted)
+
+    def poll(self) -> None:
+        # Read any bytes appended since the last poll; incomplete final lines are held over
+        if not self.trace_fp.exists():
+            return
+        with self.trace_fp.open('r') as fh:
+            fh.seek(self.offset)
+            data = fh.read()
+            self.offset = fh.tell()
+        if not data:
+            return
+        lines = (self.line_partial + data).split('\n')
+        self.line_partial = lines.pop()
+        for line in lines:
+            if not line:
+                continue
+            tokens = line.split('\t')
+            if self.header is None:
+                self.header = tokens
+                continue
+            self.process_record(dict(zip(self.header, tokens)))
+        if self.progress_fp:
+            self.write_progress()
+
+    def process_record(self, record: Dict[str, str]) -> None:
+        name = record.get('process') or record.get('name', '').split(' (')[0]
+        process = self.get_process(name)
+        status = record.get('status')
+        if status in TRACE_STATUS_COMPLETED:
+            process.completed += 1
+            if status == 'CACHED':
+                process.cached += 1
+                return
+        elif status in TRACE_STATUS_FAILED:
+            # Peak memory of failed tasks is retained as it is often the cause of failure
+            process.failed += 1
+            process.duration_failed_total += get_trace_value(record, 'duration')
+            process.peak_rss_max = max(process.peak_rss_max, get_trace_value(record, 'peak_rss'))
+            return
+        process.duration_total += get_trace_value(record, 'duration')
+        process.realtime_total += get_trace_value(record, 'realtime')
+        process.peak_rss_max = max(process.peak_rss_max, get_trace_value(record, 'peak_rss'))
+        process.rchar_total += get_trace_value(record, 'rchar')
+        process.wchar_total += get_trace_value(record, 'wchar')
+
+    def progress(self) -> Dict:
+        return {
+            'elapsed_sec': time.time() - self.time_start,
+            'processes': [p.to_dict() for p in self.processes.values()],
+        }
+
+    def write_progress(self) -> None:
+        # Write atomically so readers never see a partial file
+        progress_tmp_fp = self.progress_fp.with_suffix('.tmp')
+        with progress_tmp_fp.open('w') as fh:
+            json.dump(self.progress(), fh, indent=2)
+        os.replace(progress_tmp_fp, self.progress_fp)
+
+    def render_lines(self) -> List[str]:
+        lines = list()
+        for process in self.processes.values():
+            if not (process.finished or process.submitted):
+                continue
+            name_short = process.name.split(':')[-1]
+            tokens = [f'{process.completed} done']
+            if process.failed:
+                tokens.append(f'{process.failed} failed')
+            if process.active:
+                tokens.append(f'{process.active} running/queued')
+            if process.duration_mean is not None:
+                tokens.append(f'mean {format_duration(process.duration_mean)}')
+            if process.peak_rss_max:
+                tokens.append(f'peak RSS {utility.format_bytes(process.peak_rss_max)}')
+            if process.io_throughput is not None:
+                tokens.append(f'I/O {utility.format_bytes(process.io_throughput)}/s')
+            lines.append(f'    {name_short}: {", ".join(tokens)}\n')
+        if lines:
+            lines.insert(0, 'Task metrics:\n')
+        return lines
+
+
+def get_trace_value(record: Dict[str, str], field: str) -> int:
+    # Missing values are recorded as '-'
+    value = record.get(field, '-')
+    try:
+        return int(float(value))
+    except ValueError:
+        return 0
+
+
+def format_duration(milliseconds: float) -> str:
+    seconds = int(milliseconds / 1000)
+    if seconds < 60:
+        return f'{seconds}s'
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f'{minutes}m {seconds}s'
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours}h {minutes}m'
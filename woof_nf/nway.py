@@ -0,0 +1,170 @@
+import pathlib
+import sys
+from typing import Dict, List, Tuple
+
+
+from . import inputs
+from . import log
+from . import manifest
+from . import table
+
+
+# N-way comparison matches small variant inputs across any number of named run sets. Each matched
+# sample and data source is compared with a single multi-way intersection in the workflow, from
+# which pairwise metrics and set concordance (UpSet) counts are derived.
+DATA_TYPES = ('small_variants',)
+
+
+class FileSet:
+
+    def __init__(self, sample_name, run_type, data_source, data_type):
+        self.sample_name = sample_name
+        self.run_type = run_type
+        self.data_source = data_source
+        self.data_type = data_type
+        # Run set name -> InputFile
+        self.files: Dict[str, inputs.InputFile] = dict()
+
+    @property
+    def is_matched(self) -> bool:
+        return len(self.files) > 1
+
+    def __repr__(self):
+        data = ':'.join((self.sample_name, self.run_type, self.data_source))
+        return f'<{self.__module__}.{type(self).__name__} with {data} in {len(self.files)} sets>'
+
+
+def process_run_sets(run_set_args: List[List[str]]) -> List[Tuple[str, List[str]]]:
+    # Each --run_set is given as NAME RUN_DIR [RUN_DIR ...]
+    run_sets = list()
+    errors = list()
+    for tokens in run_set_args:
+        name, run_dirs = tokens[0], tokens[1:]
+        if not manifest.COMPARISON_NAME_RE.match(name):
+            errors.append(f'invalid run set name \'{name}\'')
+        elif any(name == n for n, d in run_sets):
+            errors.append(f'duplicate run set name \'{name}\'')
+        elif not run_dirs:
+            errors.append(f'no run directories given for run set \'{name}\'')
+        else:
+            run_sets.append((name, run_dirs))
+    if len(run_set_args) < 2:
+        errors.append('at least two run sets are required')
+    if errors:
+        log.render(log.ftext('error: invalid --run_set arguments:', c='red'))
+        for error in errors:
+            log.render(log.ftext(f'  {error}', c='red'))
+        sys.exit(1)
+    return run_sets
+
+
+def get_run_dirs(run_sets: List[Tuple[str, List[str]]]) -> List[str]:
+    # Unique run directories of all sets, in order
+    run_dirs = list()
+    for name, set_run_dirs in run_sets:
+        for run_dir in set_run_dirs:
+            if run_dir not in run_dirs:
+                run_dirs.append(run_dir)
+    return run_dirs
+
+
+def collect(run_sets: List[Tuple[str, List[str]]], dirpaths: Dict) -> List[FileSet]:
+    # Discover inputs of each run set, using the run set name as the run number
+    log.task_msg_title('Discovering input files')
+    log.render('\nDirectories searched:')
+    for name, set_run_dirs in run_sets:
+        inputs.log_input_directories([dirpaths[d] for d in set_run_dirs], name)
+    log.render_newline()
+    file_sets: Dict[Tuple[str, str, str], FileSet] = dict()
+    for name, set_run_dirs in run_sets:
+        run_inputs = inputs.discover_run_files([dirpaths[d] for d in set_run_dirs], run_number=name)
+        for input_files in run_inputs.values():
+            for input_file in input_files:
+                if input_file.data_type not in DATA_TYPES:
+                    continue
+                key = (input_file.run_type, input_file.sample_name, input_file.data_source)
+                if key not in file_sets:
+                    file_sets[key] = FileSet(
+                        input_file.sample_name,
+                        input_file.run_type,
+                        input_file.data_source,
+                        input_file.data_type
+                    )
+                file_set = file_sets[key]
+                if name in file_set.files:
+                    msg_base = f'error: matched more than one file in run set {name} for'
+                    msg = log.ftext(f'{msg_base} {input_file.sample_name}:{input_file.data_source}:', c='red')
+                    log.render(msg)
+                    for f in (file_set.files[name], input_file):
+                        log.render(log.ftext(f'  {f.filepath}', c='red'))
+                    sys.exit(1)
+                file_set.files[name] = input_file
+    file_sets_list = [file_sets[key] for key in sorted(file_sets)]
+    render_table(file_sets_list, [name for name, d in run_sets])
+    if not any(file_set.is_matched for file_set in file_sets_list):
+        log.render(log.ftext('error: no small variant inputs matched across run sets', c='red'))
+        sys.exit(1)
+    return file_sets_list
+
+
+def render_table(file_sets: List[FileSet], set_names: List[str]) -> None:
+    file_sets_matched_n = sum(1 for file_set in file_sets if file_set.is_matched)
+    log.render(log.ftext('Run sets:', f='bold'), end=' ')
+    log.render(f'matched {file_sets_matched_n} of {len(file_sets)} small variant inputs:')
+    set_header_cells = [table.Cell(name, just='c') for name in set_names]
+    rows = [table.Row(('Sample name', 'Run type', 'Data source', *set_header_cells), header=True)]
+    for file_set in file_sets:
+        sym_present = table.cell_green('✓') if file_set.is_matched else table.cell_grey('✓')
+        cells = [
+            file_set.sample_name if file_set.is_matched else table.Cell(file_set.sample_name, c='red'),
+            file_set.run_type,
+            file_set.data_source,
+        ]
+        for name in set_names:
+            cells.append(sym_present if name in file_set.files else table.cell_red('⨯'))
+        rows.append(table.Row(cells))
+    table.render_table(rows)
+    log.render_newline()
+
+
+def write(file_sets: List[FileSet], set_names: List[str], output_fp: pathlib.Path) -> pathlib.Path:
+    header_tokens = (
+        'sample_name',
+        'run_type',
+        'run_set',
+        'set_index',
+        'data_source',
+        'data_type',
+        'filepath',
+        'file_size',
+        'group_size',
+        'index_filepath'
+    )
+    if not output_fp.parent.exists():
+        output_fp.parent.mkdir(mode=0o700)
+    with output_fp.open('w') as fh:
+        print(*header_tokens, sep='\t', file=fh)
+        for file_set in file_sets:
+            if not file_set.is_matched:
+                continue
+            # Files are grouped in the workflow by sample, run type, and data source; the group size
+            # is the number of run sets with the input so that groups are emitted once complete
+            for set_index, name in enumerate(set_names):
+                if name not in file_set.files:
+                    continue
+                input_file = file_set.files[name]
+                print(
+                    file_set.sample_name,
+                    file_set.run_type,
+                    name,
+                    set_index,
+                    file_set.data_source,
+                    file_set.data_type,
+                    input_file.filepath,
+                    input_file.file_size if input_file.file_size is not None else 0,
+                    len(file_set.files),
+                    input_file.index_filepath if input_file.index_filepath else '',
+                    sep='\t',
+                    file=fh
+                )
+    return output_fp
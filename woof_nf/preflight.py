@@ -0,0 +1,78 @@
+import queue
+import sys
+import threading
+from typing import Callable, Dict, List, Sequence
+
+
+from . import log
+
+
+class Stage:
+
+    def __init__(self, name: str, func: Callable, depends: Sequence[str] = ()):
+        # func is called with a dict of results from all completed stages
+        self.name = name
+        self.func = func
+        self.depends = tuple(depends)
+        self.result = None
+        self.messages: List = list()
+        self.done = False
+
+
+def run(stages: List[Stage]) -> Dict:
+    # Run stages concurrently as soon as their dependencies complete. Each stage's log output is
+    # captured and rendered in stage order so the console reads as if stages ran serially. On the
+    # first fatal error (sys.exit or exception) any completed output up to and including the failed
+    # stage is rendered and we exit immediately without waiting on other stages.
+    stages_by_name = {stage.name: stage for stage in stages}
+    for stage in stages:
+        for dependency in stage.depends:
+            # Dependencies must be declared earlier, which also prevents cycles
+            assert dependency in stages_by_name
+            assert stages.index(stages_by_name[dependency]) < stages.index(stage)
+    results: Dict = dict()
+    events: queue.Queue = queue.Queue()
+    started = set()
+    render_index = 0
+    while True:
+        # Start any stages with all dependencies completed
+        for stage in stages:
+            if stage.name in started:
+                continue
+            if all(stages_by_name[d].done for d in stage.depends):
+                started.add(stage.name)
+                thread = threading.Thread(target=run_stage, args=(stage, dict(results), events), daemon=True)
+                thread.start()
+        if all(stage.done for stage in stages):
+            break
+        # Wait for the next stage to complete
+        stage, error = events.get()
+        if error is not None:
+            render_completed(stages, render_index)
+            log.replay(stage.messages)
+            if not isinstance(error, SystemExit):
+                log.render(log.ftext(f'error: preflight stage \'{stage.name}\' failed: {error!r}', c='red'))
+            sys.exit(1)
+        stage.done = True
+        results[stage.name] = stage.result
+        render_index = render_completed(stages, render_index)
+    return results
+
+
+def run_stage(stage: Stage, results: Dict, events: queue.Queue) -> None:
+    log.capture_start()
+    error = None
+    try:
+        stage.result = stage.func(results)
+    except BaseException as err:
+        error = err
+    stage.messages = log.capture_stop()
+    events.put((stage, error))
+
+
+def render_completed(stages: List[Stage], render_index: int) -> int:
+    # Render output of completed stages in declared order, stopping at the first incomplete stage
+    while render_index < len(stages) and stages[render_index].done:
+        log.replay(stages[render_index].messages)
+        render_index += 1
+    return render_index
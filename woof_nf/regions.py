@@ -0,0 +1,145 @@
+import bisect
+import hashlib
+import pathlib
+import random
+import sys
+from typing import Dict, List, Tuple
+
+
+from . import log
+from . import utility
+
+
+# Target regions (--regions) restrict small variant comparisons. Regions are applied in the
+# workflow with bcftools and here only where outputs are written without the workflow. Strata
+# (--strata_bed) only label records for stratified metrics
+
+# Quick mode compares a deterministic sample of fixed size windows, applied as target regions
+QUICK_WINDOW_SIZE = 100_000
+QUICK_WINDOW_FRACTION = 0.02
+QUICK_SEED = 20210801
+# GRCh38 primary assembly chromosome lengths
+GRCH38_CONTIG_SIZES = {
+    '1': 248956422,
+    '2': 242193529,
+    '3': 198295559,
+    '4': 190214555,
+    '5': 181538259,
+    '6': 170805979,
+    '7': 159345973,
+    '8': 145138636,
+    '9': 138394717,
+    '10': 133797422,
+    '11': 135086622,
+    '12': 133275309,
+    '13': 114364328,
+    '14': 107043718,
+    '15': 101991189,
+    '16': 90338345,
+    '17': 83257441,
+    '18': 80373285,
+    '19': 58617616,
+    '20': 64444167,
+    '21': 46709983,
+    '22': 50818468,
+    'X': 156040895,
+    'Y': 57227415,
+}
+
+
+class Regions:
+
+    def __init__(self, regions_fp: pathlib.Path):
+        self.filepath = regions_fp
+        self.checksum = utility.get_file_md5(regions_fp)
+        # Contig -> sorted, merged, half-open intervals as BED (zero-based start)
+        self.intervals: Dict[str, List[Tuple[int, int]]] = read_bed(regions_fp, '--regions')
+        self.starts = {contig: [start for start, end in ivs] for contig, ivs in self.intervals.items()}
+
+    def overlaps(self, contig: str, position: int, ref_length: int = 1) -> bool:
+        # Record spans POS to the end of REF, matching record selection with bcftools -R
+        if contig not in self.intervals:
+            return False
+        start, end = position - 1, position - 1 + max(ref_length, 1)
+        index = bisect.bisect_left(self.starts[contig], end) - 1
+        return index >= 0 and self.intervals[contig][index][1] > start
+
+
+class Strata:
+
+    def __init__(self, strata_fps: List[pathlib.Path]):
+        # Stratum name is the BED filename without extension e.g. exome.bed -> exome
+        self.filepaths = strata_fps
+        self.names = [fp.stem for fp in strata_fps]
+        self.intervals = [read_bed(fp, '--strata_bed') for fp in strata_fps]
+        names_duplicate = {name for name in self.names if self.names.count(name) > 1}
+        if names_duplicate:
+            msg = f'--strata_bed files have duplicate stratum names: {", ".join(sorted(names_duplicate))}'
+            log.render(log.ftext(f'error: {msg}', c='red'))
+            sys.exit(1)
+        self.checksum = hashlib.md5(self.get_text().encode()).hexdigest()
+
+    def get_text(self) -> str:
+        # Single BED of all strata with the stratum name in the fourth column
+        lines = list()
+        for name, intervals in zip(self.names, self.intervals):
+            for contig, contig_intervals in intervals.items():
+                lines.extend(f'{contig}\t{start}\t{end}\t{name}\n' for start, end in contig_intervals)
+        return ''.join(lines)
+
+    def write(self, output_fp: pathlib.Path) -> pathlib.Path:
+        with output_fp.open('w') as fh:
+            fh.write(self.get_text())
+        return output_fp
+
+
+def write_quick_windows(output_fp: pathlib.Path) -> pathlib.Path:
+    # Windows are drawn with a fixed seed so that quick comparisons are repeatable and cacheable.
+    # Windows are written for both 'chr' prefixed and unprefixed contig names; bcftools skips
+    # contigs absent from a VCF index
+    windows = [
+        (contig, start)
+        for contig, size in GRCH38_CONTIG_SIZES.items()
+        for start in range(0, size - QUICK_WINDOW_SIZE + 1, QUICK_WINDOW_SIZE)
+    ]
+    windows_n = max(1, round(len(windows) * QUICK_WINDOW_FRACTION))
+    windows_sampled = random.Random(QUICK_SEED).sample(windows, windows_n)
+    contig_order = list(GRCH38_CONTIG_SIZES)
+    windows_sampled.sort(key=lambda w: (contig_order.index(w[0]), w[1]))
+    with output_fp.open('w') as fh:
+        for prefix in ('chr', ''):
+            for contig, start in windows_sampled:
+                print(f'{prefix}{contig}', start, start + QUICK_WINDOW_SIZE, sep='\t', file=fh)
+    return output_fp
+
+
+def read_bed(regions_fp: pathlib.Path, arg_name: str) -> Dict[str, List[Tuple[int, int]]]:
+    intervals: Dict[str, List[Tuple[int, int]]] = dict()
+    with regions_fp.open('r') as fh:
+        for i, line in enumerate(fh, 1):
+            if not line.strip() or line.startswith(('#', 'track', 'browser')):
+                continue
+            tokens = line.rstrip('\n').split('\t')
+            try:
+                contig, start, end = tokens[0], int(tokens[1]), int(tokens[2])
+            except (IndexError, ValueError):
+                msg = f'{arg_name} line {i} is not a valid BED record: {line.rstrip()}'
+                log.render(log.ftext(f'error: {msg}', c='red'))
+                sys.exit(1)
+            if contig not in intervals:
+                intervals[contig] = list()
+            intervals[contig].append((start, end))
+    if not intervals:
+        msg = f'{arg_name} file contains no regions: {regions_fp}'
+        log.render(log.ftext(f'error: {msg}', c='red'))
+        sys.exit(1)
+    # Sort and merge overlapping intervals
+    for contig, contig_intervals in intervals.items():
+        merged = list()
+        for start, end in sorted(contig_intervals):
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        intervals[contig] = merged
+    return intervals
@@ -3,10 +3,7 @@ import re
 import subprocess
 import sys
 import textwrap
-import time
-
-
-import boto3
+from typing import List, Optional, Tuple
 
 
 from . import aws
@@ -15,31 +12,36 @@ from . import utility
 from . import workflow
 
 
+# Maximum time to wait for report jobs on AWS Batch (seconds)
+BATCH_JOB_TIMEOUT = 2 * 60 * 60
+
+
 def render(
-    comparison_dir: pathlib.Path,
-    comparison_remote_dir,
+    comparison_dirs: List[Tuple[str, pathlib.Path, Optional[str]]],
     output_type,
     work_dir,
     executor
 ) -> None:
+    # A report is rendered for each comparison: (name, comparison_dir, comparison_remote_dir)
     log.task_msg_title('Rendering RMarkdown report')
     log.render_newline()
     if executor == 'aws':
         assert work_dir.startswith('s3://')
-        render_aws(comparison_dir, comparison_remote_dir, output_type, work_dir)
+        render_aws(comparison_dirs, output_type, work_dir)
     elif executor == 'local':
-        render_local(comparison_dir, comparison_remote_dir, output_type)
+        for name, comparison_dir, comparison_remote_dir in comparison_dirs:
+            if name:
+                log.render(f'  comparison: {name}')
+            render_local(comparison_dir, comparison_remote_dir, output_type)
     else:
         assert False
 
 
-def submit_batch_job(command):
-    # Construct job definition ARN and set job name
+def create_batch_job(client, command, job_name='woof-report-creation'):
+    # Construct job definition ARN
     job_definition_base = re.sub('[./:]', '-', workflow.DOCKER_URI_HUB)
     job_definition_arn = f'nf-{job_definition_base}'
-    job_name = 'woof-report-creation'
     # Check job definition exists
-    client = boto3.client('batch')
     response = client.describe_job_definitions(jobDefinitionName=job_definition_arn)
     if not response.get('jobDefinitions'):
         msg = f'could not find required job definition: {job_definition_arn}'
@@ -59,75 +61,84 @@ def submit_batch_job(command):
         log.render(log.ftext(f'error: {msg}', c='red'))
         sys.exit(1)
     log.render(f'    job name (jobid): {job_name} ({job_id})')
-    # Allow some time for Batch to recieve and process job
-    time.sleep(10)
-    # Poll job every 5 seconds and report status until it finishes
-    status_other = {'SUBMITTED', 'PENDING', 'RUNNABLE', 'STARTING', 'RUNNING'}
-    overwrite_status_line = False
-    while True:
-        # Get job info
-        response = client.describe_jobs(jobs=[job_id])
-        if not response.get('jobs'):
+    return job_id, job_name
+
+
+def await_batch_jobs(client, jobs, timeout=BATCH_JOB_TIMEOUT):
+    # Poll all jobs with batched describe_jobs requests until they finish, report failures
+    from . import batch
+    job_states = batch.wait_jobs(client, jobs, timeout=timeout)
+    failed = False
+    for job_state in job_states.values():
+        if job_state.is_succeeded:
+            continue
+        failed = True
+        job_id = job_state.job_id
+        reason = job_state.info.get('statusReason')
+        if job_state.status == 'FAILED':
+            msg = f'job {job_id} failed for the given reason: {reason}'
+        elif job_state.status == 'TIMEOUT':
+            msg = f'job {job_id} did not complete within {timeout} seconds'
+        elif job_state.status == 'MISSING':
             msg = f'could not retrieve job information for job: {job_id}'
-            log.render(log.ftext(f'\nerror: {msg}', c='red'))
-            sys.exit(1)
-        jobs_info = response.get('jobs')
-        if len(jobs_info) != 1:
-            msg = f'unexpected number of jobs for {job_id}, got response:\n{jobs_info}'
-            log.render(log.ftext(f'\nerror: {msg}', c='red'))
-            sys.exit(1)
-        [job_info] = jobs_info
-        # Check status
-        job_status = job_info.get('status')
-        if not job_status:
-            msg = f'could not retrieve job status for {job_id}, got response:\n{job_info}'
-            log.render(log.ftext(f'\nerror: {msg}', c='red'))
-            sys.exit(1)
-        elif job_status == 'FAILED':
-            log.render('\u001b[F\u001b[0K', end='')
-            log.render(f'    job status: {job_status}')
-            msg = f'job {job_id} failed for the given reason: {job_info.get("statusReason")}'
-            log.render(log.ftext(f'\nerror: {msg}', c='red'))
-            sys.exit(1)
-        elif job_status == 'SUCCEEDED':
-            # Rewrite status line, then notify of completion
-            log.render('\u001b[F\u001b[0K', end='')
-            log.render(f'    job status: {job_status}')
-            log.render('    job completed successfully!')
-            break
-        elif job_info.get('stoppedAt'):
-            # NOTE: branch unlikely execute; status should already be set as FAILED and caught above
-            reason_stop = job_info.get('statusReason')
-            msg_base = f'job {job_id} was stopped early with status {job_status}'
-            if reason_stop:
-                log.render(log.ftext(f'\nerror: {msg_base} and given reason: {reason_stop}', c='red'))
-            else:
-                log.render(log.ftext(f'\nerror: {msg_base}. No reason was given.', c='red'))
-            sys.exit(1)
-        elif job_status in status_other:
-            # Overwrite previous line (skip on first pass)
-            if overwrite_status_line:
-                log.render('\u001b[F\u001b[0K', end='')
-            log.render(f'    job status: {job_status}')
-            overwrite_status_line = True
-            time.sleep(5)
+        elif reason:
+            msg = f'job {job_id} was stopped early with status {job_state.status} and given reason: {reason}'
         else:
-            assert False
-
+            msg = f'job {job_id} was stopped early with status {job_state.status}. No reason was given.'
+        log.render(log.ftext(f'\nerror: {msg}', c='red'))
+    if failed:
+        sys.exit(1)
+    if len(jobs) == 1:
+        log.render('    job completed successfully!')
+    else:
+        log.render(f'    all {len(jobs)} jobs completed successfully!')
 
-def render_aws(comparison_dir, comparison_remote_dir, output_type, work_dir):
-    # Set excludes for comparison directory sync
-    sync_excludes = '--exclude="*nextflow/*" --exclude="pipeline_log_*txt"'
 
-    # Upload workflow files, and if needed up load output files
+def render_aws(comparison_dirs, output_type, work_dir):
+    # Upload workflow files once, then submit a report job for each comparison and await all jobs
+    import boto3
     lib_dir = utility.join_paths(str(pathlib.Path(__file__).parent), 'workflow/lib')
     lib_remote_dir = utility.join_paths(work_dir, 'other', 'workflow', 'lib')
     log.render(f'  uploading workflow lib directory to {lib_remote_dir}')
-    utility.execute_command(f'aws s3 sync {lib_dir} {lib_remote_dir}')
+    utility.sync_directory_to_s3(lib_dir, lib_remote_dir)
+    client = boto3.client('batch')
+    jobs = dict()
+    downloads = list()
+    for name, comparison_dir, comparison_remote_dir in comparison_dirs:
+        command, output_remote_fp = create_aws_command(
+            name,
+            comparison_dir,
+            comparison_remote_dir,
+            output_type,
+            work_dir,
+            lib_remote_dir
+        )
+        log.render(f'  submitting report creation job to AWS Batch{f" for {name}" if name else ""}:')
+        # AWS Batch job names are limited to 128 characters
+        job_name = f'woof-report-creation-{name}'[:128] if name else 'woof-report-creation'
+        job_id, job_name = create_batch_job(client, command, job_name)
+        jobs[job_id] = job_name
+        downloads.append((comparison_dir, output_remote_fp))
+    await_batch_jobs(client, jobs)
+
+    # Download results if needed
     if output_type == 'local':
-        comparison_remote_dir = utility.join_paths(work_dir, 'other', 'output')
+        for comparison_dir, output_remote_fp in downloads:
+            output_local_fp = utility.join_paths(str(comparison_dir), 'report.html')
+            log.render(f'  downloading report {output_remote_fp} -> {output_local_fp}')
+            utility.download_file_from_s3(output_remote_fp, output_local_fp)
+
+
+def create_aws_command(name, comparison_dir, comparison_remote_dir, output_type, work_dir, lib_remote_dir):
+    # Set excludes for comparison directory sync
+    sync_excludes = ('*nextflow/*', 'pipeline_log_*txt')
+    sync_excludes_str = ' '.join(f'--exclude="{exclude}"' for exclude in sync_excludes)
+
+    # If needed up load output files
+    if output_type == 'local':
+        comparison_remote_dir = utility.join_paths(work_dir, 'other', 'output', name)
         log.render(f'  uploading comparison results directory to {comparison_remote_dir}')
-        utility.execute_command(f'aws s3 sync {sync_excludes} {comparison_dir} {comparison_remote_dir}')
+        utility.sync_directory_to_s3(comparison_dir, comparison_remote_dir, sync_excludes)
 
     # Create command to run on Batch
     # Download workflow and comparison files
@@ -135,20 +146,16 @@ def render_aws(comparison_dir, comparison_remote_dir, output_type, work_dir):
     comparison_batch_dir = 'output/'
     lib_batch_dir = 'workflow/lib/'
     commands.append(f'aws s3 sync {lib_remote_dir} {lib_batch_dir}')
-    commands.append(f'aws s3 sync {sync_excludes} {comparison_remote_dir} {comparison_batch_dir}')
+    commands.append(f'aws s3 sync {sync_excludes_str} {comparison_remote_dir} {comparison_batch_dir}')
     # Create R command
     report_entry_fp = utility.join_paths(lib_batch_dir, 'report.Rmd')
     output_fp = utility.join_paths(comparison_batch_dir, 'report.html')
     render_command = create_report_render_command(comparison_batch_dir, output_fp, report_entry_fp)
     commands.append(render_command)
     # Upload report
-    if output_type == 's3':
-        output_remote_fp = utility.join_paths(comparison_remote_dir, 'report.html')
-    elif output_type == 'local':
-        output_remote_fp = utility.join_paths(work_dir, 'other', 'output', 'report.html')
+    output_remote_fp = utility.join_paths(comparison_remote_dir, 'report.html')
     commands.append(f'aws s3 cp {output_fp} {output_remote_fp}')
 
-    # Submit Batch job and await
     # NOTE: commands are passed to Batch in the form: bash -c '<commands>', and so they must be
     # delimited by ';'. One complication to this is that BASH heredocs already define a delimited
     # and should have have a trailing ';'. We handle this in the loop below.
@@ -159,16 +166,7 @@ def render_aws(comparison_dir, comparison_remote_dir, output_type, work_dir):
         else:
             command = f'{command}\n'
         commands_delimited.append(command)
-    command = ''.join(commands_delimited)
-    log.render('  submitting report creation job to AWS Batch:')
-    submit_batch_job(command)
-
-    # Download result if needed
-    if output_type == 'local':
-        # NOTE: might be better practise to use boto3 here
-        output_local_fp = utility.join_paths(str(comparison_dir), 'report.html')
-        log.render(f'  downloading report {output_remote_fp} -> {output_local_fp}')
-        utility.execute_command(f'aws s3 cp {output_remote_fp} {output_local_fp}')
+    return ''.join(commands_delimited), output_remote_fp
 
 
 def render_local(comparison_dir, comparison_remote_dir, output_type):
@@ -179,8 +177,9 @@ def render_local(comparison_dir, comparison_remote_dir, output_type):
     utility.execute_command(render_command)
     # Upload to s3 is required
     if output_type == 's3':
-        output_remote_fp = utility.join_path(comparison_remote_dir, 'report.html')
-        utility.execute_command(f'aws s3 cp {output_fp} {output_remote_fp}')
+        output_remote_fp = utility.join_paths(comparison_remote_dir, 'report.html')
+        log.render(f'  uploading report {output_fp} -> {output_remote_fp}')
+        utility.upload_file_to_s3(output_fp, output_remote_fp)
 
 
 def create_report_render_command(comparison_dir, output_fp, report_entry_fp):
@@ -0,0 +1,143 @@
+import math
+import pathlib
+from typing import Dict, List
+
+
+from . import log
+from . import table
+from . import utility
+
+
+# Headroom applied to observed usage when generating tuned process resources
+MEMORY_HEADROOM = 1.5
+MEMORY_STEP_MB = 256
+MEMORY_MIN_MB = 512
+TIME_HEADROOM = 2.0
+TIME_MIN_MINUTES = 10
+# Exit codes indicating a task was killed for exceeding memory
+EXIT_CODES_OOM = {'137', '140'}
+
+PERCENTILES = (50, 95, 100)
+
+
+def analyse(trace_fp: pathlib.Path, output_dir: pathlib.Path) -> None:
+    # Summarise trace file resource usage and write a tuned resources config for later runs
+    if not trace_fp.exists():
+        return
+    records = read_trace(trace_fp)
+    summary = summarise(records)
+    if not summary:
+        return
+    summary_fp = output_dir / 'resource_summary.tsv'
+    config_fp = output_dir / 'resources.config'
+    write_summary(summary, summary_fp)
+    write_tuned_config(summary, config_fp)
+    log.task_msg_title('Task resource usage')
+    log.render_newline()
+    render_summary(summary)
+    log.render_newline()
+    log.render(f'Summary written to {summary_fp}')
+    log.render(f'Tuned process resources written to {config_fp}; use with --resources_config\n')
+
+
+def read_trace(trace_fp: pathlib.Path) -> Dict[str, List[Dict]]:
+    records: Dict[str, List[Dict]] = dict()
+    with trace_fp.open('r') as fh:
+        header = fh.readline().rstrip('\n').split('\t')
+        for line in fh:
+            record = dict(zip(header, line.rstrip('\n').split('\t')))
+            # Only the simple process name is used for withName selectors
+            name = (record.get('process') or record.get('name', '').split(' (')[0]).split(':')[-1]
+            if name not in records:
+                records[name] = list()
+            records[name].append(record)
+    return records
+
+
+def summarise(records: Dict[str, List[Dict]]) -> Dict[str, Dict]:
+    summary = dict()
+    for name, process_records in sorted(records.items()):
+        completed = [r for r in process_records if r.get('status') in {'COMPLETED', 'CACHED'}]
+        if not completed:
+            continue
+        cpu = [get_float(r, '%cpu') for r in completed]
+        peak_rss = [get_float(r, 'peak_rss') for r in completed]
+        realtime = [get_float(r, 'realtime') for r in completed]
+        oom = sum(1 for r in process_records if r.get('exit') in EXIT_CODES_OOM)
+        summary[name] = {
+            'tasks': len(completed),
+            'oom_failures': oom,
+            **{f'cpu_p{p}': percentile(cpu, p) for p in PERCENTILES},
+            **{f'peak_rss_p{p}': percentile(peak_rss, p) for p in PERCENTILES},
+            **{f'realtime_p{p}': percentile(realtime, p) for p in PERCENTILES},
+        }
+    return summary
+
+
+def percentile(values: List[float], p: int) -> float:
+    # Nearest-rank percentile
+    values_sorted = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(values_sorted)))
+    return values_sorted[rank - 1]
+
+
+def get_float(record: Dict[str, str], field: str) -> float:
+    # Missing values are recorded as '-'
+    try:
+        return float(record.get(field, '-'))
+    except ValueError:
+        return 0.0
+
+
+def get_tuned_resources(process_summary: Dict) -> Dict[str, int]:
+    # Size from the largest observed task with headroom; double memory headroom after OOM kills
+    memory_headroom = MEMORY_HEADROOM * (2 if process_summary['oom_failures'] else 1)
+    memory_mb = process_summary['peak_rss_p100'] / 2 ** 20 * memory_headroom
+    memory_mb = max(MEMORY_MIN_MB, math.ceil(memory_mb / MEMORY_STEP_MB) * MEMORY_STEP_MB)
+    time_minutes = process_summary['realtime_p100'] / 60000 * TIME_HEADROOM
+    time_minutes = max(TIME_MIN_MINUTES, math.ceil(time_minutes))
+    cpus = max(1, math.ceil(process_summary['cpu_p95'] / 100))
+    return {'memory_mb': memory_mb, 'time_minutes': time_minutes, 'cpus': cpus}
+
+
+def write_summary(summary: Dict[str, Dict], output_fp: pathlib.Path) -> None:
+    fields = list(next(iter(summary.values())).keys())
+    with output_fp.open('w') as fh:
+        print('process', *fields, sep='\t', file=fh)
+        for name, process_summary in summary.items():
+            print(name, *(process_summary[f] for f in fields), sep='\t', file=fh)
+
+
+def write_tuned_config(summary: Dict[str, Dict], output_fp: pathlib.Path) -> None:
+    config_lines = list()
+    config_lines.append('// Process resources tuned from observed usage by woof-nf')
+    config_lines.append('process {')
+    for name, process_summary in summary.items():
+        resources = get_tuned_resources(process_summary)
+        config_lines.append(f"  withName: '{name}' {{")
+        config_lines.append(f"    cpus = {resources['cpus']}")
+        config_lines.append(f"    memory = {{ {resources['memory_mb']}.MB * task.attempt }}")
+        config_lines.append(f"    time = {{ {resources['time_minutes']}.minutes * task.attempt }}")
+        config_lines.append('  }')
+    config_lines.append('}')
+    with output_fp.open('w') as fh:
+        print(*config_lines, sep='\n', file=fh)
+
+
+def render_summary(summary: Dict[str, Dict]) -> None:
+    header_row = table.Row(
+        ('Process', 'Tasks', 'CPU % (p95)', 'Peak RSS (p95)', 'Peak RSS (max)', 'Time (p50)', 'Time (max)'),
+        header=True
+    )
+    rows = [header_row]
+    for name, s in summary.items():
+        rows.append(table.Row((
+            name,
+            str(s['tasks']),
+            f"{s['cpu_p95']:.0f}",
+            utility.format_bytes(s['peak_rss_p95']),
+            utility.format_bytes(s['peak_rss_p100']),
+            f"{s['realtime_p50'] / 1000:.0f}s",
+            f"{s['realtime_p100'] / 1000:.0f}s",
+        )))
+    table.render_table(rows)
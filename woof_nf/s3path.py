@@ -2,20 +2,18 @@ import pathlib
 import re
 
 
-import boto3
-
-
 from . import log
 
 
-MESSAGE_LOGGED = False
 S3_PATH_RE = re.compile(r'^s3://([^/]+)/?(.*?)$')
 
 
 class VirtualPath():
 
-    def __init__(self, paths, current_path='root'):
+    def __init__(self, paths, current_path='root', metadata=None):
         self.paths = paths
+        # Object metadata from S3 listing e.g. size, keyed by full path
+        self.metadata = metadata if metadata is not None else dict()
         if current_path == 'root':
             assert len(paths[current_path]) == 1
             self.current_path = list(paths[current_path])[0]
@@ -30,7 +28,26 @@ class VirtualPath():
 
     def iterdir(self):
         for path in self.paths[self.current_path]:
-            yield self.__class__(self.paths, path)
+            yield self.__class__(self.paths, path, self.metadata)
+
+    def exists(self):
+        return self.current_path in self.paths or self.current_path in self.metadata
+
+    def with_name_suffix(self, suffix):
+        # Path with suffix appended to the full name e.g. <name>.vcf.gz -> <name>.vcf.gz.tbi
+        return self.__class__(self.paths, f'{self.current_path}{suffix}', self.metadata)
+
+    @property
+    def size(self):
+        return self.metadata.get(self.current_path, dict()).get('size')
+
+    @property
+    def mtime(self):
+        return self.metadata.get(self.current_path, dict()).get('mtime')
+
+    @property
+    def etag(self):
+        return self.metadata.get(self.current_path, dict()).get('etag')
 
     @property
     def name(self):
@@ -39,24 +56,38 @@ class VirtualPath():
 
 
 def process_paths(s3_path_info, run):
+    import boto3
     virtual_paths = list()
     for i, d in enumerate(s3_path_info, 1):
         log.render(f'  processing run {run}: path {i}/{len(s3_path_info)}...', end='\r', flush=True)
         # Get a list of all objects in bucket with given prefix
         s3_bucket = boto3.resource('s3').Bucket(d['bucket'])
-        paths = [f'{d["bucket"]}/{r.key}' for r in s3_bucket.objects.filter(Prefix=d['key'])]
+        paths = list()
+        metadata = dict()
+        for r in s3_bucket.objects.filter(Prefix=d['key']):
+            path = f'{d["bucket"]}/{r.key}'
+            paths.append(path)
+            metadata[f's3://{normalise_path(path)}'] = {
+                'size': r.size,
+                'mtime': r.last_modified.timestamp(),
+                'etag': r.e_tag.strip('"'),
+            }
         # Create a virtual file path set
-        vpath = create_virtual_paths(paths, d['bucket'], d['key'])
+        vpath = create_virtual_paths(paths, d['bucket'], d['key'], metadata)
         virtual_paths.append(vpath)
     log.render(f'  processing run {run}: path {i}/{len(s3_path_info)}... done', flush=True)
     return virtual_paths
 
 
-def create_virtual_paths(path_list, bucket, prefix):
+def normalise_path(path):
+    return path.replace('//', '/')
+
+
+def create_virtual_paths(path_list, bucket, prefix, metadata=None):
     paths = dict()
     for fp in path_list:
         # Normalise path and then split into parts
-        fp_normalised = fp.replace('//', '/')
+        fp_normalised = normalise_path(fp)
         parts = fp_normalised.split('/')
         parts[0] = f's3://{parts[0]}'
         # Iterate and create a flat dict with parent dirs mapping to children:
@@ -75,4 +106,4 @@ def create_virtual_paths(path_list, bucket, prefix):
     current_path = f's3://{bucket}/{prefix}'
     if not current_path.endswith('/'):
         current_path += '/'
-    return VirtualPath(paths, current_path=current_path)
+    return VirtualPath(paths, current_path=current_path, metadata=metadata)
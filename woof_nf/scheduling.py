@@ -0,0 +1,36 @@
+import heapq
+from typing import List
+
+
+# Relative cost per input byte by data type. Small variant inputs pass through several tasks (PASS
+# filter, indexing, intersection, comparison, counts) for both the input and filtered VCFs.
+DATA_TYPE_COST_WEIGHTS = {
+    'small_variants': 4.0,
+    'structural_variants': 1.0,
+    'copy_number_variants': 1.0,
+}
+# Fixed per-comparison cost (task launch, staging, R start up) expressed in input bytes
+TASK_OVERHEAD_BYTES = 50 * 2 ** 20
+
+
+def estimate_cost(data_type: str, file_sizes: List[int]) -> float:
+    weight = DATA_TYPE_COST_WEIGHTS.get(data_type, 1.0)
+    return TASK_OVERHEAD_BYTES + weight * sum(size or 0 for size in file_sizes)
+
+
+def order_file_pairs(file_pairs: List) -> List:
+    # Longest-processing-time-first: submit the most expensive comparisons first so that large
+    # samples do not start last and set the makespan. Ties keep discovery order.
+    def get_cost(file_pair):
+        file_sizes = [file_pair.file_one.file_size, file_pair.file_two.file_size]
+        return estimate_cost(file_pair.data_type, file_sizes)
+    return sorted(file_pairs, key=get_cost, reverse=True)
+
+
+def simulate_makespan(costs: List[float], workers: int) -> float:
+    # List scheduling: each job in order is assigned to the first free worker
+    worker_loads = [0.0] * workers
+    heapq.heapify(worker_loads)
+    for cost in costs:
+        heapq.heappush(worker_loads, heapq.heappop(worker_loads) + cost)
+    return max(worker_loads)
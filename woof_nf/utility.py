@@ -1,19 +1,42 @@
+import concurrent.futures
+import fnmatch
+import hashlib
+import json
 import os
 import pathlib
 import re
 import subprocess
 import sys
 import textwrap
+import threading
 
 
 from . import log
 from . import s3path
 
 
-import boto3
+PATH_RE = re.compile(r'(?<!s3:)/+')
 
+# Index file suffixes in order of preference
+VCF_INDEX_SUFFIXES = ('.tbi', '.csi')
 
-PATH_RE = re.compile(r'(?<!s3:)/+')
+# Records size/mtime/MD5 of files already uploaded from the nextflow directory
+UPLOAD_MANIFEST_FN = '.upload_manifest.json'
+UPLOAD_WORKERS = 8
+UPLOAD_LOCK = threading.Lock()
+HASH_BLOCK_SIZE = 2 ** 20
+INPUT_CHECKSUMS = dict()
+INPUT_CHECKSUM_LOCKS = dict()
+INPUT_CHECKSUM_LOCK = threading.Lock()
+# MD5 of local inputs persisted across runs, keyed by real path and reused while size and mtime
+# are unchanged
+INPUT_CHECKSUM_CACHE_FN = 'checksums.json'
+INPUT_CHECKSUM_CACHE = dict()
+INPUT_CHECKSUM_CACHE_STATE = {'read': False, 'changed': False}
+
+# S3 transfer settings; files above the threshold are sent as concurrent multipart transfers
+TRANSFER_MULTIPART_THRESHOLD = 16 * 2 ** 20
+TRANSFER_MAX_CONCURRENCY = 10
 
 
 def execute_command(command):
@@ -53,13 +76,13 @@ def process_input_directories(run_dir, run):
     # Process paths
     # NOTE: this should be done after AWS config check
     if paths_s3_info:
-        if not s3path.MESSAGE_LOGGED:
-            log.render('Retrieving S3 path file list, this may take some time')
-            s3path.MESSAGE_LOGGED = True
         paths_s3 = s3path.process_paths(paths_s3_info, run)
     else:
         paths_s3 = list()
-    return [*paths_s3, *paths_local]
+    # Return in the order given so that paths can be matched to their run directory
+    paths_s3_iter = iter(paths_s3)
+    paths_local_iter = iter(paths_local)
+    return [next(paths_s3_iter if d.startswith('s3') else paths_local_iter) for d in run_dir]
 
 
 def get_bucket_and_key(full_path):
@@ -77,24 +100,301 @@ def upload_log_and_config(log_fp, nextflow_dir, output_remote_dir):
 
 
 def upload_nextflow_dir(nextflow_dir, output_remote_dir):
-    bucket_name, key_prefix = get_bucket_and_key(output_remote_dir)
-    s3_bucket = boto3.resource('s3').Bucket(bucket_name)
-    for fp_local in nextflow_dir.rglob('*'):
-        if fp_local.is_dir():
-            continue
-        fp_local_str = str(fp_local)
-        fp_local_rel = fp_local_str.replace(str(nextflow_dir.parent), '')
-        fp_remote = join_paths(key_prefix, fp_local_rel)
-        s3_bucket.upload_file(fp_local_str, fp_remote)
+    # Only upload files that have changed since the last sync, as recorded in the upload manifest
+    with UPLOAD_LOCK:
+        bucket_name, key_prefix = get_bucket_and_key(output_remote_dir)
+        manifest_fp = nextflow_dir / UPLOAD_MANIFEST_FN
+        manifest = read_upload_manifest(manifest_fp)
+        uploads = list()
+        manifest_changed = False
+        for fp_local in nextflow_dir.rglob('*'):
+            if fp_local.is_dir() or fp_local == manifest_fp:
+                continue
+            fp_local_str = str(fp_local)
+            fp_local_rel = fp_local_str.replace(str(nextflow_dir.parent), '')
+            fp_remote = join_paths(key_prefix, fp_local_rel)
+            entry_previous = manifest.get(fp_remote)
+            mtime_previous = entry_previous['mtime'] if entry_previous else None
+            if file_entry := get_changed_file_entry(fp_local, entry_previous):
+                uploads.append((fp_local_str, fp_remote, file_entry))
+            elif entry_previous['mtime'] != mtime_previous:
+                # Touched but unchanged files only need their manifest entry updated
+                manifest_changed = True
+        if not uploads:
+            if manifest_changed:
+                write_upload_manifest(manifest_fp, manifest)
+            return
+        # Upload concurrently with a single shared client; boto3 clients are thread-safe
+        import boto3
+        client = boto3.client('s3')
+        with concurrent.futures.ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
+            futures = {
+                executor.submit(
+                    client.upload_file,
+                    fp_local_str,
+                    bucket_name,
+                    fp_remote,
+                    Config=get_transfer_config()
+                ): (fp_remote, file_entry)
+                for fp_local_str, fp_remote, file_entry in uploads
+            }
+            for future in concurrent.futures.as_completed(futures):
+                # Re-raise any upload errors
+                future.result()
+                fp_remote, file_entry = futures[future]
+                manifest[fp_remote] = file_entry
+        write_upload_manifest(manifest_fp, manifest)
+
+
+def get_changed_file_entry(filepath, entry_previous):
+    # Returns a new manifest entry if the file has changed, otherwise None. Size and mtime are
+    # checked first so that unchanged files are not needlessly hashed.
+    stat = filepath.stat()
+    entry = {'size': stat.st_size, 'mtime': stat.st_mtime}
+    if entry_previous:
+        if entry_previous['size'] == entry['size'] and entry_previous['mtime'] == entry['mtime']:
+            return None
+    entry['md5'] = get_file_md5(filepath)
+    if entry_previous and entry_previous.get('md5') == entry['md5']:
+        # Touched but unchanged; record new mtime without uploading
+        entry_previous['mtime'] = entry['mtime']
+        return None
+    return entry
+
+
+def get_file_md5(filepath):
+    md5 = hashlib.md5()
+    with filepath.open('rb') as fh:
+        for data in iter(lambda: fh.read(HASH_BLOCK_SIZE), b''):
+            md5.update(data)
+    return md5.hexdigest()
+
+
+def get_input_checksum(filepath, etag=None):
+    # Content checksum of an input file: S3 ETag from listing, otherwise MD5 of the local file.
+    # Local files are hashed at most once per run as the same baseline file is often in several
+    # pairs, and not at all when unchanged since a previous run
+    if etag:
+        return etag
+    with INPUT_CHECKSUM_LOCK:
+        lock = INPUT_CHECKSUM_LOCKS.setdefault(filepath, threading.Lock())
+    with lock:
+        if filepath not in INPUT_CHECKSUMS:
+            INPUT_CHECKSUMS[filepath] = get_local_checksum(filepath)
+    return INPUT_CHECKSUMS[filepath]
+
+
+def get_local_checksum(filepath):
+    realpath = os.path.realpath(filepath)
+    stat = os.stat(realpath)
+    with INPUT_CHECKSUM_LOCK:
+        entry = read_checksum_cache().get(realpath)
+    if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+        return entry['md5']
+    md5 = get_file_md5(pathlib.Path(realpath))
+    with INPUT_CHECKSUM_LOCK:
+        INPUT_CHECKSUM_CACHE[realpath] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'md5': md5}
+        INPUT_CHECKSUM_CACHE_STATE['changed'] = True
+    return md5
+
+
+def get_input_checksums(input_files):
+    # Hash local files concurrently; returns checksums in order of input_files
+    filepaths = {f.filepath for f in input_files if not f.checksum}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
+        list(executor.map(get_input_checksum, filepaths))
+    write_checksum_cache()
+    return [get_input_checksum(f.filepath, f.checksum) for f in input_files]
+
+
+def get_checksum_cache_fp():
+    cache_dir = os.environ.get('XDG_CACHE_HOME', pathlib.Path.home() / '.cache')
+    return pathlib.Path(cache_dir, 'woof-nf', INPUT_CHECKSUM_CACHE_FN)
+
+
+def read_checksum_cache():
+    # Read once per run; an unreadable cache is treated as empty
+    if not INPUT_CHECKSUM_CACHE_STATE['read']:
+        INPUT_CHECKSUM_CACHE_STATE['read'] = True
+        try:
+            with get_checksum_cache_fp().open('r') as fh:
+                INPUT_CHECKSUM_CACHE.update(json.load(fh))
+        except (OSError, ValueError):
+            pass
+    return INPUT_CHECKSUM_CACHE
+
+
+def write_checksum_cache():
+    # Entries of files that no longer exist are dropped. Failing to write the cache is not fatal
+    with INPUT_CHECKSUM_LOCK:
+        if not INPUT_CHECKSUM_CACHE_STATE['changed']:
+            return
+        INPUT_CHECKSUM_CACHE_STATE['changed'] = False
+        cache = {fp: entry for fp, entry in INPUT_CHECKSUM_CACHE.items() if os.path.exists(fp)}
+    # Replaced atomically as concurrent runs share the cache
+    cache_fp = get_checksum_cache_fp()
+    cache_tmp_fp = cache_fp.with_name(f'.{cache_fp.name}.{os.getpid()}.tmp')
+    try:
+        cache_fp.parent.mkdir(parents=True, exist_ok=True)
+        with cache_tmp_fp.open('w') as fh:
+            json.dump(cache, fh, indent=2, sort_keys=True)
+        os.replace(cache_tmp_fp, cache_fp)
+    except OSError:
+        pass
+
+
+def read_upload_manifest(manifest_fp):
+    if not manifest_fp.exists():
+        return dict()
+    with manifest_fp.open('r') as fh:
+        return json.load(fh)
+
+
+def write_upload_manifest(manifest_fp, manifest):
+    with manifest_fp.open('w') as fh:
+        json.dump(manifest, fh, indent=2, sort_keys=True)
+
+
+class NextflowDirSync:
+
+    # Periodically syncs the nextflow directory to S3 from a background thread
+    def __init__(self, nextflow_dir, output_remote_dir, interval):
+        self.nextflow_dir = nextflow_dir
+        self.output_remote_dir = output_remote_dir
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                upload_nextflow_dir(self.nextflow_dir, self.output_remote_dir)
+            except Exception as err:
+                # Never interrupt the workflow; the final sync will report persistent errors
+                log.render(log.ftext(f'warning: background sync of nextflow directory failed: {err}', c='yellow'))
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop_event.set()
+        self.thread.join()
 
 
 def upload_log(log_fp, output_remote_dir):
+    import boto3
     bucket_name, key_prefix = get_bucket_and_key(output_remote_dir)
     nextflow_remote_dir = join_paths(output_remote_dir, log_fp.name)
     fp_remote = join_paths(key_prefix, log_fp.name)
     boto3.resource('s3').Bucket(bucket_name).upload_file(str(log_fp), fp_remote)
 
 
+def get_transfer_config():
+    import boto3.s3.transfer
+    return boto3.s3.transfer.TransferConfig(
+        multipart_threshold=TRANSFER_MULTIPART_THRESHOLD,
+        max_concurrency=TRANSFER_MAX_CONCURRENCY,
+    )
+
+
+class TransferProgress:
+
+    # Callback for boto3 transfers; renders progress in 10% steps across one or more files. Callbacks
+    # run on transfer worker threads, which are outside of any capture of the calling thread, so
+    # intermediate progress is only rendered when the caller is not capturing output
+    def __init__(self, description, total_bytes):
+        self.description = description
+        self.total_bytes = total_bytes
+        self.transferred_bytes = 0
+        self.step_rendered = -1
+        self.lock = threading.Lock()
+        self.quiet = log.capture_active()
+
+    def __call__(self, bytes_amount):
+        with self.lock:
+            self.transferred_bytes += bytes_amount
+            step = self.transferred_bytes * 10 // self.total_bytes if self.total_bytes else 10
+            if step > self.step_rendered:
+                self.step_rendered = step
+                if not self.quiet:
+                    self.render(end='\r')
+
+    def render(self, end='\n'):
+        percent = min(100, self.step_rendered * 10)
+        size_str = format_bytes(self.total_bytes)
+        log.render(f'    {self.description}: {percent}% of {size_str}', end=end, flush=True)
+
+
+def format_bytes(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            break
+        size /= 1024
+    else:
+        unit = 'TB'
+    return f'{size:.1f} {unit}'
+
+
+def sync_directory_to_s3(local_dir, remote_dir, excludes=()):
+    # Equivalent of `aws s3 sync`: upload files that are absent remotely, differ in size, or are
+    # newer locally. Relative paths matching any exclude glob are skipped.
+    import boto3
+    local_dir = pathlib.Path(local_dir)
+    bucket_name, key_prefix = get_bucket_and_key(remote_dir)
+    client = boto3.client('s3')
+    remote_objects = dict()
+    paginator = client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=key_prefix):
+        for obj in page.get('Contents', list()):
+            remote_objects[obj['Key']] = obj
+    uploads = list()
+    for fp_local in local_dir.rglob('*'):
+        if fp_local.is_dir():
+            continue
+        fp_local_rel = str(fp_local.relative_to(local_dir))
+        if any(fnmatch.fnmatch(fp_local_rel, exclude) for exclude in excludes):
+            continue
+        key = join_paths(key_prefix, fp_local_rel)
+        stat = fp_local.stat()
+        if obj := remote_objects.get(key):
+            if obj['Size'] == stat.st_size and obj['LastModified'].timestamp() >= stat.st_mtime:
+                continue
+        uploads.append((fp_local, key, stat.st_size))
+    if not uploads:
+        return
+    total_bytes = sum(size for fp, key, size in uploads)
+    progress = TransferProgress(f'uploading {len(uploads)} files', total_bytes)
+    config = get_transfer_config()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
+        futures = [
+            executor.submit(client.upload_file, str(fp), bucket_name, key, Config=config, Callback=progress)
+            for fp, key, size in uploads
+        ]
+        for future in concurrent.futures.as_completed(futures):
+            future.result()
+    progress.render()
+
+
+def upload_file_to_s3(local_fp, remote_fp):
+    import boto3
+    bucket_name, key = get_bucket_and_key(remote_fp)
+    progress = TransferProgress(f'uploading {pathlib.Path(local_fp).name}', os.path.getsize(local_fp))
+    client = boto3.client('s3')
+    client.upload_file(str(local_fp), bucket_name, key, Config=get_transfer_config(), Callback=progress)
+    progress.render()
+
+
+def download_file_from_s3(remote_fp, local_fp):
+    import boto3
+    bucket_name, key = get_bucket_and_key(remote_fp)
+    client = boto3.client('s3')
+    size = client.head_object(Bucket=bucket_name, Key=key)['ContentLength']
+    progress = TransferProgress(f'downloading {pathlib.Path(key).name}', size)
+    client.download_file(bucket_name, key, str(local_fp), Config=get_transfer_config(), Callback=progress)
+    progress.render()
+
+
 def regex_glob(regex, dirpath, data_source=None):
     matches = [dirpath]
     matches_new = list()
@@ -136,6 +436,46 @@ def filepath_iterator(filepath):
         yield from os.scandir(filepath)
 
 
+def get_filepath_size(filepath):
+    # File size in bytes; S3 sizes are taken from listing metadata to avoid further requests
+    if isinstance(filepath, s3path.VirtualPath):
+        return filepath.size
+    else:
+        return filepath.stat().st_size
+
+
+def get_filepath_checksum(filepath):
+    # S3 ETag from listing metadata; local files are hashed only when needed
+    if isinstance(filepath, s3path.VirtualPath):
+        return filepath.etag
+    else:
+        return None
+
+
+def get_vcf_index_filepath(filepath):
+    # Locate an existing, up to date index for a bgzipped VCF. S3 paths are checked against the
+    # listing from input discovery as S3 exists() calls from Nextflow are denied.
+    if not get_filepath_str(filepath).endswith('.vcf.gz'):
+        return None
+    for suffix in VCF_INDEX_SUFFIXES:
+        if isinstance(filepath, s3path.VirtualPath):
+            index = filepath.with_name_suffix(suffix)
+            if not index.exists():
+                continue
+            index_mtime, vcf_mtime = index.mtime, filepath.mtime
+            index_str = str(index)
+        else:
+            index_str = f'{filepath.path}{suffix}'
+            if not os.path.exists(index_str):
+                continue
+            index_mtime, vcf_mtime = os.path.getmtime(index_str), filepath.stat().st_mtime
+        # Ignore indices older than the VCF
+        if index_mtime is not None and vcf_mtime is not None and index_mtime < vcf_mtime:
+            continue
+        return index_str
+    return None
+
+
 def get_filepath_str(filepath):
     if isinstance(filepath, s3path.VirtualPath):
         # s3path.VirtualPath currently distinguishes directories and files by trailing
@@ -9,13 +9,17 @@ from typing import Dict, List, Optional
 
 
 from . import aws
+from . import cache
 from . import log
+from . import monitor
+from . import resources
 from . import utility
 
 
 DOCKER_URI_HUB = 'docker.io/scwatts/woof-nf:0.2.5'
 
 PROCESS_LINE_RE = re.compile(r'^\[[ -/0-9a-z]+\] process > (\S+).+?$')
+PROCESS_COUNT_RE = re.compile(r'\[ *\d+%\] \d+ of (\d+)')
 STAGING_LINE_RE = re.compile(r'^Staging foreign file: (.+)$')
 RETRY_LINE_RE = re.compile(r'^\[[ -/0-9a-z]+\] NOTE: Process.+?Execution is retried.+?$')
 BIN_UPLOAD_LINE_RE = re.compile(r'^Uploading local `bin` scripts.+$')
@@ -30,7 +34,7 @@ AWS_COMPLETION = [
 
 class RenderInfo:
 
-    def __init__(self):
+    def __init__(self, trace_monitor=None):
         self.title = str()
         self.executor = str()
         self.processes = dict()
@@ -48,6 +52,8 @@ class RenderInfo:
         # Extra status flags
         self.killing_tasks = False
         self.transfering_files = False
+        # Per-process task metrics from the trace file
+        self.trace_monitor = trace_monitor
 
 
 def create_configuration(
@@ -55,7 +61,13 @@ def create_configuration(
     output_dir: pathlib.Path,
     nextflow_run_dir: pathlib.Path,
     docker: bool,
-    executor: str
+    executor: str,
+    resources_config_fp: Optional[pathlib.Path] = None,
+    profile_dir: Optional[str] = None,
+    regions=None,
+    strata=None,
+    mode: str = 'exact',
+    publish_mode: str = 'copy'
 ) -> pathlib.Path:
     # Copy in defaults
     default_config_src_fp = pathlib.Path(__file__).parent / 'workflow/defaults.config'
@@ -67,7 +79,22 @@ def create_configuration(
     config_lines.append(f'params.inputs_fp = "{inputs_fp}"')
     config_lines.append(f'params.output_dir = "{output_dir}"')
     config_lines.append(f'params.nextflow_run_dir = "{nextflow_run_dir}"')
-    config_lines.append(f'params.publish_mode = "copy"')
+    config_lines.append(f'params.profile_dir = "{profile_dir}"')
+    config_lines.append(f'params.publish_mode = "{publish_mode}"')
+    if regions:
+        config_lines.append(f'params.regions_fp = "{regions.filepath}"')
+        config_lines.append(f'params.regions_checksum = "{regions.checksum}"')
+    else:
+        config_lines.append('params.regions_fp = null')
+        config_lines.append('params.regions_checksum = null')
+    config_lines.append(f'params.quick = {"true" if mode == "quick" else "false"}')
+    if strata:
+        strata_fp = strata.write(nextflow_run_dir / 'strata.bed')
+        config_lines.append('params.stratify = true')
+        config_lines.append(f'params.strata_fp = "{strata_fp.absolute()}"')
+    else:
+        config_lines.append('params.stratify = false')
+        config_lines.append('params.strata_fp = null')
     config_lines.append('')
     config_lines.append('// Executor')
     if executor == 'aws':
@@ -81,8 +108,12 @@ def create_configuration(
     if docker:
         config_lines.append('docker.enabled = true')
         config_lines.append(f'process.container = "{DOCKER_URI_HUB}"')
-    # Include defaults.config
+    # Include defaults.config, and then tuned process resources so that they take precedence
     config_lines.append(f'includeConfig "{default_config_fp.absolute()}"')
+    if resources_config_fp:
+        resources_config_local_fp = nextflow_run_dir / 'resources.input.config'
+        shutil.copy(resources_config_fp, resources_config_local_fp)
+        config_lines.append(f'includeConfig "{resources_config_local_fp.absolute()}"')
     # Write to disk
     output_fp = nextflow_run_dir / 'nextflow.config'
     with output_fp.open('w') as fh:
@@ -100,7 +131,15 @@ def run(
     run_timestamp: str,
     resume: bool,
     docker: bool,
-    executor: str
+    executor: str,
+    sync_interval: int = 0,
+    resources_config_fp: Optional[pathlib.Path] = None,
+    cache_dir: Optional[str] = None,
+    pipeline_fn: str = 'pipeline.nf',
+    regions=None,
+    strata=None,
+    mode: str = 'exact',
+    publish_mode: str = 'copy'
 ) -> None:
     # Set the actual final output directory.
     # We allow operation in 'local' and 'remote' mode. For remote mode, files are written to an S3
@@ -122,8 +161,26 @@ def run(
     # Create directory for nextflow logs and reports
     nextflow_run_dir = nextflow_dir / run_timestamp
     nextflow_run_dir.mkdir(mode=0o700)
+    # VCF profiles are stored by content checksum with the comparison cache if provided so that
+    # they are shared across runs, otherwise in the work directory. Batch tasks require S3 storage.
+    if cache_dir and (executor == 'local' or cache_dir.startswith('s3://')):
+        profile_dir = utility.join_paths(cache_dir, cache.PROFILES_DN)
+    else:
+        profile_dir = utility.join_paths(str(work_dir), cache.PROFILES_DN)
     # Create workflow config, set log filepath, and set work directory
-    config_fp = create_configuration(inputs_fp, output_dir_final, nextflow_run_dir, docker, executor)
+    config_fp = create_configuration(
+        inputs_fp,
+        output_dir_final,
+        nextflow_run_dir,
+        docker,
+        executor,
+        resources_config_fp,
+        profile_dir,
+        regions,
+        strata,
+        mode,
+        publish_mode
+    )
     log_fp = nextflow_run_dir / 'nextflow_log.txt'
     if output_type == 's3':
         utility.upload_nextflow_dir(nextflow_dir, output_remote_dir)
@@ -136,7 +193,7 @@ def run(
     command_tokens.append(f'-work-dir {work_dir}')
     if resume:
         command_tokens.append('-resume')
-    workflow_fp = pathlib.Path(__file__).parent / 'workflow/pipeline.nf'
+    workflow_fp = pathlib.Path(__file__).parent / 'workflow' / pipeline_fn
     command_tokens.append(workflow_fp)
     # Construct full command
     log.task_msg_title('Executing workflow')
@@ -152,26 +209,73 @@ def run(
         shell=True,
         universal_newlines=True,
     )
-    # Stream output to terminal, replicating NF console logging
-    errors = render_nextflow_lines(p)
+    # Stream output to terminal, replicating NF console logging and adding task metrics from the
+    # trace file. Optionally sync nextflow directory to S3 in the background so that logs and
+    # reports are available while the workflow runs
+    trace_monitor = monitor.TraceMonitor(
+        nextflow_run_dir / 'trace.txt',
+        nextflow_run_dir / 'progress.json'
+    )
+    if output_type == 's3' and sync_interval:
+        with utility.NextflowDirSync(nextflow_dir, output_remote_dir, sync_interval):
+            errors = render_nextflow_lines(p, trace_monitor)
+    else:
+        errors = render_nextflow_lines(p, trace_monitor)
     # Block until pipeline process exits
     p.wait()
     # Print errors and propagate erroneous return code
     if errors:
         error_str = ''.join(errors)
         log.render(error_str)
+    # Summarise task resource usage and generate tuned resources config for later runs
+    resources.analyse(nextflow_run_dir / 'trace.txt', nextflow_run_dir)
     if output_type == 's3':
         utility.upload_nextflow_dir(nextflow_dir, output_remote_dir)
     if p.returncode != 0:
         sys.exit(1)
+    if output_type == 'local':
+        verify_published_outputs(output_dir, nextflow_dir, work_dir)
+
 
+def verify_published_outputs(output_dir: pathlib.Path, nextflow_dir: pathlib.Path, work_dir) -> None:
+    # Published outputs must remain once the work directory is cleaned up. Hardlinked outputs are
+    # independent directory entries and remain; symlinks into the work directory would dangle
+    output_dir = output_dir.resolve()
+    dirs_skip = {nextflow_dir.resolve(), pathlib.Path(work_dir).resolve()}
+    outputs_n = 0
+    outputs_linked_n = 0
+    outputs_failed = list()
+    for dirpath, dirnames, filenames in os.walk(output_dir):
+        dirpath = pathlib.Path(dirpath)
+        dirnames[:] = [d for d in dirnames if dirpath / d not in dirs_skip]
+        for filename in filenames:
+            fp = dirpath / filename
+            outputs_n += 1
+            if fp.is_symlink():
+                target = fp.resolve()
+                if not target.exists() or any(target.is_relative_to(d) for d in dirs_skip):
+                    outputs_failed.append(fp)
+            elif fp.stat().st_nlink > 1:
+                outputs_linked_n += 1
+    if outputs_failed:
+        msg = f'{len(outputs_failed)} published outputs would not remain after work directory cleanup:'
+        log.render(log.ftext(f'error: {msg}', c='red'))
+        for fp in outputs_failed:
+            log.render(log.ftext(f'  {fp}', c='red'))
+        sys.exit(1)
+    msg = f'verified {outputs_n} published outputs remain after work directory cleanup'
+    log.render(f'info: {msg} ({outputs_linked_n} hardlinked)\n')
 
-def render_nextflow_lines(p: subprocess.Popen) -> List[str]:
+
+def render_nextflow_lines(
+    p: subprocess.Popen,
+    trace_monitor: Optional[monitor.TraceMonitor] = None
+) -> List[str]:
     # NOTE: type checking requires p.stdout not to be None
     if not p.stdout:
         assert False
     # Process lines
-    ri = RenderInfo()
+    ri = RenderInfo(trace_monitor)
     for line in p.stdout:
         # Allow re-rendering if current line and last are not newlines
         if line != '\n' and ri.newline_previous:
@@ -184,6 +288,8 @@ def render_nextflow_lines(p: subprocess.Popen) -> List[str]:
         elif process_match := PROCESS_LINE_RE.match(line):
             process_name = process_match.group(1)
             ri.processes[process_name] = f'    {line}'
+            if ri.trace_monitor and (count_match := PROCESS_COUNT_RE.search(line)):
+                ri.trace_monitor.update_submitted(process_name, int(count_match.group(1)))
         elif aws_staging_match := STAGING_LINE_RE.match(line):
             # S3:// files always downloaded; local files always uploaded
             staging_file = aws_staging_match.group(1)
@@ -215,6 +321,8 @@ def render_nextflow_lines(p: subprocess.Popen) -> List[str]:
         #   - end of 'process' block (general case)
         #   - first pass to allow quick header/splash display
         if (line == '\n' and not ri.newline_previous) or ri.splash:
+            if ri.trace_monitor:
+                ri.trace_monitor.poll()
             term_size = shutil.get_terminal_size()
             ri.lines_displayed = sum(get_actual_lines(ri.line_sizes, term_size))
             ri.line_sizes = render_output(ri, term_size)
@@ -236,8 +344,12 @@ def render_nextflow_lines(p: subprocess.Popen) -> List[str]:
         ri.executor,
         *ri.processes.values(),
         '\n',
-        *ri.info,
     ]
+    if ri.trace_monitor:
+        ri.trace_monitor.poll()
+        if trace_lines := ri.trace_monitor.render_lines():
+            status.extend((*trace_lines, '\n'))
+    status.extend(ri.info)
     status_str = ''.join(status)
     log.render(status_str, sep='')
     return ri.errors
@@ -267,6 +379,10 @@ def render_output(ri, term_size: os.terminal_size) -> List[int]:
     lines_all.append(ri.title)
     lines_all.append(ri.executor)
     lines_all.extend(ri.processes.values())
+    # Task metrics block
+    if ri.trace_monitor and (trace_lines := ri.trace_monitor.render_lines()):
+        lines_all.append('\n')
+        lines_all.extend(trace_lines)
     # Staging block; nested if statements to pad block with newlines
     lines_all.append('\n')
     if ri.files_uploading or ri.files_downloading:
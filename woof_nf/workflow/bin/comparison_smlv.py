@@ -20,15 +20,15 @@ def get_arguments():
             help='Input VCF (one) filepath')
     parser.add_argument('--vcf_2', required=True, type=pathlib.Path,
             help='Input VCF (two) filepath')
-    parser.add_argument('--vcf_3', required=True, type=pathlib.Path,
-            help='Input VCF (three) filepath')
+    parser.add_argument('--input_snps', required=True, type=int,
+            help='SNP count of the first input VCF, from its profile')
+    parser.add_argument('--input_indels', required=True, type=int,
+            help='Indel count of the first input VCF, from its profile')
     args = parser.parse_args()
     if not args.vcf_1.exists():
         parser.error(f'Input file {args.vcf_1} does not exist')
     if not args.vcf_2.exists():
         parser.error(f'Input file {args.vcf_2} does not exist')
-    if not args.vcf_3.exists():
-        parser.error(f'Input file {args.vcf_3} does not exist')
     return args
 
 
@@ -40,11 +40,18 @@ def main():
     sys.path.insert(0, str(shared.get_lib_path()))
     import woof_compare
 
-    # Run process
-    woof_compare.eval(
-        args.vcf_1,
-        args.vcf_2,
-        args.vcf_3,
+    # Run process. Records of the first input VCF are either private (FP, vcf_1) or shared (TP), so
+    # TP counts are taken from its profile rather than counting the shared records VCF
+    fpc = woof_compare.count_variants(args.vcf_1)
+    fnc = woof_compare.count_variants(args.vcf_2)
+    tpc = {
+        'snps': args.input_snps - fpc['snps'],
+        'indels': args.input_indels - fpc['indels'],
+    }
+    woof_compare.eval_counts(
+        fpc,
+        fnc,
+        tpc,
         f'{args.file_type}.tsv',
         args.sample_name,
         args.file_type,
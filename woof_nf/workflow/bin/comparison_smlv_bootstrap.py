@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+import argparse
+import bisect
+import csv
+import pathlib
+import random
+
+
+import shared
+
+
+# Bootstrap replicates, confidence level, and seed; fixed so that results are repeatable
+REPLICATES = 1000
+CONFIDENCE = 0.95
+SEED = 20210801
+VARIANT_TYPES = {'snps': 'SNP', 'indels': 'IND'}
+
+
+def get_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sample_name', required=True,
+            help='Sample name')
+    parser.add_argument('--file_type', required=True,
+            help='Name of file type')
+    parser.add_argument('--source', required=True,
+            help='Source of variants (input or filtered)')
+    parser.add_argument('--vcf_fp', required=True, type=pathlib.Path,
+            help='Records only in run one (0000.vcf.gz)')
+    parser.add_argument('--vcf_fn', required=True, type=pathlib.Path,
+            help='Records only in run two (0001.vcf.gz)')
+    parser.add_argument('--vcf_tp', required=True, type=pathlib.Path,
+            help='Shared records, as in run one (0002.vcf.gz)')
+    parser.add_argument('--windows', required=True, type=pathlib.Path,
+            help='BED of sampled windows')
+    args = parser.parse_args()
+    for fp in (args.vcf_fp, args.vcf_fn, args.vcf_tp, args.windows):
+        if not fp.exists():
+            parser.error(f'Input file {fp} does not exist')
+    return args
+
+
+def read_windows(windows_fp):
+    # Contig -> sorted window starts and ends; windows are the bootstrap sampling unit
+    windows = dict()
+    with windows_fp.open('r') as fh:
+        for line in fh:
+            if not line.strip() or line.startswith('#'):
+                continue
+            contig, start, end = line.rstrip('\n').split('\t')[:3]
+            windows.setdefault(contig, list()).append((int(start), int(end)))
+    starts = dict()
+    ends = dict()
+    for contig, contig_windows in windows.items():
+        contig_windows.sort()
+        starts[contig] = [start for start, end in contig_windows]
+        ends[contig] = [end for start, end in contig_windows]
+    return starts, ends
+
+
+def count_windows(vcf_fp, call_type, counts, starts, ends):
+    # Records are assigned to the window containing POS
+    with shared.open_vcf(vcf_fp) as fh:
+        for line in fh:
+            if line.startswith('#'):
+                continue
+            contig, position, record_id, ref, alt = line.split('\t', 5)[:5]
+            if contig not in starts:
+                continue
+            index = bisect.bisect_right(starts[contig], int(position) - 1) - 1
+            if index < 0 or ends[contig][index] <= int(position) - 1:
+                continue
+            # SNP/indel classification matches woof_compare.count_variants
+            variant_type = 'snps' if len(ref) == len(alt) == 1 else 'indels'
+            counts[variant_type][(contig, index)][call_type] += 1
+
+
+def get_metrics(tp, fp, fn):
+    recall = tp / (tp + fn) if tp + fn else 0
+    precision = tp / (tp + fp) if tp + fp else 0
+    return recall, precision
+
+
+def get_percentile(values, quantile):
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(quantile * (len(values) - 1))))
+    return values[index]
+
+
+def bootstrap(window_counts, rng):
+    # Resample windows with replacement and recompute metrics from summed counts
+    recalls = list()
+    precisions = list()
+    for i in range(REPLICATES):
+        tp = fp = fn = 0
+        for window_tp, window_fp, window_fn in rng.choices(window_counts, k=len(window_counts)):
+            tp += window_tp
+            fp += window_fp
+            fn += window_fn
+        recall, precision = get_metrics(tp, fp, fn)
+        recalls.append(recall)
+        precisions.append(precision)
+    alpha = (1 - CONFIDENCE) / 2
+    recall_ci = (get_percentile(recalls, alpha), get_percentile(recalls, 1 - alpha))
+    precision_ci = (get_percentile(precisions, alpha), get_percentile(precisions, 1 - alpha))
+    return recall_ci, precision_ci
+
+
+def main():
+    # Get command line arguments
+    args = get_arguments()
+
+    # Count TP, FP, and FN in each window. All windows are included in resampling, including
+    # those without any records
+    starts, ends = read_windows(args.windows)
+    windows = [(contig, index) for contig in starts for index in range(len(starts[contig]))]
+    counts = {
+        variant_type: {window: {'tp': 0, 'fp': 0, 'fn': 0} for window in windows}
+        for variant_type in VARIANT_TYPES
+    }
+    for vcf_fp, call_type in ((args.vcf_tp, 'tp'), (args.vcf_fp, 'fp'), (args.vcf_fn, 'fn')):
+        count_windows(vcf_fp, call_type, counts, starts, ends)
+    # Windows are given with and without the 'chr' contig prefix, retain only those matching the
+    # naming of the VCFs so that windows of absent contigs do not inflate the sample
+    contigs_observed = {
+        contig
+        for variant_counts in counts.values()
+        for (contig, index), c in variant_counts.items()
+        if any(c.values())
+    }
+    contigs_chr = any(contig.startswith('chr') for contig in contigs_observed)
+    for variant_counts in counts.values():
+        for contig, index in windows:
+            if contig.startswith('chr') != contigs_chr:
+                del variant_counts[(contig, index)]
+
+    # Point estimates and bootstrap confidence intervals
+    rng = random.Random(SEED)
+    with open(f'{args.file_type}_quick.tsv', 'w') as fh:
+        writer = csv.writer(fh, delimiter='\t')
+        writer.writerow([
+            'sample',
+            'flabel',
+            'subset',
+            'variant_type',
+            'windows',
+            'TP',
+            'FP',
+            'FN',
+            'Recall',
+            'Recall_lower',
+            'Recall_upper',
+            'Precision',
+            'Precision_lower',
+            'Precision_upper',
+        ])
+        for variant_type, variant_type_name in VARIANT_TYPES.items():
+            window_counts = [(c['tp'], c['fp'], c['fn']) for c in counts[variant_type].values()]
+            tp, fp, fn = (sum(values) for values in zip(*window_counts)) if window_counts else (0, 0, 0)
+            recall, precision = get_metrics(tp, fp, fn)
+            recall_ci, precision_ci = bootstrap(window_counts, rng) if window_counts else ((0, 0), (0, 0))
+            writer.writerow([
+                args.sample_name,
+                args.file_type,
+                args.source,
+                variant_type_name,
+                len(window_counts),
+                tp,
+                fp,
+                fn,
+                recall,
+                *recall_ci,
+                precision,
+                *precision_ci,
+            ])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+import argparse
+import collections
+import csv
+import itertools
+import pathlib
+
+
+import shared
+
+
+# Histogram bin edges of run two minus run one differences; values outside the outer edges are
+# placed in the outermost bins
+AF_DELTA_EDGES = [round(-1 + i * 0.05, 2) for i in range(41)]
+DP_DELTA_EDGES = [-100, -50, -20, -10, -5, -2, -1, 0, 1, 2, 5, 10, 20, 50, 100]
+
+
+def get_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sample_name', required=True,
+            help='Sample name')
+    parser.add_argument('--file_type', required=True,
+            help='Name of file type')
+    parser.add_argument('--source', required=True,
+            help='Source of variants (input or filtered)')
+    parser.add_argument('--vcf_one', required=True, type=pathlib.Path,
+            help='Shared records as in run one (0002.vcf.gz)')
+    parser.add_argument('--vcf_two', required=True, type=pathlib.Path,
+            help='Shared records as in run two (0003.vcf.gz)')
+    args = parser.parse_args()
+    for vcf_fp in (args.vcf_one, args.vcf_two):
+        if not vcf_fp.exists():
+            parser.error(f'Input file {vcf_fp} does not exist')
+    return args
+
+
+def iterate_records(vcf_fp):
+    with shared.open_vcf(vcf_fp) as fh:
+        for line in fh:
+            if line.startswith('#'):
+                continue
+            yield line.rstrip('\n').split('\t')
+
+
+def get_genotype(format_values):
+    # Unphased, allele sorted genotype; missing if not present
+    genotype = format_values.get('GT', '.')
+    alleles = genotype.replace('|', '/').split('/')
+    if '.' in alleles:
+        return './.' if len(alleles) > 1 else '.'
+    return '/'.join(sorted(alleles, key=int))
+
+
+def get_bin(value, edges):
+    if value < edges[0]:
+        return f'<{edges[0]}'
+    for lower, upper in zip(edges, edges[1:]):
+        if value < upper:
+            return f'[{lower},{upper})'
+    return f'>={edges[-1]}'
+
+
+class Concordance:
+
+    def __init__(self):
+        self.paired = 0
+        self.unpaired = 0
+        self.genotypes = collections.Counter()
+        self.af_deltas = collections.Counter()
+        self.dp_deltas = collections.Counter()
+        # Running sums for means without retaining values
+        self.af_delta_sum = 0.0
+        self.af_delta_abs_sum = 0.0
+        self.dp_delta_sum = 0
+
+    def add(self, tokens_one, tokens_two):
+        # bcftools isec writes shared records of each input in the same order, so records are
+        # paired as read. Records at differing sites should not occur but are counted, not compared
+        if tokens_one is None or tokens_two is None:
+            self.unpaired += 1
+            return
+        if tokens_one[:2] + tokens_one[3:5] != tokens_two[:2] + tokens_two[3:5]:
+            self.unpaired += 1
+            return
+        self.paired += 1
+        info_one, format_one = shared.get_record_values(tokens_one)
+        info_two, format_two = shared.get_record_values(tokens_two)
+        if format_one or format_two:
+            self.genotypes[(get_genotype(format_one), get_genotype(format_two))] += 1
+        vaf_one = shared.get_vaf(info_one, format_one)
+        vaf_two = shared.get_vaf(info_two, format_two)
+        if vaf_one is not None and vaf_two is not None:
+            af_delta = vaf_two - vaf_one
+            self.af_deltas[get_bin(af_delta, AF_DELTA_EDGES)] += 1
+            self.af_delta_sum += af_delta
+            self.af_delta_abs_sum += abs(af_delta)
+        dp_one = shared.get_depth(info_one, format_one)
+        dp_two = shared.get_depth(info_two, format_two)
+        if dp_one is not None and dp_two is not None:
+            dp_delta = dp_two - dp_one
+            self.dp_deltas[get_bin(dp_delta, DP_DELTA_EDGES)] += 1
+            self.dp_delta_sum += dp_delta
+
+    def get_summary(self):
+        gt_compared = sum(self.genotypes.values())
+        gt_concordant = sum(count for (gt_one, gt_two), count in self.genotypes.items() if gt_one == gt_two)
+        af_compared = sum(self.af_deltas.values())
+        dp_compared = sum(self.dp_deltas.values())
+        return [
+            self.paired,
+            self.unpaired,
+            gt_compared,
+            gt_concordant,
+            gt_concordant / gt_compared if gt_compared else 'NaN',
+            af_compared,
+            self.af_delta_sum / af_compared if af_compared else 'NaN',
+            self.af_delta_abs_sum / af_compared if af_compared else 'NaN',
+            dp_compared,
+            self.dp_delta_sum / dp_compared if dp_compared else 'NaN',
+        ]
+
+    def get_histograms(self):
+        # Bins in edge order, with empty bins omitted
+        for (gt_one, gt_two), count in sorted(self.genotypes.items()):
+            yield 'genotype', f'{gt_one}>{gt_two}', count
+        histograms = (
+            ('af_delta', self.af_deltas, AF_DELTA_EDGES),
+            ('dp_delta', self.dp_deltas, DP_DELTA_EDGES),
+        )
+        for metric, counter, edges in histograms:
+            labels = [f'<{edges[0]}', *(f'[{l},{u})' for l, u in zip(edges, edges[1:])), f'>={edges[-1]}']
+            for label in labels:
+                if counter[label]:
+                    yield metric, label, counter[label]
+
+
+def main():
+    # Get command line arguments
+    args = get_arguments()
+
+    # Pair shared records of both runs in a single streaming pass
+    concordance = Concordance()
+    records = itertools.zip_longest(iterate_records(args.vcf_one), iterate_records(args.vcf_two))
+    for tokens_one, tokens_two in records:
+        concordance.add(tokens_one, tokens_two)
+
+    # Write summary and histograms
+    with open('concordance.tsv', 'w') as fh:
+        writer = csv.writer(fh, delimiter='\t')
+        writer.writerow([
+            'sample',
+            'flabel',
+            'subset',
+            'paired',
+            'unpaired',
+            'gt_compared',
+            'gt_concordant',
+            'gt_concordance',
+            'af_compared',
+            'af_delta_mean',
+            'af_delta_abs_mean',
+            'dp_compared',
+            'dp_delta_mean',
+        ])
+        writer.writerow([args.sample_name, args.file_type, args.source, *concordance.get_summary()])
+    with open('concordance_hist.tsv', 'w') as fh:
+        writer = csv.writer(fh, delimiter='\t')
+        writer.writerow(['sample', 'flabel', 'subset', 'metric', 'bin', 'count'])
+        for metric, label, count in concordance.get_histograms():
+            writer.writerow([args.sample_name, args.file_type, args.source, metric, label, count])
+
+
+if __name__ == '__main__':
+    main()
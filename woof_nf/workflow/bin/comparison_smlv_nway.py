@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+import argparse
+import collections
+import csv
+import itertools
+import pathlib
+import sys
+
+
+import shared
+
+
+def get_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sample_name', required=True,
+            help='Sample name')
+    parser.add_argument('--file_type', required=True,
+            help='Name of file type')
+    parser.add_argument('--run_sets', required=True,
+            help='Comma separated run set names, in the order VCFs were intersected')
+    parser.add_argument('--sites_input', required=True, type=pathlib.Path,
+            help='Sites of all input records from bcftools isec -n +1')
+    parser.add_argument('--sites_filtered', required=True, type=pathlib.Path,
+            help='Sites of PASS records from bcftools isec -n +1')
+    args = parser.parse_args()
+    for sites_fp in (args.sites_input, args.sites_filtered):
+        if not sites_fp.exists():
+            parser.error(f'Input file {sites_fp} does not exist')
+    args.run_sets = args.run_sets.split(',')
+    return args
+
+
+def count_sites(sites_fp):
+    # Count SNPs and indels for each bitmask; SNP/indel classification matches
+    # woof_compare.count_variants
+    counts = collections.Counter()
+    with sites_fp.open('r') as fh:
+        for line in fh:
+            chrom, pos, ref, alt, bitmask = line.rstrip('\n').split('\t')
+            variant_type = 'snps' if len(ref) == len(alt) == 1 else 'indels'
+            counts[(bitmask, variant_type)] += 1
+    return counts
+
+
+def get_pair_counts(counts, index_one, index_two):
+    # As with pairwise comparison, records only in run one are FP and records only in run two are FN
+    fpc = {'snps': 0, 'indels': 0}
+    fnc = {'snps': 0, 'indels': 0}
+    tpc = {'snps': 0, 'indels': 0}
+    for (bitmask, variant_type), count in counts.items():
+        in_one = bitmask[index_one] == '1'
+        in_two = bitmask[index_two] == '1'
+        if in_one and in_two:
+            tpc[variant_type] += count
+        elif in_one:
+            fpc[variant_type] += count
+        elif in_two:
+            fnc[variant_type] += count
+    return fpc, fnc, tpc
+
+
+def main():
+    # Get command line arguments
+    args = get_arguments()
+
+    # Import woof python code
+    sys.path.insert(0, str(shared.get_lib_path()))
+    import woof_compare
+
+    # All metrics are derived from the single multi-way intersection of each subset
+    pairwise_rows = list()
+    upset_rows = list()
+    for subset, sites_fp in (('pass', args.sites_input), ('filtered', args.sites_filtered)):
+        counts = count_sites(sites_fp)
+        # Pairwise metrics for each pair of run sets
+        for index_one, index_two in itertools.combinations(range(len(args.run_sets)), 2):
+            fpc, fnc, tpc = get_pair_counts(counts, index_one, index_two)
+            row = woof_compare.eval_row(fpc, fnc, tpc, args.sample_name, args.file_type, subset)
+            pairwise_rows.append([args.run_sets[index_one], args.run_sets[index_two], *row])
+        # Concordance counts for each combination of run sets (UpSet)
+        bitmasks = sorted({bitmask for bitmask, variant_type in counts}, reverse=True)
+        for bitmask in bitmasks:
+            run_sets = [name for name, bit in zip(args.run_sets, bitmask) if bit == '1']
+            snps = counts[(bitmask, 'snps')]
+            indels = counts[(bitmask, 'indels')]
+            upset_rows.append([
+                args.sample_name,
+                args.file_type,
+                subset,
+                ','.join(run_sets),
+                len(run_sets),
+                snps,
+                indels,
+                snps + indels,
+            ])
+
+    # Write
+    with open(f'{args.file_type}_pairwise.tsv', 'w') as fh:
+        writer = csv.writer(fh, delimiter='\t')
+        writer.writerow(['run_one', 'run_two', *woof_compare.EVAL_HEADER])
+        writer.writerows(pairwise_rows)
+    with open(f'{args.file_type}_upset.tsv', 'w') as fh:
+        writer = csv.writer(fh, delimiter='\t')
+        writer.writerow(['sample', 'flabel', 'subset', 'run_sets', 'run_sets_n', 'SNP', 'IND', 'total'])
+        writer.writerows(upset_rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+import argparse
+import bisect
+import collections
+import csv
+import pathlib
+import sys
+
+
+import shared
+
+
+# Indel length bins (inclusive, upper bound None for unbounded) and VAF bin edges
+INDEL_LENGTH_BINS = (
+    (1, 1, '1'),
+    (2, 5, '2-5'),
+    (6, 15, '6-15'),
+    (16, 50, '16-50'),
+    (51, None, '>50'),
+)
+VAF_BIN_EDGES = (0.0, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0)
+# Records from the first input VCF are FP or TP, records from the second input are FN
+CALL_TYPES = ('tp', 'fp', 'fn')
+VARIANT_TYPES = {'snps': 'SNP', 'indels': 'IND'}
+
+
+def get_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sample_name', required=True,
+            help='Sample name')
+    parser.add_argument('--file_type', required=True,
+            help='Name of file type')
+    parser.add_argument('--source', required=True,
+            help='Source of variants (input or filtered)')
+    parser.add_argument('--vcf_fp', required=True, type=pathlib.Path,
+            help='Records only in run one (0000.vcf.gz)')
+    parser.add_argument('--vcf_fn', required=True, type=pathlib.Path,
+            help='Records only in run two (0001.vcf.gz)')
+    parser.add_argument('--vcf_tp', required=True, type=pathlib.Path,
+            help='Shared records, as in run one (0002.vcf.gz)')
+    parser.add_argument('--strata_bed', type=pathlib.Path,
+            help='BED of region strata with stratum name in the fourth column')
+    args = parser.parse_args()
+    for vcf_fp in (args.vcf_fp, args.vcf_fn, args.vcf_tp):
+        if not vcf_fp.exists():
+            parser.error(f'Input file {vcf_fp} does not exist')
+    if args.strata_bed and not args.strata_bed.exists():
+        parser.error(f'Input file {args.strata_bed} does not exist')
+    return args
+
+
+class RegionStrata:
+
+    def __init__(self, strata_fp):
+        # Sorted, merged intervals for each stratum and contig: name -> contig -> [(start, end)]
+        intervals = dict()
+        with strata_fp.open('r') as fh:
+            for line in fh:
+                if not line.strip() or line.startswith('#'):
+                    continue
+                contig, start, end, name = line.rstrip('\n').split('\t')[:4]
+                intervals.setdefault(name, dict()).setdefault(contig, list()).append((int(start), int(end)))
+        self.names = list(intervals)
+        self.intervals = dict()
+        self.starts = dict()
+        for name, contig_intervals in intervals.items():
+            for contig, ivs in contig_intervals.items():
+                merged = list()
+                for start, end in sorted(ivs):
+                    if merged and start <= merged[-1][1]:
+                        merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+                    else:
+                        merged.append((start, end))
+                self.intervals[(name, contig)] = merged
+                self.starts[(name, contig)] = [start for start, end in merged]
+
+    def get_strata(self, contig, position, ref_length):
+        # Record spans POS to the end of REF
+        start, end = position - 1, position - 1 + max(ref_length, 1)
+        strata = list()
+        for name in self.names:
+            key = (name, contig)
+            if key not in self.intervals:
+                continue
+            index = bisect.bisect_left(self.starts[key], end) - 1
+            if index >= 0 and self.intervals[key][index][1] > start:
+                strata.append(name)
+        return strata
+
+
+def get_length_bin(ref, alt):
+    if len(ref) == len(alt) == 1:
+        return 'snv'
+    # Length difference of the first alternate allele
+    length = len(alt.split(',')[0]) - len(ref)
+    event = 'ins' if length > 0 else 'del'
+    for lower, upper, label in INDEL_LENGTH_BINS:
+        if abs(length) >= lower and (upper is None or abs(length) <= upper):
+            return f'{event}_{label}'
+    # Complex substitution with equal allele lengths
+    return 'complex'
+
+
+def get_vaf_bin(vaf):
+    if vaf is None:
+        return 'NA'
+    for lower, upper in zip(VAF_BIN_EDGES, VAF_BIN_EDGES[1:]):
+        if vaf < upper or upper == VAF_BIN_EDGES[-1]:
+            return f'[{lower:.2f},{upper:.2f}' + (']' if upper == VAF_BIN_EDGES[-1] else ')')
+    return 'NA'
+
+
+def count_strata(vcf_fp, call_type, counts, region_strata):
+    # Single streaming pass, counts are updated for every stratum the record is in
+    with shared.open_vcf(vcf_fp) as fh:
+        for line in fh:
+            if line.startswith('#'):
+                continue
+            tokens = line.rstrip('\n').split('\t')
+            contig, position, ref, alt = tokens[0], int(tokens[1]), tokens[3], tokens[4]
+            # SNP/indel classification matches woof_compare.count_variants
+            variant_type = 'snps' if len(ref) == len(alt) == 1 else 'indels'
+            strata = [
+                ('all', 'all'),
+                ('chromosome', contig),
+                ('variant_length', get_length_bin(ref, alt)),
+                ('vaf', get_vaf_bin(shared.get_vaf(*shared.get_record_values(tokens)))),
+            ]
+            if region_strata:
+                region_names = region_strata.get_strata(contig, position, len(ref))
+                strata.extend(('region', name) for name in region_names or ['none'])
+            for stratifier, stratum in strata:
+                counts[(stratifier, stratum, variant_type)][call_type] += 1
+
+
+def main():
+    # Get command line arguments
+    args = get_arguments()
+
+    # Import woof python code
+    sys.path.insert(0, str(shared.get_lib_path()))
+    import woof_compare
+
+    # Count TP, FP, and FN for all strata in one pass over each intersect VCF
+    region_strata = RegionStrata(args.strata_bed) if args.strata_bed else None
+    if region_strata and not region_strata.names:
+        region_strata = None
+    counts = collections.defaultdict(lambda: dict.fromkeys(CALL_TYPES, 0))
+    for vcf_fp, call_type in ((args.vcf_tp, 'tp'), (args.vcf_fp, 'fp'), (args.vcf_fn, 'fn')):
+        count_strata(vcf_fp, call_type, counts, region_strata)
+
+    # Write long format table
+    with open(f'{args.file_type}_strata.tsv', 'w') as fh:
+        writer = csv.writer(fh, delimiter='\t')
+        writer.writerow([
+            'sample',
+            'flabel',
+            'subset',
+            'stratifier',
+            'stratum',
+            'variant_type',
+            'Truth',
+            'TP',
+            'FP',
+            'FN',
+            'Recall',
+            'Precision',
+            'f1',
+        ])
+        for (stratifier, stratum, variant_type), call_counts in sorted(counts.items()):
+            tp, fp, fn = (call_counts[call_type] for call_type in CALL_TYPES)
+            truth = tp + fn
+            recall = tp / truth if truth else 0
+            precision = tp / (tp + fp) if tp + fp else 0
+            writer.writerow([
+                args.sample_name,
+                args.file_type,
+                args.source,
+                stratifier,
+                stratum,
+                VARIANT_TYPES[variant_type],
+                truth,
+                tp,
+                fp,
+                fn,
+                recall,
+                precision,
+                woof_compare.f_measure(1, precision, recall),
+            ])
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,4 @@
+import gzip
 import pathlib
 import subprocess
 import sys
@@ -28,3 +29,47 @@ def execute_command(command: str) -> subprocess.CompletedProcess:
         print('stderr:', result.stderr, file=sys.stderr)
         sys.exit(1)
     return result
+
+
+def open_vcf(vcf_fp):
+    if str(vcf_fp).endswith('.gz'):
+        return gzip.open(vcf_fp, 'rt')
+    else:
+        return open(vcf_fp, 'r')
+
+
+def get_record_values(tokens):
+    # INFO and first sample FORMAT values of a tokenised VCF record
+    info_values = dict(t.split('=', 1) for t in tokens[7].split(';') if '=' in t)
+    if len(tokens) > 9:
+        format_values = dict(zip(tokens[8].split(':'), tokens[9].split(':')))
+    else:
+        format_values = dict()
+    return info_values, format_values
+
+
+def get_vaf(info_values, format_values):
+    # In order: tumour AF (PCGR), per sample AF, INFO AF, then from allelic depths
+    for value in (info_values.get('TUMOR_AF'), format_values.get('AF'), info_values.get('AF')):
+        if value and value != '.':
+            try:
+                return float(value.split(',')[0])
+            except ValueError:
+                pass
+    depths = format_values.get('AD')
+    if depths and '.' not in depths:
+        depths = [int(d) for d in depths.split(',')]
+        if sum(depths) > 0 and len(depths) > 1:
+            return depths[1] / sum(depths)
+    return None
+
+
+def get_depth(info_values, format_values):
+    # In order: tumour DP (PCGR), per sample DP, then INFO DP
+    for value in (info_values.get('TUMOR_DP'), format_values.get('DP'), info_values.get('DP')):
+        if value and value != '.':
+            try:
+                return int(value)
+            except ValueError:
+                pass
+    return None
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import pathlib
+
+
+import shared
+
+
+def get_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--vcf', required=True, type=pathlib.Path,
+            help='Input VCF filepath')
+    parser.add_argument('--output', required=True, type=pathlib.Path,
+            help='Output profile JSON filepath')
+    args = parser.parse_args()
+    if not args.vcf.exists():
+        parser.error(f'Input file {args.vcf} does not exist')
+    return args
+
+
+def profile_vcf(vcf_fp):
+    # Single streaming pass. SNP/indel classification matches woof_compare.count_variants and PASS
+    # records include missing filters as with the workflow PASS filter. Sorted requires each contig
+    # to be contiguous with non-decreasing positions, which is all that indexing needs.
+    profile = {
+        'records': 0,
+        'records_pass': 0,
+        'snps': 0,
+        'indels': 0,
+        'snps_pass': 0,
+        'indels_pass': 0,
+        'contigs': list(),
+        'samples': list(),
+        'sorted': True,
+    }
+    contigs_seen = set()
+    contig_last = None
+    position_last = 0
+    with shared.open_vcf(vcf_fp) as fh:
+        for line in fh:
+            if line.startswith('##'):
+                continue
+            if line.startswith('#'):
+                profile['samples'] = line.rstrip('\n').split('\t')[9:]
+                continue
+            contig, position, _, ref, alt, _, filter_value = line.split('\t', 7)[:7]
+            position = int(position)
+            if contig != contig_last:
+                if contig in contigs_seen:
+                    profile['sorted'] = False
+                else:
+                    contigs_seen.add(contig)
+                    profile['contigs'].append(contig)
+                contig_last = contig
+            elif position < position_last:
+                profile['sorted'] = False
+            position_last = position
+            variant_type = 'snps' if len(ref) == len(alt) == 1 else 'indels'
+            profile['records'] += 1
+            profile[variant_type] += 1
+            if filter_value in {'.', 'PASS'}:
+                profile['records_pass'] += 1
+                profile[f'{variant_type}_pass'] += 1
+    return profile
+
+
+def main():
+    # Get command line arguments
+    args = get_arguments()
+
+    # Profile and write
+    profile = profile_vcf(args.vcf)
+    with args.output.open('w') as fh:
+        json.dump(profile, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
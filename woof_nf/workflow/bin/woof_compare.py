@@ -24,7 +24,44 @@ def eval(fp_vcf, fn_vcf, tp_vcf, out, sample, flab, subset):
     fpc = count_variants(fp_vcf)
     fnc = count_variants(fn_vcf)
     tpc = count_variants(tp_vcf)
+    eval_counts(fpc, fnc, tpc, out, sample, flab, subset)
 
+
+EVAL_HEADER = [
+    "sample",
+    "flabel",
+    "subset",
+    "SNP_Truth",
+    "SNP_TP",
+    "SNP_FP",
+    "SNP_FN",
+    "SNP_Recall",
+    "SNP_Precision",
+    "SNP_f1",
+    "SNP_f2",
+    "SNP_f3",
+    "IND_Truth",
+    "IND_TP",
+    "IND_FP",
+    "IND_FN",
+    "IND_Recall",
+    "IND_Precision",
+    "IND_f1",
+    "IND_f2",
+    "IND_f3",
+]
+
+
+# Split from eval so that counts can be provided from VCF profiles
+def eval_counts(fpc, fnc, tpc, out, sample, flab, subset):
+    with open(out, "w") as f:
+        writer = csv.writer(f, delimiter="\t")
+        writer.writerow(EVAL_HEADER)
+        writer.writerow(eval_row(fpc, fnc, tpc, sample, flab, subset))
+
+
+# Split from eval_counts so that many rows can be written to one table (N-way comparison)
+def eval_row(fpc, fnc, tpc, sample, flab, subset):
     fp_snp, fp_ind = (fpc["snps"], fpc["indels"])
     fn_snp, fn_ind = (fnc["snps"], fnc["indels"])
     tp_snp, tp_ind = (tpc["snps"], tpc["indels"])
@@ -47,58 +84,29 @@ def eval(fp_vcf, fn_vcf, tp_vcf, out, sample, flab, subset):
     ind_f2 = f_measure(2, ind_precision, ind_recall)
     ind_f3 = f_measure(3, ind_precision, ind_recall)
 
-    with open(out, "w") as f:
-        writer = csv.writer(f, delimiter="\t")
-        writer.writerow(
-            [
-                "sample",
-                "flabel",
-                "subset",
-                "SNP_Truth",
-                "SNP_TP",
-                "SNP_FP",
-                "SNP_FN",
-                "SNP_Recall",
-                "SNP_Precision",
-                "SNP_f1",
-                "SNP_f2",
-                "SNP_f3",
-                "IND_Truth",
-                "IND_TP",
-                "IND_FP",
-                "IND_FN",
-                "IND_Recall",
-                "IND_Precision",
-                "IND_f1",
-                "IND_f2",
-                "IND_f3",
-            ]
-        )
-        writer.writerow(
-            [
-                sample,
-                flab,
-                subset,
-                snp_truth,
-                tp_snp,
-                fp_snp,
-                fn_snp,
-                snp_recall,
-                snp_precision,
-                snp_f1,
-                snp_f2,
-                snp_f3,
-                ind_truth,
-                tp_ind,
-                fp_ind,
-                fn_ind,
-                ind_recall,
-                ind_precision,
-                ind_f1,
-                ind_f2,
-                ind_f3,
-            ]
-        )
+    return [
+        sample,
+        flab,
+        subset,
+        snp_truth,
+        tp_snp,
+        fp_snp,
+        fn_snp,
+        snp_recall,
+        snp_precision,
+        snp_f1,
+        snp_f2,
+        snp_f3,
+        ind_truth,
+        tp_ind,
+        fp_ind,
+        fn_ind,
+        ind_recall,
+        ind_precision,
+        ind_f1,
+        ind_f2,
+        ind_f3,
+    ]
 
 
 def f_measure(b, prec, recall):
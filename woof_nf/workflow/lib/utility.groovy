@@ -1,3 +1,4 @@
+import groovy.json.JsonSlurper
 import java.nio.file.Paths
 
 
@@ -10,15 +11,22 @@ import java.nio.file.Paths
 // This could be dealt with if I was able to override the hashCode function but Nextflow prevents this at compile-time. And
 // so, we are instead using a hash. Using a function for more explicit definition.
 def create_attributes(
+   String comparison_name,
    String sample_name,
    String run_type,
    String run_number,
    String data_source,
    String data_type,
    Boolean filtered,
-   Boolean indexed
+   Boolean indexed,
+   Long input_size,
+   Integer group_size,
+   Integer source_count,
+   String checksum
 ) {
   [
+    // Comparison name of batch mode, used as the output subdirectory; empty for a single comparison
+    comparison_name: comparison_name,
     sample_name: sample_name,
     run_type: run_type,
     run_number: run_number,
@@ -26,7 +34,15 @@ def create_attributes(
     data_source: data_source,
     data_type: data_type,
     filtered: filtered,
-    indexed: indexed
+    indexed: indexed,
+    input_size: input_size,
+    // Number of files for this sample and data source, and number of data sources of this data
+    // type for the sample; used to create sized group keys so that groups are emitted on completion
+    group_size: group_size,
+    source_count: source_count,
+    // Input content checksum, keys the VCF profile; profile is set once available
+    checksum: checksum,
+    profile: null
   ]
 }
 
@@ -38,8 +54,10 @@ def process_inputs(input_files) {
   def inputs_sv = []
   input_files.each { d ->
     // Unpack and cast here; error raises while trying to unpack in closure params
-    (sample_name, run_type, run_number, data_source, data_type, filepath) = d
+    (comparison_name, sample_name, run_type, run_number, data_source, data_type, filepath, file_size, group_size, source_count, checksum, index_filepath) = d
     def filepath = file(filepath)
+    // Index filepath is an empty trailing field when absent, which split() drops
+    def index_file = index_filepath ? file(index_filepath) : null
     // Restrict some values
     assert run_number in ['one', 'two']
     assert data_type in ['copy_number_variants', 'small_variants', 'structural_variants']
@@ -56,19 +74,24 @@ def process_inputs(input_files) {
     ]
     // Set attributes
     def attributes = create_attributes(
+     comparison_name,
      sample_name,
      run_type,
      run_number,
      data_source,
      data_type,
      false,  // filtered
-     null  // indexed
+     null,  // indexed
+     file_size as Long,
+     group_size as Integer,
+     source_count as Integer,
+     checksum ?: null
     )
     // Sort into appropriate list
     if (attributes.data_type == 'copy_number_variants') {
       inputs_cnv << [attributes, filepath]
     } else if (attributes.data_type == 'small_variants') {
-      inputs_smlv << [attributes, filepath]
+      inputs_smlv << [attributes, filepath, index_file]
     } else if (attributes.data_type == 'structural_variants') {
       inputs_sv << [attributes, filepath]
     }
@@ -84,25 +107,113 @@ def process_inputs(input_files) {
 }
 
 
+def process_inputs_nway(input_files) {
+  // Small variant inputs of N-way comparison; run number holds the run set name
+  def inputs_smlv = input_files.collect { d ->
+    // Unpack and cast here; error raises while trying to unpack in closure params
+    (sample_name, run_type, run_set, set_index, data_source, data_type, filepath, file_size, group_size, index_filepath) = d
+    assert data_type == 'small_variants'
+    def attributes = create_attributes(
+     '',  // comparison_name
+     sample_name,
+     run_type,
+     run_set,
+     data_source,
+     data_type,
+     false,  // filtered
+     null,  // indexed
+     file_size as Long,
+     group_size as Integer,
+     1,  // source_count
+     null  // checksum
+    )
+    // Order of the run set, VCFs are passed to the multi-way intersection in this order
+    attributes.set_index = set_index as Integer
+    [attributes, file(filepath), index_filepath ? file(index_filepath) : null]
+  }
+  return Channel.fromList(locate_vcf_indices(inputs_smlv))
+}
+
+
 def locate_vcf_indices(inputs) {
-  inputs.eachWithIndex { v, i ->
-    def file = v[1]
-    if (file.toString().endsWith('.tsv')) {
-      return
+  // Existing VCF indices are located during input discovery and provided in the inputs file. This
+  // includes S3 inputs, where calling exists() on an S3Path results in an access denied response
+  // from the AWS api (NOTE 20210729). VCFs without an index are indexed by the workflow.
+  return inputs.collect { attributes, vcf, vcf_index ->
+    attributes.indexed = vcf_index != null
+    // NOTE: using Path instance to avoid NF restrictions on path() process inputs
+    [attributes, vcf, vcf_index ?: Paths.get('NO_FILE')]
+  }
+}
+
+def get_file_attributes(attributes) {
+  // Attributes of an input processed once for all comparisons it is in. Comparison specific values
+  // are cleared so that task hashes do not depend on which comparison was seen first; the input
+  // checksum is retained to fan results out to comparisons, as the regions stage modifies checksum
+  def attributes_out = attributes.clone()
+  attributes_out.comparison_name = null
+  attributes_out.run_number = null
+  attributes_out.group_size = null
+  attributes_out.source_count = null
+  attributes_out.input_checksum = attributes.checksum
+  return attributes_out
+}
+
+def add_comparison_attributes(ch_vcfs, ch_files) {
+  // Fan results of per input file stages out to each comparison the input is in. Comparison values
+  // are taken from the input attributes and stage values (subset, index, size, profile) from the
+  // result attributes
+  // Format (ch_vcfs): [attributes, vcf, vcf_index]
+  // Format (ch_files): [attributes, vcf, vcf_index]
+  ch_files_keyed = ch_files.map { [it[0].input_checksum, *it] }
+  return ch_vcfs
+    .map { [it[0].checksum, it[0]] }
+    .combine(ch_files_keyed, by: 0)
+    .map { checksum, attributes, attributes_file, vcf, vcf_index ->
+      def attributes_out = attributes.clone()
+      attributes_out.filtered = attributes_file.filtered
+      attributes_out.indexed = attributes_file.indexed
+      attributes_out.input_size = attributes_file.input_size
+      attributes_out.checksum = attributes_file.checksum
+      attributes_out.profile = attributes_file.profile
+      [attributes_out, vcf, vcf_index]
     }
-    // NOTE (20210729): calling exists() on an S3Path results in an access denied response from the
-    // AWS api, so we avoid doing so here and opt to re-create VCF indices even if they exist on S3
-    def vcf_index = file + '.tbi'
-    if (vcf_index.getClass() == java.nio.file.Path && vcf_index.exists()) {
-      inputs[i][0].indexed = true
-      inputs[i] << vcf_index
-    } else {
-      inputs[i][0].indexed = false
-      // NOTE: using Path instance to avoid NF restrictions on path() process inputs
-      inputs[i] << Paths.get('NO_FILE')
+}
+
+def add_vcf_profiles(ch_vcfs, ch_profiles) {
+  // Join VCFs with their profiles by checksum and set profile attribute
+  // Format (ch_vcfs): [attributes, vcf, vcf_index]
+  // Format (ch_profiles): [attributes, profile]
+  ch_profiles_keyed = ch_profiles.map { attributes, profile_fp -> [attributes.checksum, profile_fp] }
+  return ch_vcfs
+    .map { [it[0].checksum, *it] }
+    .combine(ch_profiles_keyed, by: 0)
+    .map { checksum, attributes, vcf, vcf_index, profile_fp ->
+      def attributes_out = attributes.clone()
+      attributes_out.profile = read_vcf_profile(profile_fp)
+      [attributes_out, vcf, vcf_index]
     }
-  }
-  return inputs
+}
+
+def read_vcf_profile(profile_fp) {
+  // Copy into a plain map as JsonSlurper returns lazily evaluated maps
+  return new LinkedHashMap(new JsonSlurper().parseText(profile_fp.text))
+}
+
+def get_filtered_vcf_profile(profile) {
+  // The PASS filter output contains only PASS records and is always sorted
+  def profile_filtered = profile.clone()
+  profile_filtered.records = profile.records_pass
+  profile_filtered.snps = profile.snps_pass
+  profile_filtered.indels = profile.indels_pass
+  profile_filtered.sorted = true
+  return profile_filtered
+}
+
+def get_vcf_count_line(attributes) {
+  // Variant count line of counts.tsv from the VCF profile
+  def filtered = attributes.filtered ? 'filtered' : 'pass'
+  return "${attributes.data_source}\t${attributes.run_number}\t${filtered}\t${attributes.profile.records}"
 }
 
 def prepare_smlv_channel(ch_vcfs) {
@@ -124,15 +235,15 @@ def pair_vcf_and_indices(ch_vcf_and_indices) {
   // Format: [attributes, vcf_one, index_one, vcf_two, index_two]
   ch_result = ch_vcf_and_indices
     // As we cannot directly call groupTuple on Attributes, we construct the group key and place at index 0:
-    // Format: [[sample_name, data_source], attributes, vcf_one, index_one, vcf_two, index_two]
+    // Format: [[comparison_name, sample_name, data_source], attributes, vcf_one, index_one, vcf_two, index_two]
     .map {
         def attrs = it[0]
         def values = it[1..-1]
-        tuple(groupKey([attrs.sample_name, attrs.data_source], 0), attrs, *values)
+        tuple(groupKey([attrs.comparison_name, attrs.sample_name, attrs.data_source], attrs.group_size), attrs, *values)
     }
     // Now we can collect with groupTuple
     // Format: [
-    //             [sample_name, data_source],
+    //             [comparison_name, sample_name, data_source],
     //             [attributes_one, attributes_two],
     //             [vcf_one, vcf_two],
     //             [index_one, index_two]
@@ -148,6 +259,9 @@ def pair_vcf_and_indices(ch_vcf_and_indices) {
       // Use first attribute instance and update
       def attributes = attributes_list[0].clone()
       attributes.run_number = null
+      attributes.input_size = get_pair_input_size(attributes_list)
+      // Profile of the first VCF, which is the source of true positives in comparison
+      attributes.profile = attributes_list[index_one].profile
       return [
         attributes,
         vcfs[index_one],
@@ -159,13 +273,41 @@ def pair_vcf_and_indices(ch_vcf_and_indices) {
   return ch_result
 }
 
+def group_vcf_sets(ch_vcf_and_indices) {
+  // Group VCFs and indices of all run sets, ordered by run set
+  // Format: [attributes, [vcfs], [vcf_indices]]
+  ch_result = ch_vcf_and_indices
+    // As we cannot directly call groupTuple on Attributes, we construct the group key and place at index 0:
+    // Format: [[sample_name, run_type, data_source], attributes, vcf, vcf_index]
+    .map { attrs, vcf, vcf_index ->
+      tuple(groupKey([attrs.sample_name, attrs.run_type, attrs.data_source], attrs.group_size), attrs, vcf, vcf_index)
+    }
+    // Now we can collect with groupTuple
+    // Format: [[sample_name, run_type, data_source], [attributes], [vcfs], [vcf_indices]]
+    .groupTuple()
+    .map { group_key, attributes_list, vcfs, vcf_indices ->
+      def order = (0..<attributes_list.size()).sort { attributes_list[it].set_index }
+      // Use first attribute instance and update
+      def attributes = attributes_list[0].clone()
+      attributes.run_number = null
+      attributes.run_sets = order.collect { attributes_list[it].run_number }
+      attributes.input_size = get_pair_input_size(attributes_list)
+      return [
+        attributes,
+        order.collect { vcfs[it] },
+        order.collect { vcf_indices[it] }
+      ]
+    }
+  return ch_result
+}
+
 def pair_files(ch_files) {
   ch_result = ch_files
     // As we cannot directly call groupTuple on Attributes, we construct the group key and place at index 0:
-    // Format: [sample_name, attributes, file]
-    .map { attrs, file -> tuple( groupKey(attrs.sample_name, 0), attrs, file ) }
+    // Format: [[comparison_name, sample_name], attributes, file]
+    .map { attrs, file -> tuple( groupKey([attrs.comparison_name, attrs.sample_name], attrs.group_size), attrs, file ) }
     // Now we can collect with groupTuple
-    // Format: [sample_name, [attributes_one, attributes_two], [file_one, file_two]]
+    // Format: [[comparison_name, sample_name], [attributes_one, attributes_two], [file_one, file_two]]
     .groupTuple()
     .map { group_key, attributes_list, files ->
       // Get index of first and second file
@@ -177,6 +319,7 @@ def pair_files(ch_files) {
       // Use first attribute instance and update
       attributes = attributes_list[0]
       attributes.run_number = null
+      attributes.input_size = get_pair_input_size(attributes_list)
       return [
         attributes,
         files[index_one],
@@ -186,6 +329,48 @@ def pair_files(ch_files) {
   return ch_result
 }
 
+def get_publish_basedir(comparison_name, sample_name) {
+  // Outputs of each batch comparison are published to their own subdirectory
+  def comparison_dir = comparison_name ? "${params.output_dir}/${comparison_name}" : params.output_dir
+  return "${comparison_dir}/${sample_name}"
+}
+
+def get_pair_input_size(attributes_list) {
+  // Paired tasks process both inputs
+  return attributes_list.sum { it.input_size ?: 0 }
+}
+
+// Task resources scaled by input size (in GB) using rules from params.resource_scaling, which are
+// selected by data type with fallback to the default rules. Retries scale resources by attempt.
+def get_resource_rules(attributes) {
+  def rules = params.resource_scaling
+  return rules.containsKey(attributes.data_type) ? rules[attributes.data_type] : rules.default
+}
+
+def get_input_size_gb(attributes) {
+  return (attributes.input_size ?: 0) / 1024**3 as double
+}
+
+def task_memory(attributes, attempt) {
+  def rules = get_resource_rules(attributes)
+  def memory_mb = rules.memory_base_mb + rules.memory_mb_per_gb * get_input_size_gb(attributes)
+  memory_mb = Math.min(memory_mb, rules.memory_max_mb) as Long
+  return new nextflow.util.MemoryUnit("${memory_mb * attempt} MB")
+}
+
+def task_time(attributes, attempt) {
+  def rules = get_resource_rules(attributes)
+  def minutes = rules.time_base_minutes + rules.time_minutes_per_gb * get_input_size_gb(attributes)
+  minutes = Math.min(minutes, rules.time_max_minutes) as Long
+  return new nextflow.util.Duration("${minutes * attempt}m")
+}
+
+def task_cpus(attributes) {
+  def rules = get_resource_rules(attributes)
+  def cpus = rules.cpus_base + rules.cpus_per_gb * get_input_size_gb(attributes)
+  return Math.min(Math.ceil(cpus), rules.cpus_max) as Integer
+}
+
 def get_file_order(attributes_list) {
   def index_one = null
   def index_two = null
@@ -208,7 +393,7 @@ def get_file_order(attributes_list) {
 }
 
 def check_attribute_consistency(attributes_list) {
-  attributes_check = ['sample_name', 'run_type', 'data_source', 'data_type', 'filtered', 'indexed']
+  attributes_check = ['comparison_name', 'sample_name', 'run_type', 'data_source', 'data_type', 'filtered', 'indexed']
   for (attribute_check in attributes_check) {
     def value_one = attributes_list[0][attribute_check]
     def value_two = attributes_list[1][attribute_check]
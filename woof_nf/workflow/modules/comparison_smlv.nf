@@ -1,15 +1,19 @@
+include { get_publish_basedir; task_cpus; task_memory; task_time } from '../lib/utility.groovy'
+
 process module_smlv_comparison {
   publishDir "${publish_dir}", saveAs: { "${attributes_in.data_source}${fn_suffix}.tsv" }, mode: "${params.publish_mode}"
-
+  cpus { task_cpus(attributes_in) }
+  memory { task_memory(attributes_in, task.attempt) }
+  time { task_time(attributes_in, task.attempt) }
 
   input:
-  tuple val(attributes_in), path(vcf_0), path(vcf_1), path(vcf_2)
+  tuple val(attributes_in), path(vcf_0), path(vcf_1)
 
   output:
   path('*.tsv')
 
   script:
-  publish_basedir = "${params.output_dir}/${attributes_in.sample_name}"
+  publish_basedir = get_publish_basedir(attributes_in.comparison_name, attributes_in.sample_name)
   publish_dir = "${publish_basedir}/${attributes_in.run_type}/small_variants/3_comparison/"
   subset = attributes_in.filtered ? 'filtered' : 'pass'
   fn_suffix = attributes_in.filtered ? '_filtered' : ''
@@ -20,6 +24,7 @@ process module_smlv_comparison {
     --source "${subset}" \
     --vcf_1 "${vcf_0}" \
     --vcf_2 "${vcf_1}" \
-    --vcf_3 "${vcf_2}"
+    --input_snps ${attributes_in.profile.snps} \
+    --input_indels ${attributes_in.profile.indels}
   """
 }
@@ -0,0 +1,31 @@
+include { get_publish_basedir; task_cpus; task_memory; task_time } from '../lib/utility.groovy'
+
+process module_smlv_comparison_nway {
+  publishDir "${publish_dir}", mode: "${params.publish_mode}"
+  cpus { task_cpus(attributes_in) }
+  memory { task_memory(attributes_in, task.attempt) }
+  time { task_time(attributes_in, task.attempt) }
+
+  input:
+  // VCFs of each run set share a file name and so are staged into separate directories
+  tuple val(attributes_in), path(vcfs, stageAs: 'set_*/*'), path(vcf_indices, stageAs: 'set_*/*')
+
+  output:
+  path('*.tsv')
+
+  script:
+  publish_basedir = get_publish_basedir(attributes_in.comparison_name, attributes_in.sample_name)
+  publish_dir = "${publish_basedir}/${attributes_in.run_type}/small_variants_nway/"
+  """
+  # One multi-way intersection for each subset; sites are written with a bitmask of the VCFs that
+  # contain them, in the order given
+  bcftools isec --threads ${task.cpus} -n +1 -o sites_input.txt ${vcfs}
+  bcftools isec --threads ${task.cpus} -n +1 -f .,PASS -o sites_filtered.txt ${vcfs}
+  comparison_smlv_nway.py \
+    --sample_name "${attributes_in.sample_name}" \
+    --file_type "${attributes_in.data_source}" \
+    --run_sets "${attributes_in.run_sets.join(',')}" \
+    --sites_input sites_input.txt \
+    --sites_filtered sites_filtered.txt
+  """
+}
@@ -1,5 +1,10 @@
+include { get_publish_basedir; task_cpus; task_memory; task_time } from '../lib/utility.groovy'
+
 process module_sv_comparison {
   publishDir "${publish_dir}", mode: "${params.publish_mode}"
+  cpus { task_cpus(attributes_in) }
+  memory { task_memory(attributes_in, task.attempt) }
+  time { task_time(attributes_in, task.attempt) }
 
   input:
   tuple val(attributes_in), path('1.vcf.gz'), path('2.vcf.gz')
@@ -10,7 +15,7 @@ process module_sv_comparison {
   path('fpfn.tsv')
 
   script:
-  publish_basedir = "${params.output_dir}/${attributes_in.sample_name}"
+  publish_basedir = get_publish_basedir(attributes_in.comparison_name, attributes_in.sample_name)
   publish_dir = "${publish_basedir}/${attributes_in.run_type}/structural_variants/"
   """
   comparison_sv.py \
@@ -1,5 +1,11 @@
+include { get_publish_basedir; task_cpus; task_memory; task_time } from '../lib/utility.groovy'
+
 process module_index_vcf {
-  publishDir "${publish_dir}", pattern: '*.tbi', mode: "${params.publish_mode}"
+  // Inputs processed once per input file have no comparison and are not published here
+  publishDir "${publish_dir}", pattern: '*.tbi', saveAs: { attributes_in.comparison_name == null ? null : it }, mode: "${params.publish_mode}"
+  cpus { task_cpus(attributes_in) }
+  memory { task_memory(attributes_in, task.attempt) }
+  time { task_time(attributes_in, task.attempt) }
 
   input:
   tuple val(attributes_in), path(vcf)
@@ -8,7 +14,7 @@ process module_index_vcf {
   tuple val(attributes_out), path(vcf), path('*.tbi')
 
   script:
-  publish_basedir = "${params.output_dir}/${attributes_in.sample_name}"
+  publish_basedir = get_publish_basedir(attributes_in.comparison_name, attributes_in.sample_name)
   publish_dir = "${publish_basedir}/${attributes_in.run_type}/small_variants/1_filtered_vcfs/"
   attributes_out = attributes_in.clone()
   attributes_out.indexed = true
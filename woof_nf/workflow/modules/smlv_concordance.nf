@@ -0,0 +1,28 @@
+include { get_publish_basedir; task_cpus; task_memory; task_time } from '../lib/utility.groovy'
+
+process module_smlv_concordance {
+  publishDir "${publish_dir}", saveAs: { "${attributes_in.data_source}${fn_suffix}_${it}" }, mode: "${params.publish_mode}"
+  cpus { task_cpus(attributes_in) }
+  memory { task_memory(attributes_in, task.attempt) }
+  time { task_time(attributes_in, task.attempt) }
+
+  input:
+  tuple val(attributes_in), path(vcf_2), path(vcf_3)
+
+  output:
+  path('concordance*.tsv')
+
+  script:
+  publish_basedir = get_publish_basedir(attributes_in.comparison_name, attributes_in.sample_name)
+  publish_dir = "${publish_basedir}/${attributes_in.run_type}/small_variants/3_comparison/"
+  subset = attributes_in.filtered ? 'filtered' : 'pass'
+  fn_suffix = attributes_in.filtered ? '_filtered' : ''
+  """
+  comparison_smlv_concordance.py \
+    --sample_name "${attributes_in.sample_name}" \
+    --file_type "${attributes_in.data_source}" \
+    --source "${subset}" \
+    --vcf_one "${vcf_2}" \
+    --vcf_two "${vcf_3}"
+  """
+}
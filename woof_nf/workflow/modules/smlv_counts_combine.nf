@@ -1,19 +1,19 @@
+include { get_publish_basedir } from '../lib/utility.groovy'
+
 process module_smlv_counts_combine {
   publishDir "${publish_dir}", mode: "${params.publish_mode}"
 
   input:
-  tuple val(sample_name), val(run_type), path(counts)
+  tuple val(comparison_name), val(sample_name), val(run_type), val(count_lines)
 
   output:
   path('*tsv')
 
   script:
-  publish_basedir = "${params.output_dir}/${sample_name}"
+  publish_basedir = get_publish_basedir(comparison_name, sample_name)
   publish_dir = "${publish_basedir}/${run_type}/small_variants/"
+  count_lines_str = count_lines.collect { "'${it}'" }.join(' ')
   """
-  {
-    echo -e 'vcf_type\trun\tsource\tcount';
-    cat ${counts};
-  } > counts.tsv
+  printf '%s\\n' 'vcf_type\trun\tsource\tcount' ${count_lines_str} > counts.tsv
   """
 }
@@ -1,5 +1,10 @@
+include { get_publish_basedir; task_cpus; task_memory; task_time } from '../lib/utility.groovy'
+
 process module_smlv_intersect {
   publishDir "${publish_dir}", mode: "${params.publish_mode}"
+  cpus { task_cpus(attributes_in) }
+  memory { task_memory(attributes_in, task.attempt) }
+  time { task_time(attributes_in, task.attempt) }
 
   input:
   tuple val(attributes_in), path('1.vcf.gz'), path('1.vcf.gz.tbi'), path('2.vcf.gz'), path('2.vcf.gz.tbi')
@@ -9,14 +14,12 @@ process module_smlv_intersect {
 
   script:
   source = attributes_in.filtered ? 'filtered' : 'input'
-  publish_basedir = "${params.output_dir}/${attributes_in.sample_name}"
+  publish_basedir = get_publish_basedir(attributes_in.comparison_name, attributes_in.sample_name)
   publish_middir = "${attributes_in.run_type}/small_variants/2_variants_intersect"
   publish_dir = "${publish_basedir}/${publish_middir}/${source}/${attributes_in.data_source}"
   attributes_out = attributes_in.clone()
   attributes_out.indexed = false
   """
-  bcftools isec 1.vcf.gz 2.vcf.gz -Oz -p ./
-  # Remove unneeded output VCF; NF output globbing doesn't allow exclusion at this level
-  rm 0003.vcf.gz
+  bcftools isec --threads ${task.cpus} 1.vcf.gz 2.vcf.gz -Oz -p ./
   """
 }
@@ -1,5 +1,9 @@
+include { get_filtered_vcf_profile; task_cpus; task_memory; task_time } from '../lib/utility.groovy'
+
 process module_smlv_pass {
-  publishDir "${publish_dir}", mode: "${params.publish_mode}"
+  cpus { task_cpus(attributes_in) }
+  memory { task_memory(attributes_in, task.attempt) }
+  time { task_time(attributes_in, task.attempt) }
 
   input:
   tuple val(attributes_in), path(vcf)
@@ -8,18 +12,20 @@ process module_smlv_pass {
   tuple val(attributes_out), path('*.vcf.gz')
 
   script:
-  publish_basedir = "${params.output_dir}/${attributes_in.sample_name}"
-  publish_dir = "${publish_basedir}/${attributes_in.run_type}/small_variants/1_filtered_vcfs/"
-  filename = "${attributes_in.data_source}__${attributes_in.run_number}__filtered__${vcf.getSimpleName()}"
+  // Run once per input file, filtered VCFs are published for each comparison by module_smlv_publish
+  filename = "${vcf.getSimpleName()}.filtered"
   attributes_out = attributes_in.clone()
   attributes_out.indexed = false
   attributes_out.filtered = true
+  attributes_out.profile = get_filtered_vcf_profile(attributes_in.profile)
+  // Only sort records when the profile shows the input is unsorted
+  sort_command = attributes_in.profile.sorted ? 'cat' : 'sort -k1,1V -k2,2n'
   """
   {
     bcftools view -h "${vcf}";
-    bcftools view -Hf .,PASS "${vcf}" | sort -k1,1V -k2,2n;
+    bcftools view -Hf .,PASS "${vcf}" | ${sort_command};
   } | \
-    bcftools view -Oz \
+    bcftools view -Oz --threads ${task.cpus} \
     > "${filename}.vcf.gz"
   """
 }
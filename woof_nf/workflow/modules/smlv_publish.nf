@@ -0,0 +1,25 @@
+include { get_publish_basedir; task_memory; task_time } from '../lib/utility.groovy'
+
+process module_smlv_publish {
+  publishDir "${publish_dir}", mode: "${params.publish_mode}"
+  cpus 1
+  memory { task_memory(attributes_in, task.attempt) }
+  time { task_time(attributes_in, task.attempt) }
+
+  input:
+  tuple val(attributes_in), path(vcf), path(vcf_index)
+
+  output:
+  path('*.vcf.gz*')
+
+  script:
+  publish_basedir = get_publish_basedir(attributes_in.comparison_name, attributes_in.sample_name)
+  publish_dir = "${publish_basedir}/${attributes_in.run_type}/small_variants/1_filtered_vcfs/"
+  filename = "${attributes_in.data_source}__${attributes_in.run_number}__filtered__${vcf.getSimpleName()}.vcf.gz"
+  """
+  # Filtered VCFs are shared by all comparisons of an input and published under the filename of
+  # each comparison; hardlink the staged file, copying only if it is on another filesystem
+  ln -L "${vcf}" "${filename}" 2>/dev/null || cp -L "${vcf}" "${filename}"
+  ln -L "${vcf_index}" "${filename}.tbi" 2>/dev/null || cp -L "${vcf_index}" "${filename}.tbi"
+  """
+}
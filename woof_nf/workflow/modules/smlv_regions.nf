@@ -0,0 +1,25 @@
+include { task_cpus; task_memory; task_time } from '../lib/utility.groovy'
+
+process module_smlv_regions {
+  cpus { task_cpus(attributes_in) }
+  memory { task_memory(attributes_in, task.attempt) }
+  time { task_time(attributes_in, task.attempt) }
+
+  input:
+  tuple val(attributes_in), path(vcf), path(vcf_index)
+  path(regions, stageAs: 'regions.bed')
+
+  output:
+  tuple val(attributes_out), path('*.regions.vcf.gz'), path('*.regions.vcf.gz.tbi')
+
+  script:
+  filename = "${vcf.getSimpleName()}.regions.vcf.gz"
+  attributes_out = attributes_in.clone()
+  // The regional VCF is profiled separately to the whole input VCF
+  attributes_out.checksum = "${attributes_in.checksum}-${params.regions_checksum}".toString()
+  """
+  # Records are selected with the index so that only BGZF blocks overlapping the regions are read
+  bcftools view --threads ${task.cpus} -R regions.bed -Oz -o "${filename}" "${vcf}"
+  tabix "${filename}"
+  """
+}
@@ -0,0 +1,31 @@
+include { get_publish_basedir; task_cpus; task_memory; task_time } from '../lib/utility.groovy'
+
+process module_smlv_strata {
+  publishDir "${publish_dir}", saveAs: { "${attributes_in.data_source}${fn_suffix}_strata.tsv" }, mode: "${params.publish_mode}"
+  cpus { task_cpus(attributes_in) }
+  memory { task_memory(attributes_in, task.attempt) }
+  time { task_time(attributes_in, task.attempt) }
+
+  input:
+  tuple val(attributes_in), path(vcf_0), path(vcf_1), path(vcf_2)
+  path(strata, stageAs: 'strata.bed')
+
+  output:
+  path('*_strata.tsv')
+
+  script:
+  publish_basedir = get_publish_basedir(attributes_in.comparison_name, attributes_in.sample_name)
+  publish_dir = "${publish_basedir}/${attributes_in.run_type}/small_variants/3_comparison/"
+  subset = attributes_in.filtered ? 'filtered' : 'pass'
+  fn_suffix = attributes_in.filtered ? '_filtered' : ''
+  """
+  comparison_smlv_strata.py \
+    --sample_name "${attributes_in.sample_name}" \
+    --file_type "${attributes_in.data_source}" \
+    --source "${subset}" \
+    --vcf_fp "${vcf_0}" \
+    --vcf_fn "${vcf_1}" \
+    --vcf_tp "${vcf_2}" \
+    --strata_bed "${strata}"
+  """
+}
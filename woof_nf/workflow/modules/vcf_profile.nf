@@ -0,0 +1,23 @@
+include { task_memory; task_time } from '../lib/utility.groovy'
+
+process module_vcf_profile {
+  // Profiles are keyed by input content checksum and profile format version, and stored outside the
+  // work directory so that a VCF is profiled once across comparisons and runs
+  storeDir "${params.profile_dir}"
+  cpus 1
+  memory { task_memory(attributes_in, task.attempt) }
+  time { task_time(attributes_in, task.attempt) }
+
+  input:
+  tuple val(attributes_in), path(vcf)
+
+  output:
+  tuple val(attributes_in), path("${attributes_in.checksum}.v${params.vcf_profile_version}.profile.json")
+
+  script:
+  """
+  vcf_profile.py \
+    --vcf "${vcf}" \
+    --output "${attributes_in.checksum}.v${params.vcf_profile_version}.profile.json"
+  """
+}
@@ -19,8 +19,10 @@ if (! params.output_dir) {
 
 // Read input files from disk
 inputs_fp = file(params.inputs_fp)
+// NOTE: all pairs may have been excluded as identical, leaving only the header
 input_files = inputs_fp
-  .readLines()[1..-1]
+  .readLines()
+  .drop(1)
   .collect { it.split('\t') }
 
 // Collect inputs into appropriate channels
@@ -0,0 +1,30 @@
+#!/usr/bin/env nextflow
+nextflow.enable.dsl = 2
+
+// Import workflows
+include { workflow_small_variants_nway } from './subworkflows/small_variants_nway.nf'
+
+// Import utility
+include { process_inputs_nway } from './lib/utility.groovy'
+
+// Check configuration
+if (! params.inputs_fp) {
+    exit 1, "error: got bad inputs_fp argument"
+}
+if (! params.output_dir) {
+    exit 1, "error: got bad output_dir argument"
+}
+
+// Read input files from disk
+inputs_fp = file(params.inputs_fp)
+input_files = inputs_fp
+  .readLines()
+  .drop(1)
+  .collect { it.split('\t') }
+
+// N-way comparison is of small variants only
+ch_smlv = process_inputs_nway(input_files)
+
+workflow {
+  workflow_small_variants_nway(ch_smlv)
+}
@@ -1,85 +1,166 @@
 // Modules
 include { module_index_vcf } from '../modules/index_vcf.nf'
+include { module_smlv_bootstrap } from '../modules/smlv_bootstrap.nf'
+include { module_smlv_concordance } from '../modules/smlv_concordance.nf'
 include { module_smlv_counts_combine } from '../modules/smlv_counts_combine.nf'
 include { module_smlv_count } from '../modules/smlv_count.nf'
 include { module_smlv_comparison } from '../modules/comparison_smlv.nf'
 include { module_smlv_intersect } from '../modules/smlv_intersect.nf'
 include { module_smlv_pass } from '../modules/smlv_pass.nf'
+include { module_smlv_publish } from '../modules/smlv_publish.nf'
+include { module_smlv_strata } from '../modules/smlv_strata.nf'
+include { module_vcf_profile } from '../modules/vcf_profile.nf'
+
+// Workflows
+include { workflow_smlv_regions } from './smlv_regions.nf'
 
 // Utility
-include { prepare_smlv_channel } from '../lib/utility.groovy'
+include { add_comparison_attributes; add_vcf_profiles; get_file_attributes; get_vcf_count_line; prepare_smlv_channel } from '../lib/utility.groovy'
 
 workflow workflow_small_variants {
   take:
     // Format (input): [attributes, vcf, vcf_index]
     ch_smlv
   main:
+    // Inputs in several batch comparisons are staged and processed once: the per input file stages
+    // (regions, profile, PASS filter, indexing) run on inputs deduplicated by checksum and results
+    // are then fanned out to each comparison
+    // Format (ch_smlv_files): [attributes, vcf, vcf_index]
+    ch_smlv_files = ch_smlv
+      .unique { it[0].checksum }
+      .map { attributes, vcf, vcf_index -> [get_file_attributes(attributes), vcf, vcf_index] }
+
+    // Restrict inputs to target regions, if any, so that all downstream work scales with the size
+    // of the regions
+    // Format (ch_smlv_targeted): [attributes, vcf, vcf_index]
+    if (params.regions_fp) {
+      ch_smlv_targeted = workflow_smlv_regions(ch_smlv_files, file(params.regions_fp))
+    } else {
+      ch_smlv_targeted = ch_smlv_files
+    }
+
+    // Profile input VCFs in a single pass (counts, contigs, samples, sortedness) and attach to
+    // attributes; downstream processes use the profile rather than rescanning the VCF
+    // Format (ch_smlv_profiled): [attributes, vcf, vcf_index]
+    ch_smlv_profiles = module_vcf_profile(ch_smlv_targeted.map { it[0..1] })
+    ch_smlv_profiled = add_vcf_profiles(ch_smlv_targeted, ch_smlv_profiles)
+
     // Filter non-PASS small variants
     // Format (ch_smlv_pass): [attributes, vcf]
-    ch_smlv_pass = module_smlv_pass(ch_smlv.map { it[0..1] })
+    ch_smlv_pass = module_smlv_pass(ch_smlv_profiled.map { it[0..1] })
 
     // Select input VCFs that have no index and add newly created VCFs for indexing
     // Format (ch_vcfs_no_index): [attributes, vcf]
-    ch_smlv_no_index = ch_smlv
+    ch_smlv_no_index = ch_smlv_profiled
       .filter { ! it[0].indexed }
       .map { it[0..1] }
       .mix(ch_smlv_pass)
 
-    // Index VCFs and join with those already indexed
+    // Index VCFs and join with those already indexed, then fan out to comparisons
     // Format (ch_vcfs_indexed_all): [attributes, vcf, vcf_index]
     ch_smlv_indexed = module_index_vcf(ch_smlv_no_index)
-    ch_smlv_indexed_all = ch_smlv_indexed
-      .mix(ch_smlv.filter { it[0].indexed })
+    ch_smlv_files_indexed = ch_smlv_indexed
+      .mix(ch_smlv_profiled.filter { it[0].indexed })
+    ch_smlv_indexed_all = add_comparison_attributes(ch_smlv, ch_smlv_files_indexed)
+
+    // Publish filtered VCFs and indices to each comparison
+    module_smlv_publish(ch_smlv_indexed_all.filter { it[0].filtered })
 
     // Prepare/group/format VCF channel and then determine differences between VCFs
     // Format (ch_smlv_prepared): [attributes, vcf_one, index_one, vcf_two, index_two]
     ch_smlv_prepared = prepare_smlv_channel(ch_smlv_indexed_all)
-    // Format (ch_smlv_intersects): [attributes, [0000.vcf, 0001.vcf, 0002.vcf]]
+    // Format (ch_smlv_intersects): [attributes, [0000.vcf, 0001.vcf, 0002.vcf, 0003.vcf]]
     ch_smlv_intersects = module_smlv_intersect(ch_smlv_prepared)
 
-    // Make SNV comparison
-    // Format (module_smlv_comparison: input): [attributes, vcf_0, vcf_1, vcf_2]
+    // Make SNV comparison; true positive counts are derived from the profile of the first VCF so
+    // the shared records VCF (0002.vcf.gz) is not needed
+    // Format (module_smlv_comparison: input): [attributes, vcf_0, vcf_1]
     module_smlv_comparison(
-        ch_smlv_intersects.map { it.flatten() }
+      ch_smlv_intersects.map { attributes, vcfs ->
+        [
+          attributes,
+          vcfs.find { it.name == '0000.vcf.gz' },
+          vcfs.find { it.name == '0001.vcf.gz' }
+        ]
+      }
     )
 
-    // NOTE: we aren't not directly using intersect counts calculated below in module_smlv_count;
-    // counts are obtained during report rendering from the VCFs themselves
+    // Stratified metrics, all strata are counted in a single pass over the intersect VCFs
+    // Format (module_smlv_strata: input): [attributes, vcf_0, vcf_1, vcf_2], strata
+    if (params.stratify) {
+      module_smlv_strata(
+        ch_smlv_intersects.map { attributes, vcfs ->
+          [
+            attributes,
+            vcfs.find { it.name == '0000.vcf.gz' },
+            vcfs.find { it.name == '0001.vcf.gz' },
+            vcfs.find { it.name == '0002.vcf.gz' }
+          ]
+        },
+        file(params.strata_fp)
+      )
+    }
+
+    // In quick mode, inputs are restricted to sampled windows (as target regions) and confidence
+    // intervals are obtained by resampling windows
+    // Format (module_smlv_bootstrap: input): [attributes, vcf_0, vcf_1, vcf_2], windows
+    if (params.quick) {
+      module_smlv_bootstrap(
+        ch_smlv_intersects.map { attributes, vcfs ->
+          [
+            attributes,
+            vcfs.find { it.name == '0000.vcf.gz' },
+            vcfs.find { it.name == '0001.vcf.gz' },
+            vcfs.find { it.name == '0002.vcf.gz' }
+          ]
+        },
+        file(params.regions_fp)
+      )
+    }
 
-    // Create channels for counting
-    // Format (ch_smlv_to_count): [attributes, vcf]
-    ch_smlv_to_count = Channel.empty().mix(
-       // Update run_number for unpacked VCFs
-      ch_smlv_prepared.flatMap { attributes, vcf_one, index_one, vcf_two, index_two ->
-        attrs_one = attributes.clone()
-        attrs_two = attributes.clone()
-        attrs_one.run_number = 'one'
-        attrs_two.run_number = 'two'
-        return [[attrs_one, vcf_one], [attrs_two, vcf_two]]
-      },
-      // Set distinct name
-      // Format (out): [attributes, vcf]; Attributes.data_source is modified
-      ch_smlv_intersects.flatMap { d ->
-        // Format (d): [attributes, [0000.vcf, 0001.vcf, 0002.vcf]]
-        // Format (dd): [vcf]
-        d[1].collect { dd ->
-          attributes = d[0].clone()
-          attributes.data_source = "${attributes.data_source}__intersect__${dd.simpleName}"
-          [attributes, dd]
-        }
+    // Genotype and AF/DP concordance of shared records, pairing the run one (0002.vcf.gz) and run
+    // two (0003.vcf.gz) records in a single pass
+    // Format (module_smlv_concordance: input): [attributes, vcf_2, vcf_3]
+    module_smlv_concordance(
+      ch_smlv_intersects.map { attributes, vcfs ->
+        [
+          attributes,
+          vcfs.find { it.name == '0002.vcf.gz' },
+          vcfs.find { it.name == '0003.vcf.gz' }
+        ]
       }
     )
 
-    // Variant counts
-    // Format (ch_smlv_counts): [attributes, vcf_counts]
-    ch_smlv_counts = module_smlv_count(ch_smlv_to_count)
+    // Variant counts; input and filtered VCF counts are taken from profiles and intersect VCFs
+    // are counted. Shared records of run two (0003.vcf.gz) have the same count as those of run one
+    // and are not counted
+    // Format (ch_smlv_intersect_to_count): [attributes, vcf]; Attributes.data_source is modified
+    ch_smlv_intersect_to_count = ch_smlv_intersects.flatMap { d ->
+      // Format (d): [attributes, [0000.vcf, 0001.vcf, 0002.vcf, 0003.vcf]]
+      // Format (dd): [vcf]
+      d[1].findAll { it.name != '0003.vcf.gz' }.collect { dd ->
+        attributes = d[0].clone()
+        attributes.data_source = "${attributes.data_source}__intersect__${dd.simpleName}"
+        [attributes, dd]
+      }
+    }
+    // Format (ch_smlv_counts): [attributes, count_line]
+    ch_smlv_counts = Channel.empty().mix(
+      ch_smlv_indexed_all.map { attributes, vcf, vcf_index -> [attributes, get_vcf_count_line(attributes)] },
+      module_smlv_count(ch_smlv_intersect_to_count).map { attributes, count_line -> [attributes, count_line.trim()] }
+    )
     ch_smlv_counts_grouped = ch_smlv_counts
-      // As we cannot directly call groupTuple on Attributes, we construct the group key and place at index 0:
-      // Format: [sample_name, file]
-      .map { attrs, file -> tuple( groupKey([attrs.sample_name, attrs.run_type], 0), file ) }
+      // As we cannot directly call groupTuple on Attributes, we construct the group key and place at index 0.
+      // Each data source yields counts for two subsets (input, filtered), each with two VCFs and
+      // three intersect VCFs, so the group size is known and groups are emitted once complete
+      // Format: [[comparison_name, sample_name, run_type], count_line]
+      .map { attrs, count_line ->
+        def group_size = attrs.source_count * 2 * (2 + 3)
+        tuple( groupKey([attrs.comparison_name, attrs.sample_name, attrs.run_type], group_size), count_line )
+      }
       // Now we can collect with groupTuple
-      // Format: [sample_name, run_type, [files]]
+      // Format: [comparison_name, sample_name, run_type, [count_lines]]
       .groupTuple()
-      .map { group_key, files -> [group_key[0], group_key[1], files] }
+      .map { group_key, count_lines -> [group_key[0], group_key[1], group_key[2], count_lines] }
     module_smlv_counts_combine(ch_smlv_counts_grouped)
 }
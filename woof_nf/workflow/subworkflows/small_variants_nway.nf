@@ -0,0 +1,35 @@
+// Modules
+include { module_index_vcf } from '../modules/index_vcf.nf'
+include { module_smlv_comparison_nway } from '../modules/comparison_smlv_nway.nf'
+
+// Workflows
+include { workflow_smlv_regions } from './smlv_regions.nf'
+
+// Utility
+include { group_vcf_sets } from '../lib/utility.groovy'
+
+workflow workflow_small_variants_nway {
+  take:
+    // Format (input): [attributes, vcf, vcf_index]
+    ch_smlv
+  main:
+    // Restrict inputs to target regions, if any
+    // Format (ch_smlv_targeted): [attributes, vcf, vcf_index]
+    if (params.regions_fp) {
+      ch_smlv_targeted = workflow_smlv_regions(ch_smlv, file(params.regions_fp))
+    } else {
+      ch_smlv_targeted = ch_smlv
+    }
+
+    // Index VCFs that have no index and join with those already indexed
+    // Format (ch_smlv_indexed_all): [attributes, vcf, vcf_index]
+    ch_smlv_indexed = module_index_vcf(ch_smlv_targeted.filter { ! it[0].indexed }.map { it[0..1] })
+    ch_smlv_indexed_all = ch_smlv_indexed
+      .mix(ch_smlv_targeted.filter { it[0].indexed })
+
+    // Group VCFs of all run sets for each sample and data source, then compare with a single
+    // multi-way intersection
+    // Format (ch_smlv_sets): [attributes, [vcfs], [vcf_indices]]
+    ch_smlv_sets = group_vcf_sets(ch_smlv_indexed_all)
+    module_smlv_comparison_nway(ch_smlv_sets)
+}
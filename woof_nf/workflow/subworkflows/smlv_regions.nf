@@ -0,0 +1,27 @@
+// Modules
+include { module_index_vcf } from '../modules/index_vcf.nf'
+include { module_smlv_regions } from '../modules/smlv_regions.nf'
+
+workflow workflow_smlv_regions {
+  take:
+    // Format (input): [attributes, vcf, vcf_index]
+    ch_smlv
+    regions
+  main:
+    // Regions are selected using VCF indices, index VCFs that have no index
+    // Format (ch_smlv_indexed_all): [attributes, vcf, vcf_index]
+    ch_smlv_indexed = module_index_vcf(ch_smlv.filter { ! it[0].indexed }.map { it[0..1] })
+    ch_smlv_indexed_all = ch_smlv_indexed
+      .mix(ch_smlv.filter { it[0].indexed })
+
+    // Restrict to regions, downstream task resources are scaled by the size of the regional VCF
+    // Format (ch_smlv_regions): [attributes, vcf, vcf_index]
+    ch_smlv_regions = module_smlv_regions(ch_smlv_indexed_all, regions)
+      .map { attributes, vcf, vcf_index ->
+        def attributes_out = attributes.clone()
+        attributes_out.input_size = vcf.size()
+        [attributes_out, vcf, vcf_index]
+      }
+  emit:
+    ch_smlv_regions
+}